@@ -20,11 +20,811 @@ Copyright (c) 2023 Danny Heap and Jacqueline Smith
 This file contains the WasteWrangler class and some simple testing functions. 
 """  
   
+import bisect  
+import concurrent.futures  
+import contextlib  
+import contextvars  
+import csv  
 import datetime as dt  
+import functools  
+import io  
+import multiprocessing  
+import os  
+import random  
+import re  
+import sys  
+import threading  
 import psycopg2 as pg  
 import psycopg2.extensions as pg_ext  
 import psycopg2.extras as pg_extras  
-from typing import Optional, TextIO  
+import psycopg2.pool as pg_pool  
+from time import perf_counter, sleep  
+from typing import Callable, Iterator, Optional, TextIO  
+  
+  
+# Trips happen between these times, at an average speed of SPEED kph, and  
+# the same truck or driver needs BUFFER between two trips.  
+DAY_START = dt.time(8, 0, 0)  
+DAY_END = dt.time(16, 0, 0)  
+SPEED = 5  
+BUFFER = dt.timedelta(minutes=30)  
+  
+# schedule_maintenance looks for a free day at most this many days ahead.  
+MAINTENANCE_HORIZON = 365  
+  
+# The scheduling methods run their transaction at most this many times when  
+# it conflicts with concurrent ones, waiting a random time of up to  
+# RETRY_BACKOFF * 2 ** (n - 1) seconds before the n-th retry.  
+SCHEDULE_ATTEMPTS = 5  
+RETRY_BACKOFF = 0.01  
+  
+# Reads that may cover every trip go through a server-side cursor (see  
+# _stream), which fetches this many rows per round trip by default, so that  
+# only that many rows are in memory at once.  
+ITERSIZE = 10000  
+  
+# The errors raised by inserting a trip or maintenance that clashes with one  
+# already in the database (see waste_wrangler_occupancy.sql).  
+_CONFLICTS = (pg.errors.ExclusionViolation, pg.errors.UniqueViolation)  
+  
+# The errors after which a transaction that conflicted with concurrent ones  
+# may succeed if it is run again.  
+_RETRYABLE = _CONFLICTS + (pg.errors.SerializationFailure,  
+                           pg.errors.DeadlockDetected)  
+  
+  
+# Reroutes the trips to the facilities $1 from day $2 to day $3 inclusive,  
+# leaving the rerouted trips, with the fID they had, in moved.  
+_REROUTE = (  
+    "WITH replacement AS ("  
+    "    SELECT f.fID, (SELECT min(o.fID) FROM Facility o"  
+    "                   WHERE o.wasteType = f.wasteType"  
+    "                     AND o.fID <> ALL($1)) AS newFID"  
+    "    FROM Facility f WHERE f.fID = ANY($1)"  
+    "), moved AS ("  
+    "    UPDATE Trip t SET fID = r.newFID FROM replacement r"  
+    "    WHERE t.fID = r.fID AND r.newFID IS NOT NULL"  
+    "      AND t.tTime >= $2 AND t.tTime < $3 + 1"  
+    "    RETURNING r.fID AS oldFID, t.*"  
+    ") ")  
+  
+  
+# The statements used by WasteWrangler, by name. Each one is PREPAREd the  
+# first time it is used on a connection and EXECUTEd from then on, so the  
+# server parses and plans it once per connection. A statement is given as  
+# its parameter types and its text, using $1, $2, ... for the parameters.  
+# The trips of a day are found with a range on tTime rather than with  
+# date(tTime), so that the indexes on tTime and partition pruning apply.  
+_STATEMENTS = {  
+    # schedule_trip  
+    'schedule_trip': (  
+        'integer, timestamp',  
+        "SELECT * FROM schedule_trip($1, $2)"),  
+  
+    # reference data, see _ReferenceCache  
+    'ref_trucktype': (  
+        '',  
+        "SELECT truckType, wasteType FROM TruckType"),  
+    'ref_truck': (  
+        '',  
+        "SELECT tID, truckType, capacity FROM Truck ORDER BY tID"),  
+    'ref_facility': (  
+        '',  
+        "SELECT fID, wasteType FROM Facility ORDER BY fID"),  
+    'ref_route': (  
+        '',  
+        "SELECT rID, wasteType, length FROM Route ORDER BY rID"),  
+    'ref_driver': (  
+        '',  
+        "SELECT e.eID, e.hireDate, array_agg(d.truckType) "  
+        "FROM Employee e JOIN Driver d ON d.eID = e.eID "  
+        "GROUP BY e.eID, e.hireDate "  
+        "ORDER BY e.hireDate, e.eID"),  
+    'ref_technician': (  
+        '',  
+        "SELECT t.eID, e.hireDate, t.truckType "  
+        "FROM Technician t JOIN Employee e ON e.eID = t.eID "  
+        "ORDER BY t.eID"),  
+  
+    # schedule_fleet, reading the occupancy tables of  
+    # waste_wrangler_occupancy.sql  
+    'day_trucks': (  
+        'date',  
+        "SELECT tID, rID, busyFrom, busyUntil FROM TruckBusy WHERE day = $1"),  
+    'day_drivers': (  
+        'date',  
+        "SELECT eID, busyFrom, busyUntil FROM DriverBusy WHERE day = $1"),  
+    'lock_occupancy': (  
+        'date, integer[], integer[]',  
+        "SELECT lock_occupancy($1, $2, $3)"),  
+  
+    # schedule_trip_many, for several days at once  
+    'days_trucks': (  
+        'date[]',  
+        "SELECT day, tID, rID, busyFrom, busyUntil FROM TruckBusy "  
+        "WHERE day = ANY($1)"),  
+    'days_drivers': (  
+        'date[]',  
+        "SELECT day, eID, busyFrom, busyUntil FROM DriverBusy "  
+        "WHERE day = ANY($1)"),  
+  
+    # update_technicians, which loads the file into _QUALIFICATION_LOAD first  
+    'add_technicians': (  
+        '',  
+        "INSERT INTO Technician "  
+        "SELECT DISTINCT e.eID, q.truckType "  
+        "FROM qualification_load q "  
+        "JOIN Employee e ON e.name = q.name "  
+        "JOIN TruckType tt ON tt.truckType = q.truckType "  
+        "WHERE NOT EXISTS (SELECT 1 FROM Driver d WHERE d.eID = e.eID) "  
+        "ON CONFLICT DO NOTHING "  
+        "RETURNING eID, truckType"),  
+  
+    # workmate_sphere  
+    'workmate_sphere': (  
+        'integer',  
+        "WITH RECURSIVE sphere(eID) AS ("  
+        "    SELECT $1"  
+        "    UNION"  
+        "    SELECT CASE WHEN t.eID1 = s.eID THEN t.eID2 ELSE t.eID1 END"  
+        "    FROM sphere s JOIN Trip t ON t.eID1 = s.eID OR t.eID2 = s.eID"  
+        ") "  
+        "SELECT eID FROM sphere WHERE eID <> $1"),  
+  
+    # schedule_maintenance  
+    'schedule_maintenance': (  
+        'date, integer',  
+        "SELECT * FROM schedule_maintenance($1, $2)"),  
+  
+    # reroute_waste_bulk, which gets each rerouted trip with its old facility  
+    'reroute_facilities': (  
+        'integer[], date, date',  
+        _REROUTE + "SELECT * FROM moved"),  
+    # reroute_waste_bulk outside a scenario, which only needs the counts  
+    'reroute_counts': (  
+        'integer[], date, date',  
+        _REROUTE + "SELECT oldFID, count(*) FROM moved GROUP BY oldFID"),  
+}  
+  
+  
+# The temporary table update_technicians loads the qualifications file into.  
+_QUALIFICATION_LOAD = (  
+    "CREATE TEMPORARY TABLE IF NOT EXISTS "  
+    "qualification_load (name varchar, truckType varchar) "  
+    "ON COMMIT DELETE ROWS;")  
+  
+  
+# The WasteWrangler methods running in the current thread, outermost first,  
+# which traced queries are attributed to.  
+_call_path: contextvars.ContextVar[tuple[str, ...]] = contextvars.ContextVar(  
+    '_call_path', default=())  
+  
+  
+class _Tracer:  
+    """Statistics about the queries sent by a WasteWrangler, by call path. 
+ 
+    The call path of a query names the WasteWrangler methods that were 
+    running when it was sent, outermost first, e.g. 
+    'schedule_trips/schedule_fleet'. Queries sent outside of any method, e.g. 
+    while connecting, have the call path ''. 
+ 
+    All methods are thread-safe. 
+ 
+    === Instance Attributes === 
+    explain_threshold: queries that take longer than this many seconds are 
+        run again with EXPLAIN (ANALYZE, BUFFERS) and their plan is kept, or 
+        None if plans are never captured. 
+    max_plans: the number of plans kept for each call path. Older plans are 
+        dropped first. 
+    """  
+    explain_threshold: Optional[float]  
+    max_plans: int  
+    _stats: dict[str, dict]  
+    _lock: threading.Lock  
+  
+    def __init__(self, explain_threshold: Optional[float] = None,  
+                 max_plans: int = 10) -> None:  
+        """Initialize a tracer with no statistics yet."""  
+        self.explain_threshold = explain_threshold  
+        self.max_plans = max_plans  
+        self._stats = {}  
+        self._lock = threading.Lock()  
+  
+    def method(self, path: str, elapsed: float) -> None:  
+        """Record a call of the method at the end of <path> that took 
+        <elapsed> seconds. 
+        """  
+        with self._lock:  
+            stats = self._path(path)  
+            stats['calls'] += 1  
+            stats['time'] += elapsed  
+  
+    def query(self, path: str, elapsed: float, rows: int,  
+              error: Optional[pg.Error] = None) -> None:  
+        """Record a query sent from <path> that took <elapsed> seconds and 
+        returned or changed <rows> rows, or failed with <error>. 
+        """  
+        with self._lock:  
+            stats = self._path(path)  
+            stats['queries'] += 1  
+            stats['rows'] += rows  
+            stats['server_time'] += elapsed  
+            if error is not None:  
+                stats['errors'] += 1  
+                stats['last_error'] = str(error).strip()  
+  
+    def plan(self, path: str, query: str, elapsed: float, plan: str) -> None:  
+        """Keep the <plan> of the <query> sent from <path>, which took 
+        <elapsed> seconds. 
+        """  
+        with self._lock:  
+            plans = self._path(path)['plans']  
+            plans.append({'query': query, 'time': elapsed, 'plan': plan})  
+            del plans[:-self.max_plans]  
+  
+    def snapshot(self) -> dict[str, dict]:  
+        """Return a copy of the statistics of each call path: 
+            * calls, time: the number of calls of the method at the end of 
+              the path, and the total time they took in seconds. 
+            * queries, rows: the number of queries sent from the path, and 
+              the rows they returned or changed. 
+            * server_time: the time spent waiting for those queries, 
+              including the network. 
+            * client_time: the time the calls spent in Python, i.e. <time> 
+              less the server time of this path and the paths below it. 
+            * errors, last_error: the number of queries that failed and the 
+              message of the last failure, even if the method hid it. 
+            * plans: the latest plans captured for slow queries, as 
+              dictionaries with the query, its time and its plan. 
+        """  
+        with self._lock:  
+            result = {}  
+            for path, stats in self._stats.items():  
+                result[path] = dict(stats, plans=list(stats['plans']))  
+                below = sum(other['server_time']  
+                            for other_path, other in self._stats.items()  
+                            if other_path == path  
+                            or other_path.startswith(path + '/'))  
+                result[path]['client_time'] = max(stats['time'] - below, 0.0)  
+            return result  
+  
+    def reset(self) -> None:  
+        """Forget all statistics."""  
+        with self._lock:  
+            self._stats = {}  
+  
+    def _path(self, path: str) -> dict:  
+        """Return the statistics of <path>, creating them if needed."""  
+        if path not in self._stats:  
+            self._stats[path] = {  
+                'calls': 0, 'time': 0.0, 'queries': 0, 'rows': 0,  
+                'server_time': 0.0, 'errors': 0, 'last_error': None,  
+                'plans': [],  
+            }  
+        return self._stats[path]  
+  
+  
+class _TracingCursor(pg_ext.cursor):  
+    """A cursor that reports the queries it sends to the tracer of its 
+    connection, if it has one. 
+    """  
+    # Only these statements can be run with EXPLAIN  
+    EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'with', 'values',  
+                   'execute')  
+  
+    def execute(self, query, vars=None):  
+        tracer = self.connection.tracer  
+        if tracer is None:  
+            return super().execute(query, vars)  
+  
+        path = '/'.join(_call_path.get())  
+        start = perf_counter()  
+        try:  
+            super().execute(query, vars)  
+        except pg.Error as ex:  
+            tracer.query(path, perf_counter() - start, 0, ex)  
+            raise  
+        elapsed = perf_counter() - start  
+        # Named cursors fetch their rows later, so only their query counts  
+        rows = max(self.rowcount, 0) if self.name is None else 0  
+        tracer.query(path, elapsed, rows)  
+  
+        if (tracer.explain_threshold is not None  
+                and elapsed > tracer.explain_threshold and self.name is None):  
+            self._explain(tracer, path, self.mogrify(query, vars).decode(),  
+                          elapsed)  
+  
+    def copy_expert(self, sql, file, size=8192):  
+        tracer = self.connection.tracer  
+        if tracer is None:  
+            return super().copy_expert(sql, file, size)  
+  
+        path = '/'.join(_call_path.get())  
+        start = perf_counter()  
+        try:  
+            super().copy_expert(sql, file, size)  
+        except pg.Error as ex:  
+            tracer.query(path, perf_counter() - start, 0, ex)  
+            raise  
+        tracer.query(path, perf_counter() - start, max(self.rowcount, 0))  
+  
+    def _explain(self, tracer: _Tracer, path: str, query: str,  
+                 elapsed: float) -> None:  
+        """Run <query>, which was sent from <path> and took <elapsed> 
+        seconds, again with EXPLAIN (ANALYZE, BUFFERS), and give its plan to 
+        <tracer>. The query is run in a savepoint that is rolled back, so 
+        that it changes nothing. 
+        """  
+        words = query.split(None, 1)  
+        conn = self.connection  
+        if (not words or words[0].lower() not in self.EXPLAINABLE  
+                or conn.autocommit  
+                or conn.info.transaction_status  
+                != pg_ext.TRANSACTION_STATUS_INTRANS):  
+            return  
+  
+        cur = conn.cursor(cursor_factory=pg_ext.cursor)  
+        cur.execute("SAVEPOINT trace_explain;")  
+        try:  
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query)  
+            plan = '\n'.join(row[0] for row in cur.fetchall())  
+        except pg.Error:  
+            plan = None  
+        cur.execute("ROLLBACK TO SAVEPOINT trace_explain;")  
+        cur.execute("RELEASE SAVEPOINT trace_explain;")  
+        cur.close()  
+        if plan is not None:  
+            tracer.plan(path, query, elapsed, plan)  
+  
+  
+class _Connection(pg_ext.connection):  
+    """A connection that remembers which of _STATEMENTS have been prepared 
+    on it, and whose cursors report their queries to a tracer. 
+ 
+    === Instance Attributes === 
+    prepared: the names of the statements prepared on this connection. 
+    tracer: the tracer of the WasteWrangler using this connection, or None 
+        if queries are not traced. 
+    """  
+    prepared: set[str]  
+    tracer: Optional[_Tracer]  
+  
+    def __init__(self, *args, **kwargs) -> None:  
+        """Initialize a connection with no prepared statements, which does 
+        not trace its queries. 
+        """  
+        super().__init__(*args, **kwargs)  
+        self.prepared = set()  
+        self.tracer = None  
+        self.cursor_factory = _TracingCursor  
+  
+  
+def _execute(cur: pg_ext.cursor, name: str, args: tuple = ()) -> None:  
+    """Execute the statement <name> from _STATEMENTS with the parameters 
+    <args> using the cursor <cur>, preparing it first if it has not been 
+    prepared on the connection of <cur> yet. 
+    """  
+    conn = cur.connection  
+    if name not in conn.prepared:  
+        cur.execute(_prepare_command(name))  
+        conn.prepared.add(name)  
+    cur.execute(_execute_command(name, args), args or None)  
+  
+  
+def _prepare_command(name: str) -> str:  
+    """Return the PREPARE command for the statement <name> from _STATEMENTS. 
+    """  
+    types, sql = _STATEMENTS[name]  
+    if types:  
+        return "PREPARE %s (%s) AS %s;" % (name, types, sql)  
+    return "PREPARE %s AS %s;" % (name, sql)  
+  
+  
+def _execute_command(name: str, args: tuple = ()) -> str:  
+    """Return the EXECUTE command for the statement <name>, with a %s 
+    placeholder for each of the parameters <args>. 
+    """  
+    if args:  
+        return "EXECUTE %s (%s);" % (name, ', '.join(['%s'] * len(args)))  
+    return "EXECUTE %s;" % name  
+  
+  
+def _stream(conn: pg_ext.connection, name: str, query: str,  
+            args: Optional[tuple] = None, itersize: int = ITERSIZE  
+            ) -> Iterator[tuple]:  
+    """Yield the rows of <query> with the parameters <args>, run on the 
+    connection <conn> through the server-side cursor <name>, which fetches 
+    <itersize> rows at a time. The cursor is closed once the rows have been 
+    consumed or the generator is closed, but the transaction it runs in is 
+    left open. 
+    """  
+    cur = conn.cursor(name=name)  
+    cur.itersize = itersize  
+    try:  
+        cur.execute(query, args)  
+        yield from cur  
+    finally:  
+        cur.close()  
+  
+  
+class _ReferenceCache:  
+    """An in-process copy of the reference data used by WasteWrangler, which 
+    changes rarely: truck types, trucks, facilities, routes, drivers and 
+    technicians. 
+ 
+    The triggers in waste_wrangler_functions.sql send the name of a table on 
+    the CHANNEL channel whenever it changes. This cache listens on that 
+    channel with its own connection and drops its copy of a table when it is 
+    notified, so that the table is reloaded the next time it is needed. 
+ 
+    All methods are thread-safe. 
+ 
+    === Instance Attributes === 
+    hits: the number of lookups answered from the cache. 
+    misses: the number of lookups that had to load a table. 
+    invalidations: the number of times a cached table was dropped. 
+    """  
+    CHANNEL = 'waste_wrangler_reference'  
+    # Maps each cached table to the statement that loads it.  
+    TABLES = {  
+        'trucktype': 'ref_trucktype',  
+        'truck': 'ref_truck',  
+        'facility': 'ref_facility',  
+        'route': 'ref_route',  
+        'driver': 'ref_driver',  
+        'technician': 'ref_technician',  
+    }  
+    # Maps each table that is notified on to the cached tables built from it.  
+    SOURCES = {  
+        'trucktype': ('trucktype',),  
+        'truck': ('truck',),  
+        'facility': ('facility',),  
+        'route': ('route',),  
+        'driver': ('driver',),  
+        'technician': ('technician',),  
+        'employee': ('driver', 'technician'),  
+    }  
+    hits: int  
+    misses: int  
+    invalidations: int  
+    _listener: pg_ext.connection  
+    _tables: dict[str, list[tuple]]  
+    _lock: threading.RLock  
+  
+    def __init__(self, **kwargs) -> None:  
+        """Initialize an empty cache, listening for changes with a connection 
+        made by passing <kwargs> to pg.connect. 
+        """  
+        self.hits = 0  
+        self.misses = 0  
+        self.invalidations = 0  
+        self._tables = {}  
+        self._lock = threading.RLock()  
+        self._listener = pg.connect(**kwargs)  
+        self._listener.autocommit = True  
+        with self._listener.cursor() as cur:  
+            cur.execute("LISTEN %s;" % self.CHANNEL)  
+  
+    def load_all(self, cur: pg_ext.cursor) -> None:  
+        """Load every cached table using the cursor <cur>."""  
+        with self._lock:  
+            self._poll()  
+            for table in self.TABLES:  
+                self._load(cur, table)  
+  
+    def get(self, cur: pg_ext.cursor, table: str) -> list[tuple]:  
+        """Return the rows of the cached <table>, loading them using the 
+        cursor <cur> if they are not cached or have changed. 
+        """  
+        with self._lock:  
+            rows = self.cached(table)  
+            if rows is None:  
+                rows = self._load(cur, table)  
+            return rows  
+  
+    def cached(self, table: str) -> Optional[list[tuple]]:  
+        """Return the rows of the cached <table>, or None if they are not 
+        cached or have changed and must be loaded and stored again. 
+        """  
+        with self._lock:  
+            self._poll()  
+            if table in self._tables:  
+                self.hits += 1  
+                return self._tables[table]  
+            self.misses += 1  
+            return None  
+  
+    def store(self, table: str, rows: list[tuple]) -> None:  
+        """Cache <rows> as the rows of <table>, which were loaded with the 
+        statement TABLES[table]. 
+        """  
+        with self._lock:  
+            self._tables[table] = rows  
+  
+    def invalidate(self, source: str) -> None:  
+        """Drop the cached tables built from the table <source>."""  
+        with self._lock:  
+            for table in self.SOURCES.get(source, ()):  
+                if self._tables.pop(table, None) is not None:  
+                    self.invalidations += 1  
+  
+    def stats(self) -> dict[str, int]:  
+        """Return the hit, miss and invalidation counters of this cache, and 
+        the number of tables currently cached. 
+        """  
+        with self._lock:  
+            return {  
+                'hits': self.hits,  
+                'misses': self.misses,  
+                'invalidations': self.invalidations,  
+                'cached_tables': len(self._tables),  
+            }  
+  
+    def close(self) -> None:  
+        """Stop listening for changes."""  
+        if not self._listener.closed:  
+            self._listener.close()  
+  
+    def _load(self, cur: pg_ext.cursor, table: str) -> list[tuple]:  
+        """Load the cached <table> using the cursor <cur> and return its 
+        rows. 
+        """  
+        _execute(cur, self.TABLES[table])  
+        rows = cur.fetchall()  
+        self.store(table, rows)  
+        return rows  
+  
+    def _poll(self) -> None:  
+        """Drop the cached tables that changed since the last poll."""  
+        self._listener.poll()  
+        while self._listener.notifies:  
+            self.invalidate(self._listener.notifies.pop(0).payload)  
+  
+  
+class _UnionFind:  
+    """Disjoint sets of employees, used to label workmate spheres. 
+ 
+    === Instance Attributes === 
+    parent: maps each eID to its parent in its set's tree. The root of a 
+        tree maps to itself. 
+    size: maps each root to the number of eIDs in its set. 
+    lowest: maps each root to the lowest eID in its set. 
+    """  
+    parent: dict[int, int]  
+    size: dict[int, int]  
+    lowest: dict[int, int]  
+  
+    def __init__(self) -> None:  
+        """Initialize an empty collection of sets."""  
+        self.parent = {}  
+        self.size = {}  
+        self.lowest = {}  
+  
+    def find(self, eid: int) -> int:  
+        """Return the root of the set containing <eid>, adding <eid> in a set 
+        of its own if it is new. 
+        """  
+        if eid not in self.parent:  
+            self.parent[eid] = eid  
+            self.size[eid] = 1  
+            self.lowest[eid] = eid  
+            return eid  
+  
+        root = eid  
+        while self.parent[root] != root:  
+            root = self.parent[root]  
+        # Compress the path so the next lookup is direct  
+        while self.parent[eid] != root:  
+            self.parent[eid], eid = root, self.parent[eid]  
+        return root  
+  
+    def union(self, eid1: int, eid2: int) -> None:  
+        """Merge the sets containing <eid1> and <eid2>."""  
+        root1, root2 = self.find(eid1), self.find(eid2)  
+        if root1 == root2:  
+            return  
+        if self.size[root1] < self.size[root2]:  
+            root1, root2 = root2, root1  
+        self.parent[root2] = root1  
+        self.size[root1] += self.size.pop(root2)  
+        self.lowest[root1] = min(self.lowest[root1], self.lowest.pop(root2))  
+  
+    def labels(self) -> dict[int, int]:  
+        """Return a dictionary that maps each eID to the lowest eID in its 
+        set. 
+        """  
+        return {eid: self.lowest[self.find(eid)] for eid in self.parent}  
+  
+  
+class _ConnectionPool:  
+    """A pool of connections that can be shared by several threads. 
+ 
+    Unlike ThreadedConnectionPool, which raises an error when every 
+    connection is checked out, getconn waits until a connection is returned. 
+ 
+    === Instance Attributes === 
+    minconn: the number of connections opened when the pool is created, and 
+        the most that are kept open while idle: a connection returned while 
+        <minconn> others are idle is closed. 
+    maxconn: the maximum number of connections open at once. 
+    """  
+    minconn: int  
+    maxconn: int  
+    _pool: pg_pool.ThreadedConnectionPool  
+    _slots: threading.BoundedSemaphore  
+    _lock: threading.Lock  
+    _in_use: int  
+    _peak_in_use: int  
+    _checkouts: int  
+    _waits: int  
+    _total_wait: float  
+    _max_wait: float  
+  
+    def __init__(self, maxconn: int, minconn: int = 1, **kwargs) -> None:  
+        """Initialize a pool of at most <maxconn> connections, opening 
+        <minconn> of them right away. <kwargs> are passed on to pg.connect. 
+        """  
+        self.minconn = min(minconn, maxconn)  
+        self.maxconn = maxconn  
+        self._pool = pg_pool.ThreadedConnectionPool(self.minconn, maxconn,  
+                                                    **kwargs)  
+        self._slots = threading.BoundedSemaphore(maxconn)  
+        self._lock = threading.Lock()  
+        self._in_use = 0  
+        self._peak_in_use = 0  
+        self._checkouts = 0  
+        self._waits = 0  
+        self._total_wait = 0.0  
+        self._max_wait = 0.0  
+  
+    def getconn(self) -> pg_ext.connection:  
+        """Check out a connection, waiting for one to be returned if they 
+        are all in use. 
+        """  
+        start = perf_counter()  
+        waited = not self._slots.acquire(blocking=False)  
+        if waited:  
+            self._slots.acquire()  
+        wait = perf_counter() - start  
+        try:  
+            conn = self._pool.getconn()  
+        except pg.Error:  
+            self._slots.release()  
+            raise  
+  
+        with self._lock:  
+            self._in_use += 1  
+            self._peak_in_use = max(self._peak_in_use, self._in_use)  
+            self._checkouts += 1  
+            self._waits += waited  
+            self._total_wait += wait  
+            self._max_wait = max(self._max_wait, wait)  
+        return conn  
+  
+    def putconn(self, conn: pg_ext.connection) -> None:  
+        """Return the connection <conn> to the pool. Any transaction left open 
+        on it is rolled back. 
+        """  
+        try:  
+            self._pool.putconn(conn)  
+        finally:  
+            with self._lock:  
+                self._in_use -= 1  
+            self._slots.release()  
+  
+    def closeall(self) -> None:  
+        """Close every connection in the pool."""  
+        self._pool.closeall()  
+  
+    def stats(self) -> dict[str, float]:  
+        """Return a snapshot of this pool's sizing and wait-time statistics: 
+            * minconn, maxconn: the configured size of the pool. 
+            * in_use, peak_in_use: the number of connections checked out now 
+              and at most at once. 
+            * checkouts: the number of connections checked out so far. 
+            * waits: how many of those checkouts had to wait for a connection. 
+            * total_wait, max_wait: time spent waiting, in seconds. 
+        """  
+        with self._lock:  
+            return {  
+                'minconn': self.minconn,  
+                'maxconn': self.maxconn,  
+                'in_use': self._in_use,  
+                'peak_in_use': self._peak_in_use,  
+                'checkouts': self._checkouts,  
+                'waits': self._waits,  
+                'total_wait': self._total_wait,  
+                'max_wait': self._max_wait,  
+            }  
+  
+  
+class Scenario:  
+    """The changes that the WasteWrangler calls made in a scenario would have 
+    made, had the scenario not been rolled back. See WasteWrangler.scenario. 
+ 
+    === Instance Attributes === 
+    inserted: maps each table to the rows the calls inserted into it, in the 
+        order they were inserted. 
+    updated: maps each table to the rows the calls updated, as they were 
+        after the update. 
+    result: the value returned by the function run in this scenario by 
+        WasteWrangler.run_scenarios, or None. 
+    """  
+    inserted: dict[str, list[tuple]]  
+    updated: dict[str, list[tuple]]  
+    result: object  
+    _in_call: bool  
+    _committed: bool  
+  
+    def __init__(self) -> None:  
+        """Initialize a scenario with no changes yet."""  
+        self.inserted = {}  
+        self.updated = {}  
+        self.result = None  
+        self._in_call = False  
+        self._committed = False  
+  
+    def tables(self) -> set[str]:  
+        """Return the tables this scenario changed."""  
+        return set(self.inserted) | set(self.updated)  
+  
+    def commit(self, inserted: Optional[dict[str, list[tuple]]],  
+               updated: Optional[dict[str, list[tuple]]]) -> None:  
+        """Record that the current call would have committed the rows 
+        <inserted> and <updated>, by table. 
+        """  
+        for changes, rows_by_table in ((self.inserted, inserted),  
+                                       (self.updated, updated)):  
+            for table, rows in (rows_by_table or {}).items():  
+                if len(rows) > 0:  
+                    changes.setdefault(table, []).extend(rows)  
+        self._committed = True  
+  
+    @contextlib.contextmanager  
+    def call(self, conn: pg_ext.connection) -> Iterator[None]:  
+        """Run a WasteWrangler call on <conn> in a savepoint, which stands in 
+        for the transaction the call would otherwise use: it is rolled back 
+        unless the call commits, and released otherwise. Calls made by the 
+        call share its savepoint. 
+        """  
+        if self._in_call:  
+            yield  
+            return  
+  
+        self._in_call = True  
+        self._committed = False  
+        cur = conn.cursor()  
+        cur.execute("SAVEPOINT scenario_call;")  
+        try:  
+            yield  
+        finally:  
+            self._in_call = False  
+            if not self._committed:  
+                cur.execute("ROLLBACK TO SAVEPOINT scenario_call;")  
+            cur.execute("RELEASE SAVEPOINT scenario_call;")  
+            cur.close()  
+  
+  
+def _with_connection(method: Callable) -> Callable:  
+    """Decorate a WasteWrangler method so that it runs with a connection 
+    checked out for the current thread, available as self._conn. 
+    """  
+    @functools.wraps(method)  
+    def wrapper(self: 'WasteWrangler', *args, **kwargs):  
+        if self._tracer is None:  
+            with self._checkout():  
+                return method(self, *args, **kwargs)  
+  
+        token = _call_path.set(_call_path.get() + (method.__name__,))  
+        start = perf_counter()  
+        try:  
+            with self._checkout():  
+                return method(self, *args, **kwargs)  
+        finally:  
+            self._tracer.method('/'.join(_call_path.get()),  
+                                perf_counter() - start)  
+            _call_path.reset(token)  
+    return wrapper  
   
   
 class WasteWrangler:  
@@ -34,18 +834,98 @@ class WasteWrangler:
     === Instance Attributes === 
     connection: connection to a PostgreSQL database of a waste management 
     service. 
+    pool_size: the maximum number of connections to open at once, or None if 
+    this WasteWrangler uses the single connection <connection>. 
+    serializable: whether transactions run at the SERIALIZABLE isolation 
+    level. 
+    itersize: the number of rows fetched at a time by reads that may cover 
+    every trip. 
+ 
+    The reference data (trucks, truck types, facilities, routes, drivers and 
+    technicians) is loaded when connecting and kept in a cache that is 
+    refreshed whenever one of those tables changes. cache_stats reports how 
+    well the cache is doing. 
+ 
+    When tracing is on, every query is attributed to the method that sent it, 
+    and trace_stats reports the number of queries, rows, time and errors of 
+    each method, as well as the plans of slow queries. 
+ 
+    Calls made in a scenario (see scenario) are rolled back at the end of it, 
+    and report the rows they would have written instead. 
+ 
+    In pooled mode (i.e. <pool_size> is not None), <connection> is always 
+    None. Instead, each method checks out a connection from a pool for the 
+    duration of its transaction, so that several threads can share this 
+    WasteWrangler. A thread that calls a method while every connection is 
+    checked out waits until one is returned. 
  
     Representation invariants: 
     - The database to which connection is established conforms to the schema 
       in waste_wrangler_schema.ddl. 
+    - The functions in waste_wrangler_functions.sql are installed in that 
+      database. 
     """  
     connection: Optional[pg_ext.connection]  
-  
-    def __init__(self) -> None:  
+    pool_size: Optional[int]  
+    _pool: Optional[_ConnectionPool]  
+    _cache: Optional[_ReferenceCache]  
+    _tracer: Optional[_Tracer]  
+    _components: Optional[_UnionFind]  
+    _components_lock: threading.Lock  
+    _local: threading.local  
+    _params: Optional[tuple[str, str, str]]  
+  
+    def __new__(cls, *args, backend: str = 'postgres', **kwargs):  
+        """Return a new WasteWrangler, or a MemoryWasteWrangler (see 
+        memory_wrangler.py) if <backend> is 'memory'. The other arguments, 
+        except <itersize>, do not apply to the memory backend. 
+        """  
+        if backend == 'memory':  
+            from memory_wrangler import MemoryWasteWrangler  
+            return MemoryWasteWrangler(kwargs.get('itersize', ITERSIZE))  
+        if backend != 'postgres':  
+            raise ValueError(f"Unknown backend: {backend}")  
+        return super().__new__(cls)  
+  
+    def __init__(self, pool_size: Optional[int] = None, trace: bool = False,  
+                 explain_threshold: Optional[float] = None,  
+                 backend: str = 'postgres', serializable: bool = False,  
+                 itersize: int = ITERSIZE) -> None:  
         """Initialize this WasteWrangler instance, with no database connection 
-        yet. 
+        yet. If <pool_size> is given, use a pool of <pool_size> connections 
+        instead of a single connection. They are all opened when connecting 
+        and kept open, so that each keeps its prepared statements. 
+ 
+        If <trace> is True or <explain_threshold> is given, keep statistics 
+        about the queries sent by each method (see trace_stats), including 
+        the plans of queries that take more than <explain_threshold> seconds. 
+ 
+        <backend> is always 'postgres' here; see __new__. 
+ 
+        If <serializable> is True, every transaction runs at the SERIALIZABLE 
+        isolation level, so that several processes can schedule at once as if 
+        one after the other. The scheduling methods run their transaction 
+        again when it fails to serialize (see conflict_stats). 
+ 
+        Reads that may cover every trip fetch <itersize> rows at a time from 
+        a server-side cursor. 
         """  
         self.connection = None  
+        self.pool_size = pool_size  
+        self._pool = None  
+        self._tracer = None  
+        if trace or explain_threshold is not None:  
+            self._tracer = _Tracer(explain_threshold)  
+        self._cache = None  
+        self._components = None  
+        self._components_lock = threading.Lock()  
+        self._local = threading.local()  
+        self._params = None  
+        self.serializable = serializable  
+        self.itersize = itersize  
+        self._conflicts = {'conflicts': 0, 'retries': 0, 'failures': 0,  
+                           'total_backoff': 0.0}  
+        self._conflicts_lock = threading.Lock()  
   
     def connect(self, dbname: str, username: str, password: str) -> bool:  
         """Establish a connection to the database <dbname> using the 
@@ -53,6 +933,9 @@ class WasteWrangler:
         instance attribute <connection>. In addition, set the search path 
         to waste_wrangler. 
  
+        In pooled mode, create the pool of connections instead, each with the 
+        search path set to waste_wrangler. 
+ 
         Return True if the connection was made successfully, False otherwise. 
         I.e., do NOT throw an error if making the connection fails. 
  
@@ -64,16 +947,39 @@ class WasteWrangler:
         False 
         """  
         try:  
-            self.connection = pg.connect(  
+            params = dict(  
                 dbname=dbname, user=username, password=password,  
                 options="-c search_path=waste_wrangler"  
             )  
-            return True  
+            if self.serializable:  
+                params['options'] += (  
+                    " -c default_transaction_isolation=serializable")  
+            if self.pool_size is not None:  
+                self._pool = _ConnectionPool(  
+                    self.pool_size, self.pool_size,  
+                    connection_factory=_Connection, **params  
+                )  
+            else:  
+                self.connection = pg.connect(  
+                    connection_factory=_Connection, **params  
+                )  
+            self._cache = _ReferenceCache(**params)  
+            self._params = (dbname, username, password)  
         except pg.Error:  
             return False  
   
+        try:  
+            with self._checkout() as conn:  
+                self._cache.load_all(conn.cursor())  
+        except pg.Error:  
+            # The schema may not be installed yet, in which case each table  
+            # is loaded the first time it is needed instead.  
+            pass  
+        return True  
+  
     def disconnect(self) -> bool:  
-        """Close this WasteWrangler's connection to the database. 
+        """Close this WasteWrangler's connection to the database, or every 
+        connection in its pool. 
  
         Return True if closing the connection was successful, False otherwise. 
         I.e., do NOT throw an error if closing the connection failed. 
@@ -87,10 +993,123 @@ class WasteWrangler:
         try:  
             if self.connection and not self.connection.closed:  
                 self.connection.close()  
+            if self._pool is not None:  
+                self._pool.closeall()  
+                self._pool = None  
+            if self._cache is not None:  
+                self._cache.close()  
+                self._cache = None  
+            self._params = None  
             return True  
         except pg.Error:  
             return False  
   
+    def pool_stats(self) -> dict[str, float]:  
+        """Return statistics about the connection pool of this WasteWrangler, 
+        as described in _ConnectionPool.stats, or an empty dictionary if it 
+        is not in pooled mode or not connected. 
+        """  
+        if self._pool is None:  
+            return {}  
+        return self._pool.stats()  
+  
+    def trace_stats(self) -> dict[str, dict]:  
+        """Return a snapshot of the statistics about the queries sent by 
+        each call path of this WasteWrangler, as described in 
+        _Tracer.snapshot, or an empty dictionary if tracing is off. 
+        """  
+        if self._tracer is None:  
+            return {}  
+        return self._tracer.snapshot()  
+  
+    def reset_trace_stats(self) -> None:  
+        """Forget the statistics returned by trace_stats."""  
+        if self._tracer is not None:  
+            self._tracer.reset()  
+  
+    def cache_stats(self) -> dict[str, int]:  
+        """Return the counters of the reference data cache, as described in 
+        _ReferenceCache.stats, or an empty dictionary if not connected. 
+        """  
+        if self._cache is None:  
+            return {}  
+        return self._cache.stats()  
+  
+    def conflict_stats(self) -> dict[str, float]:  
+        """Return the counters of scheduling transactions that conflicted with 
+        concurrent ones: 
+            * conflicts: the number of transactions that failed to serialize, 
+              deadlocked, or clashed with a trip or maintenance committed 
+              concurrently. 
+            * retries: how many of those were run again. 
+            * failures: how many of those made their method fail. 
+            * total_backoff: time spent waiting before retries, in seconds. 
+        """  
+        with self._conflicts_lock:  
+            return dict(self._conflicts)  
+  
+    @contextlib.contextmanager  
+    def scenario(self) -> Iterator[Scenario]:  
+        """Run the WasteWrangler calls made by this thread in the with block 
+        as a what-if scenario, and roll them all back at the end of it, so 
+        that the database is left as it was. 
+ 
+        Each call runs in its own savepoint instead of its own transaction, 
+        so the calls see the changes of the calls before them, and a call 
+        that fails leaves no changes behind, as usual. The Scenario returned 
+        collects the rows every call would have written. 
+ 
+        Scenarios can be nested: the calls in an inner scenario see the 
+        changes of the outer one, and are rolled back at the end of the 
+        inner one. All the scenarios of a thread use the same connection, so 
+        evaluating many scenarios in a row reuses its prepared statements. 
+ 
+        >>> with ww.scenario() as scenario: 
+        ...     ww.schedule_trips(1, dt.date(2023, 5, 8)) 
+        1 
+        >>> scenario.inserted['Trip'] 
+        [(1, 1, datetime.datetime(2023, 5, 8, 8, 0), None, 2, 1, 1)] 
+        """  
+        outer = getattr(self._local, 'scenario', None)  
+        scenario = Scenario()  
+        # Inside an outer scenario, the inner one is a single call of the  
+        # outer one, which never commits.  
+        with self._checkout() as conn:  
+            self._local.scenario = scenario  
+            try:  
+                yield scenario  
+            finally:  
+                self._local.scenario = outer  
+                if outer is None:  
+                    conn.rollback()  
+  
+        # Drop whatever was cached or computed from the rolled back changes  
+        for table in scenario.tables():  
+            if table == 'Trip':  
+                self.refresh_workmate_components()  
+            elif self._cache is not None:  
+                self._cache.invalidate(table.lower())  
+  
+    def run_scenarios(self, scenarios: dict[str, Callable[['WasteWrangler'],  
+                                                          object]]  
+                      ) -> dict[str, Scenario]:  
+        """Run each function in <scenarios> with this WasteWrangler in its 
+        own scenario, one after the other, and return the Scenario of each, 
+        by name. The Scenario's result is the value the function returned. 
+ 
+        >>> scenarios = ww.run_scenarios({ 
+        ...     'truck 1': lambda ww: ww.schedule_trips(1, tomorrow), 
+        ...     'truck 2': lambda ww: ww.schedule_trips(2, tomorrow), 
+        ... }) 
+        """  
+        results = {}  
+        for name, run in scenarios.items():  
+            with self.scenario() as scenario:  
+                scenario.result = run(self)  
+            results[name] = scenario  
+        return results  
+  
+    @_with_connection  
     def schedule_trip(self, rid: int, time: dt.datetime) -> bool:  
         """Schedule a truck and two employees to the route identified 
         with <rid> at the given time stamp <time> to pick up an 
@@ -137,157 +1156,86 @@ class WasteWrangler:
         tests could use any valid value for <time>. 
         """  
         try:  
-            # TODO: implement this method  
-            cur = self.connection.cursor()  
-  
-            #Check if rid exists in route table  
-            cur.execute("Select * from route where rid = %s;", (rid,))  
-            if(cur.rowcount == 0):  
-                return False  
-              
-            #Check if there is already a trip on this route  
-            cur.execute("Select * from trip where rid = %s and date(ttime) = date(%s);", (rid,time))  
-            if(cur.rowcount > 0):  
-                return False  
-  
-            #Gather all static information  
-            
-            #determine end time for trip  
-            cur.execute("Select length from route where rid = %s;",(rid,))  
-            length = cur.fetchone()[0]  
-            end_time = time + dt.timedelta(hours = length/5)   
-  
-  
-            #Checking if start and end time fall between 8am-4pm  
-            if(time.time() < dt.time(8,0,0)):  
-                return False  
-            if(end_time.time() > dt.time(16,0,0) ):  
-                return False  
-  
-  
-            #Find the route's wastetype  
-            cur.execute("Select wastetype from route where rid = %s;", (rid,))  
-            waste_type = cur.fetchone()[0]  
-  
-  
-            #Find all trucks that can go on this route (pick up that wastetype)  
-            cur.execute("Select truck.tid from truck join trucktype on truck.trucktype = trucktype.trucktype where wastetype = '%s';" % (waste_type))  
-            possible_trucks = []  
-              
-            for record in cur:  
-                if(record != None):  
-                    possible_trucks.append(record[0])  
-  
-            #Check if there are any trucks for this wasteypte  
-            if(len(possible_trucks) ==0 ):  
-                return False  
-  
-            # Check which of the possible trucks are available:   
-            available_trucks =[]  
-            for tid in possible_trucks:  
-                #First check if it has maintenance on the same day  
-                cur.execute("Select * from maintenance where tid = %s and mdate = date(%s);", (tid,time))  
-                if(cur.rowcount == 0):  
-  
-                    #Check if this truck has trips on this day  
-                    cur.execute("Select * from trip where tid = %s and date(ttime) = date(%s);", (tid,time))  
-  
-                    if(cur.rowcount == 0):  
-                        available_trucks.append(tid)  
-  
-                    if (cur.rowcount > 0):  
-                          
-                        #Check for those trips if the start time is 30 mins after this scheduling trip is done or if the end time is 30 mins before this trip starts  
-                        for row in cur:  
-                            if (row[2] > end_time + dt.timedelta(hours = 0.5)):  
-                                available_trucks.append(row[1])  
-                              
-                            #if start time is not good we need to check if it ends 30 mins before our wanted trip schd  
-                            cur.execute("Select * from trip join route on trip.rid = route.rid where trip.rid = %s and date(ttime) = date(%s);", (row[0],time))  
-                            trip_info= cur.fetchone()  
-                            trip_length = trip_info[9]  
-                            trip_endtime = trip_info[2] + dt.timedelta(hours = trip_length/5)  
-                            if(trip_endtime < time - dt.timedelta(hours = 0.5)):  
-                                available_trucks.append(row[1])  
-  
-            #Check if there are any available trucks  
-            if (len(available_trucks) ==0):  
-                return False  
-              
-            #Now we have all the trucks that fall within the restrictions find the truck with the largest capacity  
-            cur.execute("Select tid,trucktype,capacity from truck where tid = ANY (%s) order by capacity DESC;", (available_trucks,))  
-            list_of_trucks = cur.fetchall()  
-            best_truck = list_of_trucks[0][0]  
-            best_truck_trucktype = list_of_trucks[0][1]  
-            best_truck_cap = list_of_trucks[0][2]  
-  
-              
-            #Now find all the possible drivers for this trip  
-            cur.execute("Select eid from driver where trucktype = %s;", best_truck_trucktype)  
-            all_possible_first_driver =[]  
-            for record in cur:  
-                all_possible_first_driver.append(record[0])  
-  
-            if(len(all_possible_first_driver) ==0):  
-                return False  
-              
-            #If a driver who can drive this wastetype has a trip on the same day, remove them from list  
-            for driver in all_possible_first_driver:  
-                cur.execute("Select * from trip where (eid1=%s or eid2=%s) and date(ttime) = date(%s);",(driver,driver,time))  
-                if(cur.rowcount > 0):  
-                    any_drivers.remove(driver)  
-            #Get driver who can drive this trucktype and has most experience  
-            cur.execute("Select eid from employee where eid = ANY (%s) order by hiredate,eid;", (all_possible_first_driver,))  
-            dedicated_driver = cur.fetchone()[0]  
-            if(dedicated_driver == None):  
+            # The whole selection runs server side in schedule_trip() (see  
+            # waste_wrangler_functions.sql), so this is a single round trip.  
+            def attempt() -> Optional[tuple]:  
+                cur = self._conn.cursor()  
+                _execute(cur, 'schedule_trip', (rid, time))  
+                trip = cur.fetchone()  
+  
+                self._commit(inserted={'Trip': [trip] if trip else []})  
+                cur.close()  
+                return trip  
+  
+            trip = self._retry(attempt)  
+            if trip is None:  
                 return False  
-  
-            # Now find any second driver who has the most experience and no trip on this day  
-            any_drivers=[]  
-            cur.execute("Select distinct eid from driver;")  
-            if(cur.rowcount==0):  
-                return False  
-              
-            for record in cur:  
-                any_drivers.append(record[0])  
-  
-            # Remove any driver who has a trip on given date for scheduling  
-            for driver in any_drivers:  
-                cur.execute("Select * from trip where (eid1=%s or eid2=%s) and date(ttime) = date(%s);",(driver,driver,time))  
-                if(cur.rowcount > 0):  
-                    all_possible_first_driver.remove(driver)  
-  
-            # Select oldest out of these any drivers  
-            cur.execute("Select eid from employee where eid = ANY (%s) order by hiredate,eid;", (any_drivers,))  
-            second_driver = cur.fetchone()[0]  
-            if(second_driver == None):  
-                return False  
-              
-            #Now find a facility for this wastetype  
-            cur.execute("Select fid from facility where wastetype = %s order by fid;", (waste_type,))  
-            facility = cur.fetchone()[0]  
-  
-            #Make sure eid1>eid2  
-            if(dedicated_driver < second_driver):  
-                temp = dedicated_driver  
-                dedicated_driver = second_driver  
-                second_driver = temp  
-                  
-            #Now we have everything to schedule the trip  
-            cur.execute("Insert into trip (rid,tid,ttime,eid1,eid2,fid) values (%s,%s,%s,%s,%s,%s);",(rid,best_truck,time,dedicated_driver,second_driver,facility))  
-              
-            self.connection.commit()  
-            cur.close()  
-  
+            self._add_workmates([(trip[4], trip[5])])  
             return True  
   
-            pass  
         except pg.Error as ex:  
             # You may find it helpful to uncomment this line while debugging,  
             # as it will show you all the details of the error that occurred:  
             #raise ex  
             return False  
   
+    @_with_connection  
+    def schedule_trip_many(self, requests: list[tuple[int, dt.datetime]]  
+                           ) -> list[bool]:  
+        """Schedule a trip for each (rid, time) in <requests>, in the given 
+        order, as if schedule_trip was called for each of them in turn. 
+ 
+        The trips, maintenance and drivers of every day the requests fall on 
+        are loaded once, the trips are planned in memory, and they are all 
+        written with a single batched insert and a single commit. 
+ 
+        Return a list holding, for each request, True iff its trip has been 
+        scheduled successfully. 
+ 
+        Your method should NOT raise an error. If an error occurs, no trips 
+        are scheduled and every request fails. 
+        """  
+        try:  
+            def attempt() -> list[tuple]:  
+                cur = self._conn.cursor()  
+                days = sorted({time.date() for _, time in requests})  
+                plans = _DayPlan.load_days(cur, self._cache, days)  
+  
+                trips = []  
+                for rid, time in requests:  
+                    plan = plans[time.date()]  
+                    trips.append(plan.trips[-1]  
+                                 if plan.schedule_trip(rid, time) else None)  
+  
+                inserted = [trip for trip in trips if trip is not None]  
+                if len(inserted) > 0:  
+                    for day in days:  
+                        if len(plans[day].trips) > 0:  
+                            _execute(cur, 'lock_occupancy', plans[day].locks())  
+                    pg_extras.execute_values(  
+                        cur,  
+                        "INSERT INTO Trip (rID, tID, tTime, eID1, eID2, fID) "  
+                        "VALUES %s;",  
+                        inserted, page_size=len(inserted))  
+  
+                self._commit(inserted={'Trip': [  
+                    (rid, tid, time, None, eid1, eid2, fid)  
+                    for rid, tid, time, eid1, eid2, fid in inserted]})  
+                cur.close()  
+                return trips  
+  
+            trips = self._retry(attempt)  
+            self._add_workmates([(trip[3], trip[4])  
+                                 for trip in trips if trip is not None])  
+            return [trip is not None for trip in trips]  
+  
+        except pg.Error as ex:  
+            # You may find it helpful to uncomment this line while debugging,  
+            # as it will show you all the details of the error that occurred:  
+            #raise ex  
+            return [False] * len(requests)  
+  
+    @_with_connection  
     def schedule_trips(self, tid: int, date: dt.date) -> int:  
         """Schedule the truck identified with <tid> for trips on <date> using 
         the following approach: 
@@ -313,6 +1261,10 @@ class WasteWrangler:
                assumption that <tid> will travel an average of 5 kph. 
                Make sure that the last trip will not end after 4 p.m. 
  
+        No trips are scheduled on a day <tid> has maintenance, and trips 
+        <tid> already has on <date> are worked around with the same 30 minute 
+        gap. 
+ 
         Return the number of trips that were scheduled successfully. 
  
         Your method should NOT raise an error. 
@@ -320,237 +1272,130 @@ class WasteWrangler:
         While a realistic use case will provide a <date> in the near future, our 
         tests could use any valid value for <date>. 
         """  
+        # A single truck is just a fleet of one.  
+        return self.schedule_fleet(date, [tid]).get(tid, 0)  
+  
+    @_with_connection  
+    def schedule_fleet(self, date: dt.date,  
+                       tids: Optional[list[int]] = None) -> dict[int, int]:  
+        """Schedule every truck in <tids> (or every truck, if <tids> is None) 
+        for trips on <date>, in ascending order of tIDs. 
+ 
+        Each truck is scheduled following the same approach as 
+        schedule_trips, with routes and drivers used by a truck no longer 
+        available to the trucks that follow it. 
+ 
+        The day's trips, maintenance, drivers, routes and facilities are 
+        loaded once, all trucks are planned in memory and the resulting trips 
+        are written with a single batched insert. The database rejects the 
+        insert if another client committed a clashing trip in the meantime, 
+        in which case the day is loaded and planned again (see _retry). 
+ 
+        Return a dictionary mapping each scheduled tID to the number of trips 
+        that were scheduled for it. Trucks with no trips are included with a 
+        count of 0. 
+ 
+        Your method should NOT raise an error. If an error occurs, no trips 
+        are scheduled and an empty dictionary is returned. 
+        """  
         try:  
-            # TODO: implement this method  
-            cur = self.connection.cursor()  
-            num_trips_schd = 0  
-            test_id = 2  
-            test_type = 'plastic recycling'  
-            test_length = 20  
-            #Test route  
-            #cur.execute("Insert into route (rid,wastetype,length) values (%s,%s,%s);", (test_id,test_type,test_length))  
-    #1. Find routes not already scheduled for <date>, for which <tid>  
-  
-                #  is able to carry the waste type. Schedule these by ascending  
-  
-                #  order of rIDs.  
-  
-      
-  
-                #   a. Find the routes that are not already scheduled for the given date and for which the truck with the  
-  
-                #  specified ID is capable of carrying the waste type.  
-  
-                #  Once these routes are identified, they are scheduled in ascending order based on their route IDs.  
-  
-      
-  
-                # Find the type of truck  
-  
-            cur.execute("SELECT truckType FROM Truck WHERE tID = %s;", (tid,))  
-  
-            typeOfTruck = cur.fetchone()[0]  
-            if(typeOfTruck == None):  
-                return 0  
-              
-              
-  
-  
-  
-            # For that type of truck, see what kinds of wastes it can hold (e.g: recycling + compost OR only recycling)  
-  
-            cur.execute("SELECT wasteType FROM TruckType WHERE truckType = %s;", (typeOfTruck))  
-            wasteTypeForTruck=[]  
-            for record in cur:  
-                wasteTypeForTruck.append(record[0])  
-            temp= cur.fetchall()  
-            if(temp == None):  
-                return 0  
-              
-              
-  
-  
-  
-            # Get a list of rIDs for routes that are already scheduled for the given date  
-  
-            cur.execute("SELECT rID FROM Trip WHERE date(tTIME) = %s", (date,))  
-  
-            scheduledRids = [row[0] for row in cur.fetchall()]  
-              
-  
-              
-  
-            # Get a list of routes and their attributes  
-  
-            cur.execute("SELECT rID, wasteType, length FROM Route;")  
-  
-            routes = cur.fetchall()  
-              
-  
-              
-  
-            #   b. We would need to have access to a list of routes, each of which would have the following attributes: a unique route ID (rID), a waste type that the route  
-  
-            #  carries (waste_type), and a list of scheduled dates (scheduled_dates).  
-  
-            #  Then need to loop through the list of routes and check if a route is not already scheduled for the given date and if the truck with the specified ID is  
-  
-            #  capable of carrying the waste type for that route. If both conditions are met, the program would schedule the route for the given date and add the date  
-  
-            #  to the list of scheduled dates for that route.  
-  
-  
-  
-            # Loop through the list of routes and check if they are not already scheduled for the given  
-  
-            # date and if the truck with the specified ID is capable of carrying the waste type for that route.  
-  
-            to_be_scheduledRoutes = []  
-  
-            for rID, wasteType, length in routes:  
-  
-                if rID not in scheduledRids and wasteType in wasteTypeForTruck:  
-                      
-                    to_be_scheduledRoutes.append((rID, wasteType, length))  
-  
-                    #cur.execute("INSERT INTO Trip (rID, tID, ttime) VALUES (%s, %s, %s);", (rID, tid, date))  
-  
-                    #should i also do an update? ************************************************************************  
-  
-              
-            #  c. Finally, the scheduled routes would need to be sorted in ascending order based on their route IDs before they are returned as the result of the function.  
-  
-              
-  
-            # Sort the scheduled routes in ascending order based on their route IDs  
-  
-            to_be_scheduledRoutes = sorted(to_be_scheduledRoutes)  
-  
-  
-              
-  
-            if(len(to_be_scheduledRoutes)==0):  
-                return 0  
-  
-            # Have list of rids that do not have a trip on the given date and match the wastetype the given truck can pickup  
-            #rids_to_be_schd = []  
-              
-              
-               
-        #Now find all the possible drivers for this truck  
-            cur.execute("Select eid from driver where trucktype = %s;", typeOfTruck)  
-            all_possible_first_driver =[]  
-            for record in cur:  
-                all_possible_first_driver.append(record[0])  
-              
-  
-            if(len(all_possible_first_driver) ==0):  
-                return 0  
-              
-            #If a driver who can drive this wastetype has a trip on the same day, remove them from list  
-            for driver in all_possible_first_driver:  
-                cur.execute("Select * from trip where (eid1=%s or eid2=%s) and date(ttime) = %s;",(driver,driver,date))  
-                  
-                if(cur.rowcount > 0):  
-                      
-                    all_possible_first_driver.remove(driver)  
-                  
-              
-  
-            #Get driver who can drive this trucktype and has most experience  
-            cur.execute("Select eid from employee where eid = ANY (%s) order by hiredate,eid;", (all_possible_first_driver,))  
-            dedicated_driver = cur.fetchone()[0]  
-              
-            if(dedicated_driver == None):  
-                return False  
-  
-            # Now find any second driver who has the most experience and no trip on this day  
-            any_drivers=[]  
-            cur.execute("Select distinct eid from driver;")  
-            if(cur.rowcount==0):  
-                return 0  
-              
-            for record in cur:  
-                any_drivers.append(record[0])  
-              
-  
-            # Remove any driver who has a trip on given date for scheduling  
-            for driver in any_drivers:  
-                cur.execute("Select * from trip where (eid1=%s or eid2=%s) and date(ttime) = %s;",(driver,driver,date))  
-                  
-                if(cur.rowcount > 0):  
-                    any_drivers.remove(driver)  
-                  
-                      
-  
-            # Select oldest out of these any drivers  
-            cur.execute("Select eid from employee where eid = ANY (%s) order by hiredate,eid;", (any_drivers,))  
-            second_driver = cur.fetchone()[0]  
-              
-            if(second_driver == None):  
-                return 0  
-              
-            #Make sure eid1>eid2  
-            if(dedicated_driver < second_driver):  
-                temp = dedicated_driver  
-                dedicated_driver = second_driver  
-                second_driver = temp  
-                  
-              
-          
-            #we have the drivers for the day and all the routes that the truck can be used for  
-            time_keeper = dt.time(8,0,0) #starts at 8am  
-            time_date_keeper = dt.datetime.combine(date,time_keeper)  
-              
-            for route in to_be_scheduledRoutes:  
-  
-                #find facility for this route (lowest fid)  
-                  
-                cur.execute("Select fid from facility where wastetype = %s order by fid;", (route[1],))  
-                facility = cur.fetchone()[0]  
-                 
-                #Update the time variable to when the next trip can be scheduled  
-                #determine end time for trip  
-                cur.execute("Select length from route where rid = %s;",(route[0],))  
-                length = cur.fetchone()[0]  
-                end_time = time_date_keeper + dt.timedelta(hours = length/5)  
-  
-                if(end_time.time() > dt.time(16,0,0)):  
-                    continue  
-  
-                #Now we have everything to schedule the trip  
-                cur.execute("Insert into trip (rid,tid,ttime,eid1,eid2,fid) values (%s,%s,%s,%s,%s,%s);",(route[0],tid,time_date_keeper,dedicated_driver,second_driver,facility))  
-                num_trips_schd +=1  
-                  
-             
-  
-                #add the 30 mins buffer  
-                time_date_keeper = end_time + dt.timedelta(hours = 0.5)   
-                  
-                if(time_date_keeper.time() > dt.time(16,0,0)):  
-                    break  
-             
-             
-             
-             
-              
-  
-  
-  
+            if isinstance(date, dt.datetime):  
+                date = date.date()  
+  
+            def attempt() -> tuple[_DayPlan, dict[int, int]]:  
+                cur = self._conn.cursor()  
+                plan = _DayPlan.load(cur, self._cache, date, tids)  
+                counts = {}  
+                for tid in sorted(plan.trucks):  
+                    counts[tid] = plan.schedule_truck(tid)  
+  
+                if len(plan.trips) > 0:  
+                    _execute(cur, 'lock_occupancy', plan.locks())  
+                    pg_extras.execute_values(  
+                        cur,  
+                        "INSERT INTO Trip (rID, tID, tTime, eID1, eID2, fID) "  
+                        "VALUES %s;",  
+                        plan.trips, page_size=len(plan.trips))  
+  
+                self._commit(inserted={'Trip': [  
+                    (rid, tid, time, None, eid1, eid2, fid)  
+                    for rid, tid, time, eid1, eid2, fid in plan.trips]})  
+                cur.close()  
+                return plan, counts  
+  
+            plan, counts = self._retry(attempt)  
+  
+            self._add_workmates([(trip[3], trip[4]) for trip in plan.trips])  
+            return counts  
   
-              
-  
-  
-            self.connection.commit()  
-            cur.close()  
-            return num_trips_schd  
-            pass  
         except pg.Error as ex:  
             # You may find it helpful to uncomment this line while debugging,  
             # as it will show you all the details of the error that occurred:  
             #raise ex  
-            return 0  
-  
+            return {}  
+  
+    def schedule_range(self, start: dt.date, end: dt.date,  
+                       tids: Optional[list[int]] = None,  
+                       workers: Optional[int] = None  
+                       ) -> dict[dt.date, dict[int, int]]:  
+        """Schedule every truck in <tids> (or every truck, if <tids> is None) 
+        for trips on each day from <start> to <end> inclusive, as 
+        schedule_fleet does for a single day. 
+ 
+        The rules only relate trips, drivers and maintenance of the same day, 
+        so the days are scheduled in parallel by a pool of <workers> 
+        processes (one per CPU by default), each with its own connection to 
+        the database this WasteWrangler is connected to. As with any use of 
+        multiprocessing, a script that calls this method must only do so 
+        under if __name__ == '__main__'. 
+ 
+        Return a dictionary mapping each day to the dictionary schedule_fleet 
+        returned for it. It is empty if this WasteWrangler is not connected, 
+        and leaves out the days of any worker that died or could not be 
+        started. 
+ 
+        Your method should NOT raise an error. 
+        """  
+        if self._params is None:  
+            return {}  
+        if isinstance(start, dt.datetime):  
+            start = start.date()  
+        if isinstance(end, dt.datetime):  
+            end = end.date()  
+        days = [start + dt.timedelta(days=i)  
+                for i in range((end - start).days + 1)]  
+        if len(days) == 0:  
+            return {}  
+  
+        workers = min(workers or os.cpu_count() or 1, len(days))  
+        # Spawned workers inherit none of this process's connections.  
+        context = multiprocessing.get_context('spawn')  
+        counts = {}  
+        failed = False  
+        # A pool that can not start its processes, or whose worker dies,  
+        # raises OSError or BrokenProcessPool (a RuntimeError).  
+        try:  
+            with concurrent.futures.ProcessPoolExecutor(  
+                    workers, mp_context=context, initializer=_start_worker,  
+                    initargs=self._params + (self.serializable,)) as pool:  
+                futures = {pool.submit(_schedule_day, day, tids): day  
+                           for day in days}  
+                for future in concurrent.futures.as_completed(futures):  
+                    try:  
+                        counts[futures[future]] = future.result()  
+                    except (OSError, RuntimeError):  
+                        failed = True  
+        except (OSError, RuntimeError):  
+            failed = True  
+        counts = {day: counts[day] for day in days if day in counts}  
+  
+        # The workers' trips never reached the workmate components, and a  
+        # worker that failed may have committed some before it did  
+        if failed or any(sum(day.values()) > 0 for day in counts.values()):  
+            self.refresh_workmate_components()  
+        return counts  
+  
+    @_with_connection  
     def update_technicians(self, qualifications_file: TextIO) -> int:  
         """Given the open file <qualifications_file> that follows the format 
         described on the handout, update the database to reflect that the 
@@ -575,65 +1420,41 @@ class WasteWrangler:
             might find helpful for completing this method. 
         """  
         try:  
-            # TODO: implement this method  
-            cur = self.connection.cursor()  
+            cur = self._conn.cursor()  
   
             technician_data = WasteWrangler._read_qualifications_file(qualifications_file)  
-              
-            num_successful_changes = 0  
-            for info in technician_data:  
-                #if(len(info) == 3):  
-                firstname =  info[0]  
-                surname = info[1]  
-                fullname = str(firstname + " " + surname)  
-                truck_type = info[2]  
-                eid = -1  
-                '''if(len(info) == 4): 
-                    firstname =  info[1] 
-                    surname = info[2] 
-                    truck_type = info[3]'''  
-  
-                # Check if the given employee name is already in the database  
-                cur.execute("Select eid from employee where name = '%s';" % (fullname))  
-                row = cur.fetchone()  
-                if ( row == None):  
-                    continue  
-                      
-                else:  
-                    eid = row  
-  
-                # Check if the given trucktype is a valid trucktype  
-                cur.execute("Select * from trucktype where trucktype = %s;", truck_type)  
-                row1 = cur.fetchone()  
-                if (row1 == None):  
-                    continue  
-  
-                # Check if the given employee is a driver  
-                cur.execute("Select * from driver where eid = %s;", eid)  
-                row2 = cur.fetchone()  
-                if(row2 !=None):  
-                    continue  
-                  
-                # Check if the current technician is already qualified to do maintenance on that truck type  
-                cur.execute("Select * from technician where eid = %s and trucktype = %s;", (eid, truck_type))  
-                row3 = cur.fetchone()  
-                if (row3 !=None):  
-                    continue  
-                  
-                # If it passed all above cases then we can insert new entry into technician table and increase count for number of successful changes  
-                cur.execute("INSERT INTO technician VALUES (%s,%s);", (eid, truck_type))  
-                num_successful_changes +=1  
-                  
-            self.connection.commit()  
+  
+            # Load every entry in one COPY, then check and insert them all  
+            # at once. Entries with an unknown name or truck type drop out of  
+            # the joins, drivers are filtered out, and entries that are  
+            # already recorded (in the table or earlier in the file) are  
+            # skipped by DISTINCT and ON CONFLICT, so the row count of the  
+            # INSERT is the number of valid entries.  
+            data = io.StringIO()  
+            writer = csv.writer(data)  
+            for firstname, surname, truck_type in technician_data:  
+                writer.writerow([firstname + " " + surname, truck_type])  
+            data.seek(0)  
+  
+            cur.execute(_QUALIFICATION_LOAD)  
+            cur.copy_expert("COPY qualification_load FROM STDIN WITH (FORMAT csv);",  
+                            data)  
+            _execute(cur, 'add_technicians')  
+            num_successful_changes = cur.rowcount  
+  
+            self._commit(inserted={'Technician': cur.fetchall()})  
             cur.close()  
+  
+            # Don't wait for the notification to reach the cache  
+            self._cache.invalidate('technician')  
             return num_successful_changes  
-            pass  
         except pg.Error as ex:  
             # You may find it helpful to uncomment this line while debugging,  
             # as it will show you all the details of the error that occurred:  
             # raise ex  
             return 0  
   
+    @_with_connection  
     def workmate_sphere(self, eid: int) -> list[int]:  
   
         """Return the workmate sphere of the driver identified by <eid>, as a 
@@ -670,119 +1491,88 @@ class WasteWrangler:
   
         try:  
   
-            # Make a cursor and then store the table values of all the employee 1 and 2 IDs into cur1  
-  
-            cur = self.connection.cursor()  
-  
-            # Get all the tuples where either the eid1 or eid2 is the eid  
-  
-            cur.execute("SELECT eID1, eID2 FROM Trip WHERE eID1 = %s OR eID2 = %s;", (eid, eid))              
-  
-             
-  
-            # All rows from the select statement are contained in rows  
-  
-            rows = cur.fetchall()  
-  
-             
-  
-            # Initialize the workmate sphere with the employees who have been on a trip with <eid>:  
-  
-            sphere = set()  
-  
-            for row in rows:  
+            cur = self._conn.cursor()  
   
-                if row[1] == eid:  
+            # The sphere is the transitive closure of "has been on a trip with",  
   
-                    sphere.add(row[0])  
+            # computed server side with a recursive query that follows the  
   
-                elif row[0] == eid:  
+            # Trip(eID1) and Trip(eID2) indexes from one level to the next  
   
-                    sphere.add(row[1])  
+            _execute(cur, 'workmate_sphere', (eid,))  
   
-   
+            sphere = [row[0] for row in cur.fetchall()]  
   
-            if len(sphere) == 0:  
   
-                return []  
   
-   
-  
-            # Recursively add employees who have been on a trip with an employee in the current workmate sphere:  
-  
-            # This loop queries the database to find employees who have been on trips with the employees in the current  
-  
-            # workmate sphere (the employees found in the previous iteration(s) of the loop).  
-  
-   
-  
-            while (1):  
-  
-                # Use a query to find all employees who have been on a trip with an employee in the current workmate sphere,  
-  
-                # but who have not been on a  
-  
-                # trip with the current employee (eid).  
-  
-                lengthSphere = len(sphere)  
-  
-   
-  
-                cur.execute("SELECT eID1, eID2 FROM Trip WHERE (eID1 IN %s OR eID2 IN %s);", (tuple(sphere), tuple(sphere)))  
-  
-                new_workmates = set()  
-  
-                for row in cur.fetchall():  
-  
-                    if row[1] in sphere:  
-  
-                        new_workmates.add(row[0])  
-  
-                    elif row[0] in sphere:  
-  
-                        new_workmates.add(row[1])  
-  
-                sphere = sphere.union(new_workmates)  
+            # Commit + close  
   
-                newLengthSphere = len(sphere)  
+            self._commit()  
   
-   
+            cur.close()  
   
-                if newLengthSphere == lengthSphere:  
   
-                    break  
   
-   
+            return sphere  
   
-            # Remove <eid> and duplicates from the workmate sphere and return the result as a list:  
+        except pg.Error as ex:  
   
-            sphere.discard(eid)  
+            # You may find it helpful to uncomment this line while debugging,  
   
-   
+            # as it will show you all the details of the error that occurred:  
   
-            # Commit + close  
+            # raise ex  
   
-            self.connection.commit()  
   
-            cur.close()  
   
-   
+            return []  
   
-            return list(sphere)  
+    @_with_connection  
+    def workmate_components(self) -> dict[int, int]:  
+        """Return a dictionary that maps the eID of every employee who has 
+        been on a trip to a label for their workmate sphere: two employees 
+        have the same label iff they are in each other's workmate sphere. 
+        The label of a sphere is the lowest eID in it. 
+ 
+        The workmate sphere of an employee is therefore every other employee 
+        with the same label. 
+ 
+        The labels are computed with a single pass over Trip the first time 
+        this method is called, and then kept up to date as schedule_trip, 
+        schedule_trips and schedule_fleet insert trips. Trips inserted by 
+        anyone else are only reflected after refresh_workmate_components. 
+ 
+        Your method should NOT return an error. If an error occurs, your method 
+        should simply return an empty dictionary. 
+        """  
+        try:  
+            with self._components_lock:  
+                if self._components is None:  
+                    components = _UnionFind()  
+                    for eid1, eid2 in _stream(self._conn, 'workmate_pairs',  
+                                              "SELECT eID1, eID2 FROM Trip;",  
+                                              itersize=self.itersize):  
+                        components.union(eid1, eid2)  
+                    self._commit()  
+                    self._components = components  
+                return self._components.labels()  
   
         except pg.Error as ex:  
-  
             # You may find it helpful to uncomment this line while debugging,  
-  
             # as it will show you all the details of the error that occurred:  
-  
             # raise ex  
+            return {}  
   
-              
-  
-            return []  
+    def refresh_workmate_components(self) -> None:  
+        """Forget the labels computed by workmate_components, so that they 
+        are recomputed from Trip the next time they are needed. 
+        """  
+        with self._components_lock:  
+            self._components = None  
   
-    def schedule_maintenance(self, date: dt.date) -> int:  
+    @_with_connection  
+    def schedule_maintenance(self, date: dt.date,  
+                             horizon: int = MAINTENANCE_HORIZON) -> int:  
         """For each truck whose most recent maintenance before <date> happened 
         over 90 days before <date>, and for which there is no scheduled 
         maintenance up to 10 days following date, schedule maintenance with 
@@ -806,65 +1596,28 @@ class WasteWrangler:
  
         While a realistic use case will provide a <date> in the near future, our 
         tests could use any valid value for <date>. 
+ 
+        Only the <horizon> days after <date> are searched; a truck with no 
+        suitable day in that time is not scheduled. 
         """  
         try:  
-            cur = self.connection.cursor()  
-            count = 0  
-            list_90days = []  
-            list_10days_future = []  
-            # All trucks who did not have maintenance in the last 90 days compared to the given date HAVW To FIX DATE THING  
-            cur.execute("Select * from maintenance where mdate < date(%s) - interval '90 days';", (date,))  
-            for record in cur:  
-                list_90days.append(record[0])  
-  
-            # All trucks who have maintenace in the next 10 days  
-            cur.execute("Select * from maintenance where mdate > date(%s) + interval '10 days';", (date,))  
-            for record in cur:  
-                list_10days_future.append(record[0])  
-  
-  
-            need_maintenance = set(list_90days) - set(list_10days_future)  
-            need_maintenance =  sorted(need_maintenance)  
-              
-            for truck in need_maintenance:  
-                i = 0   
-                isvalid = False  
-                while (isvalid == False):  
-                    i+=1  
-                    next_day = date + dt.timedelta(days=i)  
-                    cur.execute("Select * From trip where tid = %s and date(ttime) = %s;",(truck,next_day))  
-                     
-                    if(cur.rowcount == 0):  
-                          
-                        cur.execute("Select trucktype from truck where tid = %s;", (truck,))  
-                        truck_type = cur.fetchone()  
-                          
-                        # Find technicians who can work on this truck  
-                        technicians = []  
-                        cur.execute("Select * from technician where trucktype = %s;", truck_type[0])  
-                        technicians = cur.fetchall()  
-                        technicians.sort()  
-                          
-  
-                        for tech in technicians:  
-                            cur.execute("Select * from maintenance where eid = %s and mdate = %s;", (tech[0],next_day))  
-                            if(cur.rowcount == 0):  
-                                cur.execute("Insert into maintenance values (%s,%s,%s);", (truck,tech[0],next_day))  
-                                count +=1  
-                                isvalid = True  
-                                break  
-                      
-              
-            self.connection.commit()  
-            cur.close()  
-            return count  
-            pass  
+            def attempt() -> list[tuple]:  
+                cur = self._conn.cursor()  
+                _execute(cur, 'schedule_maintenance', (date, horizon))  
+                scheduled = cur.fetchall()  
+  
+                self._commit(inserted={'Maintenance': scheduled})  
+                cur.close()  
+                return scheduled  
+  
+            return len(self._retry(attempt))  
         except pg.Error as ex:  
             # You may find it helpful to uncomment this line while debugging,  
             # as it will show you all the details of the error that occurred:  
             # raise ex  
             return 0  
   
+    @_with_connection  
     def reroute_waste(self, fid: int, date: dt.date) -> int:  
   
         """Reroute the trips to <fid> on day <date> to another facility that 
@@ -901,131 +1654,754 @@ class WasteWrangler:
  
         """  
   
-        try:  
-  
-            # TODO: implement this method  
+        # A single facility on a single day is the simplest bulk reroute.  
+        return self.reroute_waste_bulk([fid], date, date).get(fid, 0)  
   
-            # Get all facilities and their wasteTypes:  
+    @_with_connection  
+    def reroute_waste_bulk(self, fids: list[int], start_date: dt.date,  
+                           end_date: dt.date) -> dict[int, int]:  
+        """Reroute the trips to any of the facilities <fids> from <start_date> 
+        to <end_date> inclusive, as reroute_waste does for a single facility 
+        and day. 
+ 
+        The trips to a facility go to the facility with the smallest fID that 
+        takes the same type of waste and is not in <fids>. Trips to a facility 
+        with no such replacement are left alone. 
+ 
+        Return a dictionary that maps each fID in <fids> to the number of 
+        trips rerouted away from it. 
+ 
+        Your method should NOT return an error. If an error occurs, your method 
+        should simply return an empty dictionary i.e., no trips have been 
+        re-routed. 
+        """  
+        try:  
+            cur = self._conn.cursor()  
+            args = (list(fids), start_date, end_date)  
+            counts = {fid: 0 for fid in fids}  
+            # Only a scenario has to record the rerouted trips, so otherwise  
+            # they are counted on the server  
+            if getattr(self._local, 'scenario', None) is None:  
+                _execute(cur, 'reroute_counts', args)  
+                counts.update(cur.fetchall())  
+                self._commit()  
+            else:  
+                _execute(cur, 'reroute_facilities', args)  
+                rerouted = cur.fetchall()  
+                for trip in rerouted:  
+                    counts[trip[0]] += 1  
+                self._commit(updated={'Trip': [trip[1:] for trip in rerouted]})  
+            cur.close()  
+            return counts  
   
-            cur = self.connection.cursor()  
+        except pg.Error as ex:  
+            # You may find it helpful to uncomment this line while debugging,  
+            # as it will show you all the details of the error that occurred:  
+            # raise ex  
+            return {}  
   
-            cur.execute("SELECT fid, wastetype FROM Facility;")  
+    # =========================== Helper methods ============================= #  
   
-            rows = cur.fetchall()  
+    def _add_workmates(self, pairs: list[tuple[int, int]]) -> None:  
+        """Record that the employees in each of the (eID1, eID2) <pairs> have 
+        been on a trip together, if the workmate components are loaded. 
+        """  
+        with self._components_lock:  
+            if self._components is not None:  
+                for eid1, eid2 in pairs:  
+                    self._components.union(eid1, eid2)  
+  
+    def _retry(self, attempt: Callable[[], object]) -> object:  
+        """Return the result of <attempt>, which runs a whole transaction on 
+        the connection of the current thread and commits it. 
+ 
+        If the transaction conflicts with concurrent ones (see _RETRYABLE), 
+        it is rolled back and <attempt> is called again after a random 
+        backoff, up to SCHEDULE_ATTEMPTS times in all, after which the error 
+        is raised. In a scenario the error is raised right away, since 
+        rolling back would undo the whole scenario. 
+        """  
+        in_scenario = getattr(self._local, 'scenario', None) is not None  
+        for attempts in range(1, SCHEDULE_ATTEMPTS + 1):  
+            try:  
+                return attempt()  
+            except _RETRYABLE:  
+                retry = attempts < SCHEDULE_ATTEMPTS and not in_scenario  
+                delay = _backoff(attempts) if retry else 0.0  
+                with self._conflicts_lock:  
+                    self._conflicts['conflicts'] += 1  
+                    self._conflicts['retries' if retry else 'failures'] += 1  
+                    self._conflicts['total_backoff'] += delay  
+                if not retry:  
+                    raise  
+                self._conn.rollback()  
+                sleep(delay)  
+  
+    def _commit(self, inserted: Optional[dict[str, list[tuple]]] = None,  
+                updated: Optional[dict[str, list[tuple]]] = None) -> None:  
+        """Commit the transaction of the current thread, which has inserted 
+        the rows <inserted> and updated the rows <updated>, by table. In a 
+        scenario, record the rows in the scenario instead. 
+        """  
+        scenario = getattr(self._local, 'scenario', None)  
+        if scenario is not None:  
+            scenario.commit(inserted, updated)  
+        else:  
+            self._conn.commit()  
+  
+    @property  
+    def _conn(self) -> pg_ext.connection:  
+        """The connection checked out by the current thread."""  
+        return self._local.connection  
+  
+    @contextlib.contextmanager  
+    def _checkout(self) -> Iterator[pg_ext.connection]:  
+        """Check out a connection for the current thread for the duration of 
+        the with block: the single connection, or one from the pool in pooled 
+        mode. Nested checkouts reuse the same connection. 
+ 
+        Any transaction left open when the outermost block exits is rolled 
+        back, so that methods that fail leave no changes behind. 
+        """  
+        conn = getattr(self._local, 'connection', None)  
+        if conn is not None:  
+            scenario = getattr(self._local, 'scenario', None)  
+            if scenario is None:  
+                yield conn  
+            else:  
+                with scenario.call(conn):  
+                    yield conn  
+            return  
+  
+        conn = self.connection if self._pool is None else self._pool.getconn()  
+        if conn is not None:  
+            conn.tracer = self._tracer  
+        self._local.connection = conn  
+        try:  
+            yield conn  
+        finally:  
+            self._local.connection = None  
+            try:  
+                if (conn is not None and not conn.closed  
+                        and conn.status != pg_ext.STATUS_READY):  
+                    conn.rollback()  
+            finally:  
+                if self._pool is not None:  
+                    self._pool.putconn(conn)  
+ 
+    @staticmethod  
+    def _read_qualifications_file(file: TextIO) -> list[list[str, str, str]]:  
+        """Helper for update_technicians. Accept an open file <file> that 
+        follows the format described on the A2 handout and return a list 
+        representing the information in the file, where each item in the list 
+        includes the following 3 elements in this order: 
+            * The first name of the technician. 
+            * The last name of the technician. 
+            * The truck type that the technician is currently qualified to work 
+              on. 
+ 
+        Pre-condition: 
+            <file> follows the format given on the A2 handout. 
+        """  
+        result = []  
+        employee_info = []  
+        for idx, line in enumerate(file):  
+            if idx % 2 == 0:  
+                info = line.strip().split(' ')[-2:]  
+                fname, lname = info  
+                employee_info.extend([fname, lname])  
+            else:  
+                employee_info.append(line.strip())  
+                result.append(employee_info)  
+                employee_info = []  
   
-   
+        return result  
   
-            # Get the one particular valid waste (same as the waste type from fid)  
   
-            cur.execute("SELECT wastetype FROM Facility WHERE fid = %s;", (fid, ))  
+def _backoff(attempts: int) -> float:  
+    """Return a random time to wait, in seconds, before running again a 
+    transaction that conflicted with concurrent ones <attempts> times. 
+    """  
+    return random.uniform(0, RETRY_BACKOFF * 2 ** (attempts - 1))  
   
-            # Fetch one since you will only get one wasteType  
   
-            validWasteType = cur.fetchone()            
+# The WasteWrangler of a schedule_range worker process, or None if it could  
+# not connect.  
+_worker: Optional[WasteWrangler] = None  
   
-   
   
-            cur.execute("SELECT fid FROM Facility WHERE wastetype = %s AND fid <> %s ORDER BY fid;", (validWasteType, fid))  
+def _start_worker(dbname: str, username: str, password: str,  
+                  serializable: bool) -> None:  
+    """Connect the WasteWrangler of this schedule_range worker process to the 
+    database <dbname>, using the username <username> and password <password>, 
+    in serializable mode if <serializable> is True. 
+    """  
+    global _worker  
+    _worker = WasteWrangler(serializable=serializable)  
+    if not _worker.connect(dbname, username, password):  
+        _worker = None  
   
-            valid_facilities = [row[0] for row in cur.fetchall()]  
   
-   
+def _schedule_day(date: dt.date, tids: Optional[list[int]]) -> dict[int, int]:  
+    """Schedule the trucks <tids> for trips on <date> with the WasteWrangler of 
+    this schedule_range worker process, as schedule_fleet does. 
+    """  
+    if _worker is None:  
+        return {}  
+    return _worker.schedule_fleet(date, tids)  
   
-            # Get all trips that are scheduled to arrive at the given facility on the given date:  
   
-            cur.execute("SELECT * FROM Trip WHERE fID = %s AND date(tTIME) = %s;", (fid, date))  
+class _Intervals:  
+    """A set of disjoint, half-open [start, end) intervals kept sorted by 
+    start time, so that lookups take O(log n). 
+ 
+    === Instance Attributes === 
+    starts: the start of each interval, in ascending order. 
+    ends: the end of each interval, in the same order as <starts>. 
+ 
+    Representation invariants: 
+    - ends[i] < starts[i + 1], i.e. touching or overlapping intervals are 
+      merged when they are added. 
+    """  
+    starts: list[dt.datetime]  
+    ends: list[dt.datetime]  
   
-            trips_to_reroute = cur.fetchall()  
+    def __init__(self) -> None:  
+        """Initialize an empty set of intervals."""  
+        self.starts = []  
+        self.ends = []  
   
-   
+    def add(self, start: dt.datetime, end: dt.datetime) -> None:  
+        """Add the interval [<start>, <end>), merging it with any interval it 
+        touches or overlaps. 
+        """  
+        lo = bisect.bisect_left(self.ends, start)  
+        hi = bisect.bisect_right(self.starts, end)  
+        if lo < hi:  
+            start = min(start, self.starts[lo])  
+            end = max(end, self.ends[hi - 1])  
+        self.starts[lo:hi] = [start]  
+        self.ends[lo:hi] = [end]  
+  
+    def is_free(self, start: dt.datetime, end: dt.datetime) -> bool:  
+        """Return True iff no interval overlaps [<start>, <end>)."""  
+        i = bisect.bisect_left(self.starts, end) - 1  
+        return i < 0 or self.ends[i] <= start  
+  
+    def next_free(self, start: dt.datetime,  
+                  duration: dt.timedelta) -> dt.datetime:  
+        """Return the earliest time at or after <start> at which an interval 
+        of length <duration> is free. 
+        """  
+        i = bisect.bisect_right(self.ends, start)  
+        while i < len(self.starts) and self.starts[i] < start + duration:  
+            start = max(start, self.ends[i])  
+            i += 1  
+        return start  
   
-            # Check if there are trips to reroute:  
   
-            if len(trips_to_reroute) == 0:  
+class AvailabilityIndex:  
+    """The busy times of trucks and drivers on a single day. 
+ 
+    Each trip occupies its truck and both of its drivers from its start until 
+    BUFFER after its end, where the end is computed from the length of its 
+    route at SPEED kph. Two trips of the same truck or driver conflict iff 
+    their occupied intervals overlap, so every availability check is a single 
+    O(log n) lookup. The index is updated as trips are added to it. 
+ 
+    === Instance Attributes === 
+    date: the day this index covers. 
+    maintenance: the tIDs that have maintenance on <date>. 
+    routes: the rIDs that have a trip on <date>. 
+    """  
+    date: dt.date  
+    maintenance: set[int]  
+    routes: set[int]  
+    _trucks: dict[int, _Intervals]  
+    _drivers: dict[int, _Intervals]  
+  
+    def __init__(self, date: dt.date) -> None:  
+        """Initialize an index for <date> in which everyone is available."""  
+        self.date = date  
+        self.maintenance = set()  
+        self.routes = set()  
+        self._trucks = {}  
+        self._drivers = {}  
+  
+    @classmethod  
+    def load(cls, cur: pg_ext.cursor, date: dt.date) -> 'AvailabilityIndex':  
+        """Return the index of the trips and maintenance on <date>, loaded 
+        from the occupancy tables using the cursor <cur>. 
+        """  
+        _execute(cur, 'day_trucks', (date,))  
+        trucks = cur.fetchall()  
+        _execute(cur, 'day_drivers', (date,))  
+        drivers = cur.fetchall()  
+        return cls.from_occupancy(date, trucks, drivers)  
+  
+    @classmethod  
+    def load_days(cls, cur: pg_ext.cursor, dates: list[dt.date]  
+                  ) -> dict[dt.date, 'AvailabilityIndex']:  
+        """Return the index of the trips and maintenance on each of <dates>, 
+        loaded from the occupancy tables using the cursor <cur>. 
+        """  
+        trucks = {date: [] for date in dates}  
+        drivers = {date: [] for date in dates}  
+        _execute(cur, 'days_trucks', (list(dates),))  
+        for row in cur.fetchall():  
+            trucks[row[0]].append(row[1:])  
+        _execute(cur, 'days_drivers', (list(dates),))  
+        for row in cur.fetchall():  
+            drivers[row[0]].append(row[1:])  
+        return {date: cls.from_occupancy(date, trucks[date], drivers[date])  
+                for date in dates}  
+  
+    @classmethod  
+    def from_rows(cls, date: dt.date, trips: list[tuple],  
+                  maintenance: list[tuple]) -> 'AvailabilityIndex':  
+        """Return the index for <date> given its trips as (rID, tID, eID1, 
+        eID2, tTime, length) rows <trips>, and the trucks with maintenance as 
+        (tID,) rows <maintenance>. 
+        """  
+        index = cls(date)  
+        for rid, tid, eid1, eid2, start, length in trips:  
+            index.add_trip(rid, tid, eid1, eid2, start, length)  
+        index.maintenance = {row[0] for row in maintenance}  
+        return index  
+  
+    @classmethod  
+    def from_occupancy(cls, date: dt.date, trucks: list[tuple],  
+                       drivers: list[tuple]) -> 'AvailabilityIndex':  
+        """Return the index for <date> given the rows of the statements 
+        day_trucks (<trucks>) and day_drivers (<drivers>) for <date>. Their 
+        busy intervals already include BUFFER. 
+        """  
+        index = cls(date)  
+        for tid, rid, start, end in trucks:  
+            if rid is None:  
+                index.maintenance.add(tid)  
+            else:  
+                index.routes.add(rid)  
+                index._trucks.setdefault(tid, _Intervals()).add(start, end)  
+        for eid, start, end in drivers:  
+            index._drivers.setdefault(eid, _Intervals()).add(start, end)  
+        return index  
+  
+    def add_trip(self, rid: int, tid: int, eid1: int, eid2: int,  
+                 start: dt.datetime, length: float) -> None:  
+        """Record a trip on route <rid> by truck <tid> with drivers <eid1> 
+        and <eid2> that starts at <start>, where the route is <length> km. 
+        """  
+        self.routes.add(rid)  
+        end = start + dt.timedelta(hours=length / SPEED) + BUFFER  
+        self._trucks.setdefault(tid, _Intervals()).add(start, end)  
+        for eid in (eid1, eid2):  
+            self._drivers.setdefault(eid, _Intervals()).add(start, end)  
+  
+    def truck_free(self, tid: int, start: dt.datetime,  
+                   end: dt.datetime) -> bool:  
+        """Return True iff truck <tid> has no maintenance on this day and can 
+        take a trip from <start> to <end>. 
+        """  
+        if tid in self.maintenance:  
+            return False  
+        return self._free(self._trucks, tid, start, end)  
   
-                return 0  
+    def driver_free(self, eid: int, start: Optional[dt.datetime] = None,  
+                    end: Optional[dt.datetime] = None) -> bool:  
+        """Return True iff driver <eid> can take a trip from <start> to 
+        <end>, or has no trips at all on this day if <start> and <end> are 
+        None. 
+        """  
+        if start is None:  
+            return eid not in self._drivers  
+        return self._free(self._drivers, eid, start, end)  
+  
+    def next_truck_slot(self, tid: int, start: dt.datetime,  
+                        duration: dt.timedelta) -> dt.datetime:  
+        """Return the earliest time at or after <start> at which truck <tid> 
+        can begin a trip of length <duration>. 
+        """  
+        if tid not in self._trucks:  
+            return start  
+        return self._trucks[tid].next_free(start, duration + BUFFER)  
   
-   
+    @staticmethod  
+    def _free(intervals: dict[int, _Intervals], key: int,  
+              start: dt.datetime, end: dt.datetime) -> bool:  
+        """Return True iff <key> is free for a trip from <start> to <end> 
+        according to <intervals>. 
+        """  
+        return key not in intervals or intervals[key].is_free(start,  
+                                                              end + BUFFER)  
   
-            # Want the first fID (lowest)  
   
-            nice_facility = valid_facilities[0]  
+class _DayPlan:  
+    """The state needed to schedule trucks for trips on a single day, loaded 
+    from the database once and updated in memory as trips are planned. 
+ 
+    === Instance Attributes === 
+    date: the day being planned. 
+    trucks: maps each tID being planned to its truck type. 
+    capacities: maps each tID being planned to its capacity. 
+    waste_types: maps each truck type to the waste types it can carry. 
+    routes: maps each rID not yet scheduled on <date> to its waste type and 
+        length, in ascending order of rIDs. 
+    facilities: maps each waste type to the lowest fID that handles it. 
+    availability: the busy times of trucks and drivers on <date>. 
+    drivers: the drivers hired on or before <date>, as (eID, truck types) 
+        pairs, most experienced first and by ascending eID in case of ties. 
+    trips: the Trip rows (rID, tID, tTime, eID1, eID2, fID) planned so far. 
+    """  
+    date: dt.date  
+    trucks: dict[int, str]  
+    capacities: dict[int, float]  
+    waste_types: dict[str, set[str]]  
+    routes: dict[int, tuple[str, float]]  
+    facilities: dict[str, int]  
+    availability: AvailabilityIndex  
+    drivers: list[tuple[int, set[str]]]  
+    trips: list[tuple]  
+    # The cached reference tables a plan is built from.  
+    TABLES = ('truck', 'trucktype', 'facility', 'route', 'driver')  
+  
+    def __init__(self, date: dt.date) -> None:  
+        """Initialize an empty plan for <date>."""  
+        self.date = date  
+        self.trucks = {}  
+        self.capacities = {}  
+        self.waste_types = {}  
+        self.routes = {}  
+        self.facilities = {}  
+        self.availability = AvailabilityIndex(date)  
+        self.drivers = []  
+        self.trips = []  
+  
+    @classmethod  
+    def load(cls, cur: pg_ext.cursor, cache: _ReferenceCache, date: dt.date,  
+             tids: Optional[list[int]] = None) -> '_DayPlan':  
+        """Return the plan for <date> for the trucks in <tids> (or every 
+        truck, if <tids> is None). Reference data comes from <cache>, and the 
+        day's trips and maintenance are loaded using the cursor <cur>. 
+        """  
+        tables = {table: cache.get(cur, table) for table in cls.TABLES}  
+        return cls.build(date, tids, tables, AvailabilityIndex.load(cur, date))  
+  
+    @classmethod  
+    def load_days(cls, cur: pg_ext.cursor, cache: _ReferenceCache,  
+                  dates: list[dt.date]) -> dict[dt.date, '_DayPlan']:  
+        """Return the plans for each of <dates> for every truck, loaded as 
+        load does, with the trips and maintenance of all days loaded at once. 
+        """  
+        tables = {table: cache.get(cur, table) for table in cls.TABLES}  
+        availability = AvailabilityIndex.load_days(cur, dates)  
+        return {date: cls.build(date, None, tables, availability[date])  
+                for date in dates}  
+  
+    @classmethod  
+    def build(cls, date: dt.date, tids: Optional[list[int]],  
+              tables: dict[str, list[tuple]],  
+              availability: AvailabilityIndex) -> '_DayPlan':  
+        """Return the plan for <date> for the trucks in <tids> (or every 
+        truck, if <tids> is None), given the rows of the reference <tables> 
+        in TABLES and the <availability> of trucks and drivers on <date>. 
+        """  
+        plan = cls(date)  
   
-   
+        wanted = None if tids is None else set(tids)  
+        for tid, truck_type, capacity in tables['truck']:  
+            if wanted is None or tid in wanted:  
+                plan.trucks[tid] = truck_type  
+                plan.capacities[tid] = capacity  
   
-            # Reroute trips to nice_facility  
+        for truck_type, waste_type in tables['trucktype']:  
+            plan.waste_types.setdefault(truck_type, set()).add(waste_type)  
   
-            count = 0  
+        for fid, waste_type in tables['facility']:  
+            plan.facilities.setdefault(waste_type, fid)  
   
-             
+        plan.availability = availability  
   
-            for trip in trips_to_reroute:  
+        for rid, waste_type, length in tables['route']:  
+            if rid not in plan.availability.routes:  
+                plan.routes[rid] = (waste_type, length)  
   
-                 rID, tID, tTIME, volume, eID1, eID2, fID = trip  
+        plan.drivers = [(eid, set(truck_types))  
+                        for eid, hire_date, truck_types  
+                        in tables['driver'] if hire_date <= date]  
+        return plan  
   
-                 cur.execute("UPDATE TRIP SET fID = %s WHERE rid = %s AND ttime = %s;", (nice_facility, rID, tTIME))  
+    def locks(self) -> tuple[dt.date, list[int], list[int]]:  
+        """Return the arguments of the statement lock_occupancy that lock the 
+        trucks and drivers of the trips planned so far. 
+        """  
+        tids = sorted({trip[1] for trip in self.trips})  
+        eids = sorted({eid for trip in self.trips for eid in trip[3:5]})  
+        return self.date, tids, eids  
   
-                 count = count + 1  
+    def schedule_trip(self, rid: int, time: dt.datetime) -> bool:  
+        """Plan a trip on route <rid> at <time>, which is on this plan's 
+        date, following the rules documented on WasteWrangler.schedule_trip, 
+        and return True iff it was planned. 
+        """  
+        if rid not in self.routes:  
+            # An invalid route, or one that already has a trip on this date  
+            return False  
+        waste_type, length = self.routes[rid]  
+        end = time + dt.timedelta(hours=length / SPEED)  
+        if (time.time() < DAY_START  
+                or end > dt.datetime.combine(self.date, DAY_END)  
+                or waste_type not in self.facilities):  
+            return False  
   
-             
+        trucks = [(-self.capacities[tid], tid)  
+                  for tid, truck_type in self.trucks.items()  
+                  if waste_type in self.waste_types.get(truck_type, ())  
+                  and self.availability.truck_free(tid, time, end)]  
+        if len(trucks) == 0:  
+            return False  
+        tid = min(trucks)[1]  
   
-            self.connection.commit()  
+        drivers = [driver for driver in self.drivers  
+                   if self.availability.driver_free(driver[0], time, end)]  
+        pair = _pick_drivers(drivers, self.trucks[tid])  
+        if pair is None:  
+            return False  
   
-            cur.close()  
+        self.trips.append((rid, tid, time, pair[0], pair[1],  
+                           self.facilities[waste_type]))  
+        self.availability.add_trip(rid, tid, pair[0], pair[1], time, length)  
+        del self.routes[rid]  
+        return True  
   
-            return count  
+    def schedule_truck(self, tid: int) -> int:  
+        """Plan trips on this plan's date for the truck <tid>, following the 
+        approach documented on WasteWrangler.schedule_trips, and return the 
+        number of trips planned. 
+        """  
+        if tid not in self.trucks or tid in self.availability.maintenance:  
+            return 0  
+        truck_type = self.trucks[tid]  
+        waste_types = self.waste_types.get(truck_type, set())  
+  
+        # Drivers must be available all day.  
+        available = [driver for driver in self.drivers  
+                     if self.availability.driver_free(driver[0])]  
+        pair = _pick_drivers(available, truck_type)  
+        if pair is None:  
+            return 0  
   
-   
+        day_end = dt.datetime.combine(self.date, DAY_END)  
+        time = dt.datetime.combine(self.date, DAY_START)  
+        count = 0  
+        for rid in list(self.routes):  
+            waste_type, length = self.routes[rid]  
+            if waste_type not in waste_types or waste_type not in self.facilities:  
+                continue  
+  
+            duration = dt.timedelta(hours=length / SPEED)  
+            start = self.availability.next_truck_slot(tid, time, duration)  
+            end = start + duration  
+            if end > day_end:  
+                continue  
+  
+            self.trips.append((rid, tid, start, pair[0], pair[1],  
+                               self.facilities[waste_type]))  
+            self.availability.add_trip(rid, tid, pair[0], pair[1], start,  
+                                       length)  
+            del self.routes[rid]  
+            count += 1  
+  
+            # add the 30 mins buffer  
+            time = end + BUFFER  
+            if time > day_end:  
+                break  
+  
+        return count  
+  
+  
+def _pick_drivers(drivers: list[tuple[int, set[str]]],  
+                  truck_type: str) -> Optional[tuple[int, int]]:  
+    """Return the most experienced pair among the available <drivers> such 
+    that at least one of them can drive <truck_type>, as (eID1, eID2) with 
+    eID1 > eID2, or None if there is no such pair. 
+ 
+    <drivers> holds (eID, truck types) pairs, most experienced first. 
+    """  
+    if len(drivers) == 0:  
+        return None  
+    first, first_types = drivers[0]  
+    for eid, truck_types in drivers[1:]:  
+        if truck_type in first_types or truck_type in truck_types:  
+            return max(first, eid), min(first, eid)  
+    return None  
   
-            pass  
   
-        except pg.Error as ex:  
+# The first line of a COPY ... FROM stdin section of a SQL file.  
+_COPY_FROM_STDIN = re.compile(r'\s*copy\s.*\sfrom\s+stdin\b', re.IGNORECASE)  
   
-            # You may find it helpful to uncomment this line while debugging,  
+# The tag that opens and closes a dollar-quoted string, such as $$ or $body$.  
+_DOLLAR_QUOTE = re.compile(r'\$(?:[A-Za-z_][A-Za-z_0-9]*)?\$')  
   
-            # as it will show you all the details of the error that occurred:  
   
-            # raise ex  
+class _CopyData:  
+    """The data of a COPY ... FROM stdin section of an open SQL file, which 
+    can be passed to copy_expert. Reading it reads the file up to the line 
+    that ends the section. 
+    """  
+    _file: TextIO  
+    _done: bool  
   
-            return 0  
+    def __init__(self, file: TextIO) -> None:  
+        """Initialize the data of the section that starts at the current 
+        line of <file>. 
+        """  
+        self._file = file  
+        self._done = False  
   
-    # =========================== Helper methods ============================= #  
- 
-    @staticmethod  
-    def _read_qualifications_file(file: TextIO) -> list[list[str, str, str]]:  
-        """Helper for update_technicians. Accept an open file <file> that 
-        follows the format described on the A2 handout and return a list 
-        representing the information in the file, where each item in the list 
-        includes the following 3 elements in this order: 
-            * The first name of the technician. 
-            * The last name of the technician. 
-            * The truck type that the technician is currently qualified to work 
-              on. 
- 
-        Pre-condition: 
-            <file> follows the format given on the A2 handout. 
+    def read(self, size: int = -1) -> str:  
+        """Return the next whole lines of data, at least <size> characters of 
+        them unless the section ends first, or the rest of the section if 
+        <size> is negative. 
         """  
-        result = []  
-        employee_info = []  
-        for idx, line in enumerate(file):  
-            if idx % 2 == 0:  
-                info = line.strip().split(' ')[-2:]  
-                fname, lname = info  
-                employee_info.extend([fname, lname])  
+        lines = []  
+        read = 0  
+        while not self._done and (size < 0 or read < size):  
+            line = self._file.readline()  
+            if line == '' or line.rstrip('\r\n') == '\\.':  
+                self._done = True  
             else:  
-                employee_info.append(line.strip())  
-                result.append(employee_info)  
-                employee_info = []  
-  
-        return result  
-  
-  
-def setup(dbname: str, username: str, password: str, file_path: str) -> None:  
+                lines.append(line)  
+                read += len(line)  
+        return ''.join(lines)  
+  
+  
+def load_data(cursor: pg_ext.cursor, data_file: TextIO,  
+              batch_size: int = 1 << 20) -> None:  
+    """Run the SQL file <data_file> using <cursor>, one line at a time, so 
+    that files of any size can be loaded. 
+ 
+    The data of each COPY ... FROM stdin section, as written by pg_dump or 
+    generate_data.py, is streamed to the server. Other statements are sent 
+    in batches of about <batch_size> characters, which only ever end after a 
+    whole statement: string literals (including E'' and dollar-quoted ones), 
+    quoted identifiers and comments are skipped when looking for the 
+    semicolon that ends one. 
+    """  
+    batch = []  
+    batched = 0  
+    # Whether the batch has any SQL in it, and whether it ends with a whole  
+    # statement  
+    has_sql = False  
+    complete = True  
+    state = None  
+    for line in iter(data_file.readline, ''):  
+        if complete and state is None and _COPY_FROM_STDIN.match(line):  
+            if has_sql:  
+                cursor.execute(''.join(batch))  
+            batch = []  
+            batched = 0  
+            has_sql = False  
+            cursor.copy_expert(line, _CopyData(data_file))  
+            continue  
+  
+        batch.append(line)  
+        batched += len(line)  
+        state, last = _scan_sql(line, state)  
+        if last is not None:  
+            has_sql = True  
+            complete = last == ';'  
+        if complete and state is None and batched >= batch_size:  
+            if has_sql:  
+                cursor.execute(''.join(batch))  
+            batch = []  
+            batched = 0  
+            has_sql = False  
+  
+    if has_sql:  
+        cursor.execute(''.join(batch))  
+  
+  
+def _scan_sql(line: str, state: Optional[str]  
+              ) -> tuple[Optional[str], Optional[str]]:  
+    """Scan the <line> of SQL, given what was left open at its start 
+    (<state>), and return what is left open at its end, and the last 
+    character of the line that is not whitespace, part of a comment or 
+    inside a quoted string or identifier (or None if there is none). The 
+    opening quote of a string or identifier counts as such a character. 
+ 
+    What is left open is None if nothing is, or the text that closes it: 
+    "'" for a string literal, "E'" for an escape string literal, '"' for a 
+    quoted identifier, the tag (e.g. '$$') of a dollar-quoted string, or 
+    '*/' once per level of nested block comments. 
+    """  
+    if state is None and not any(char in line for char in '\'"$-/'):  
+        code = line.strip()  
+        return None, code[-1] if code else None  
+  
+    last = None  
+    i = 0  
+    while i < len(line):  
+        char = line[i]  
+        word = i > 0 and (line[i - 1].isalnum() or line[i - 1] == '_')  
+        if state is None:  
+            dollar = None  
+            if char == '$' and not word:  
+                dollar = _DOLLAR_QUOTE.match(line, i)  
+            if char in '\'"':  
+                state = last = char  
+            elif char in 'eE' and not word and line.startswith("'", i + 1):  
+                state = "E'"  
+                last = "'"  
+                i += 1  
+            elif dollar is not None:  
+                state = dollar.group()  
+                last = '$'  
+                i += len(state) - 1  
+            elif line.startswith('--', i):  
+                break  
+            elif line.startswith('/*', i):  
+                state = '*/'  
+                i += 1  
+            elif not char.isspace():  
+                last = char  
+        elif state.endswith('*/'):  
+            if line.startswith('/*', i):  
+                state += '*/'  
+                i += 1  
+            elif line.startswith('*/', i):  
+                state = state[2:] or None  
+                i += 1  
+        elif state == "E'":  
+            # A quote is escaped by a backslash or by doubling it  
+            if char == '\\' or line.startswith("''", i):  
+                i += 1  
+            elif char == "'":  
+                state = None  
+        elif line.startswith(state, i):  
+            i += len(state) - 1  
+            state = None  
+        i += 1  
+    return state, last  
+  
+  
+def setup(dbname: str, username: str, password: str, file_path: str,  
+          partitioned: bool = False) -> None:  
     """Set up the testing environment for the database <dbname> using the 
-    username <username> and password <password> by importing the schema file 
-    and the file containing the data at <file_path>. 
+    username <username> and password <password> by importing the schema file, 
+    the file containing the data at <file_path>, the secondary indexes and 
+    the occupancy tables and the server-side functions. If <partitioned> is 
+    True, Trip is partitioned by month once the data is in (see 
+    waste_wrangler_partitions.sql). 
+ 
+    The data file is streamed with load_data, and the indexes and triggers 
+    are only created once the data is in, so loading a large data file is 
+    fast and takes little memory. Its COPY sections must not refer to columns 
+    or tables that are created by the indexes or functions files. 
     """  
     connection, cursor, schema_file, data_file = None, None, None, None  
+    partitions_file, indexes_file, functions_file = None, None, None  
+    occupancy_file = None  
     try:  
         # Change this to connect to your own database  
         connection = pg.connect(  
@@ -1038,7 +2414,24 @@ def setup(dbname: str, username: str, password: str, file_path: str) -> None:
         cursor.execute(schema_file.read())  
   
         data_file = open(file_path, "r")  
-        cursor.execute(data_file.read())  
+        load_data(cursor, data_file)  
+  
+        if partitioned:  
+            partitions_file = open("./waste_wrangler_partitions.sql", "r")  
+            cursor.execute(partitions_file.read())  
+            cursor.execute("SELECT partition_trip();")  
+  
+        indexes_file = open("./waste_wrangler_indexes.sql", "r")  
+        cursor.execute(indexes_file.read())  
+  
+        occupancy_file = open("./waste_wrangler_occupancy.sql", "r")  
+        cursor.execute(occupancy_file.read())  
+  
+        functions_file = open("./waste_wrangler_functions.sql", "r")  
+        cursor.execute(functions_file.read())  
+  
+        # Give the planner statistics about the data that was just loaded  
+        cursor.execute("ANALYZE;")  
   
         connection.commit()  
     except Exception as ex:  
@@ -1051,10 +2444,48 @@ def setup(dbname: str, username: str, password: str, file_path: str) -> None:
             connection.close()  
         if schema_file:  
             schema_file.close()  
+        if partitions_file:  
+            partitions_file.close()  
+        if indexes_file:  
+            indexes_file.close()  
+        if occupancy_file:  
+            occupancy_file.close()  
+        if functions_file:  
+            functions_file.close()  
         if data_file:  
             data_file.close()  
   
   
+def partition_trip(dbname: str, username: str, password: str) -> None:  
+    """Migrate the database <dbname> to a Trip table partitioned by month 
+    (see waste_wrangler_partitions.sql), using the username <username> and 
+    password <password>. The trips are kept, and the indexes, occupancy 
+    tables and functions are installed again. Migrating a database that is 
+    already partitioned changes nothing. 
+ 
+    The whole migration is one transaction, and Trip is locked until it 
+    commits. 
+    """  
+    connection = pg.connect(  
+        dbname=dbname, user=username, password=password,  
+        options="-c search_path=waste_wrangler"  
+    )  
+    try:  
+        with connection, connection.cursor() as cursor:  
+            with open("./waste_wrangler_partitions.sql", "r") as partitions_file:  
+                cursor.execute(partitions_file.read())  
+            cursor.execute("SELECT partition_trip();")  
+            with open("./waste_wrangler_indexes.sql", "r") as indexes_file:  
+                cursor.execute(indexes_file.read())  
+            with open("./waste_wrangler_occupancy.sql", "r") as occupancy_file:  
+                cursor.execute(occupancy_file.read())  
+            with open("./waste_wrangler_functions.sql", "r") as functions_file:  
+                cursor.execute(functions_file.read())  
+            cursor.execute("ANALYZE Trip;")  
+    finally:  
+        connection.close()  
+  
+  
 def test_preliminary() -> None:  
     """Test preliminary aspects of the A2 methods."""  
     ww = WasteWrangler()  
@@ -1092,19 +2523,19 @@ def test_preliminary() -> None:
         # changed accordingly. The following row would now be added:  
         # (1, 1, '2023-05-04 08:00', null, 2, 1, 1)  
         scheduled_trip = ww.schedule_trip(1, dt.datetime(2023, 5, 4, 8, 0))  
-        assert scheduled_trip, \  
+        assert scheduled_trip, \
             f"[Schedule Trip] Expected True, Got {scheduled_trip}"  
   
         # Can't schedule the same route of the same day.  
         scheduled_trip = ww.schedule_trip(1, dt.datetime(2023, 5, 4, 13, 0))  
-        assert not scheduled_trip, \  
+        assert not scheduled_trip, \
             f"[Schedule Trip] Expected False, Got {scheduled_trip}"  
   
         # -------------------- Testing schedule_trips  ------------------------#  
   
         # All routes for truck tid are scheduled on that day  
         scheduled_trips = ww.schedule_trips(1, dt.datetime(2023, 5, 3))  
-        assert scheduled_trips == 0, \  
+        assert scheduled_trips == 0, \
             f"[Schedule Trips] Expected 0, Got {scheduled_trips}"   
               
   
@@ -1116,7 +2547,7 @@ def test_preliminary() -> None:
         # changed accordingly  
         qf = open('qualifications.txt', 'r')  
         updated_technicians = ww.update_technicians(qf)  
-        assert updated_technicians == 2, \  
+        assert updated_technicians == 2, \
             f"[Update Technicians] Expected 2, Got {updated_technicians}"  
       
           
@@ -1125,7 +2556,7 @@ def test_preliminary() -> None:
   
         # This employee doesn't exist in our instance  
         workmate_sphere = ww.workmate_sphere(2023)  
-        assert len(workmate_sphere) == 0, \  
+        assert len(workmate_sphere) == 0, \
             f"[Workmate Sphere] Expected [], Got {workmate_sphere}"  
   
         workmate_sphere = ww.workmate_sphere(3)  
@@ -1133,27 +2564,27 @@ def test_preliminary() -> None:
         # order doesn't matter.  
         # Notice that 2 is added to 1's work sphere because of the trip we  
         # added earlier.  
-        assert set(workmate_sphere) == {1, 2}, \  
+        assert set(workmate_sphere) == {1, 2}, \
             f"[Workmate Sphere] Expected {{1, 2}}, Got {workmate_sphere}"  
   
         # ----------------- Testing schedule_maintenance ----------------------#  
   
         # You will need to check the data in the Maintenance relation  
         scheduled_maintenance = ww.schedule_maintenance(dt.date(2023, 5, 5))  
-        assert scheduled_maintenance == 7, \  
+        assert scheduled_maintenance == 7, \
             f"[Schedule Maintenance] Expected 7, Got {scheduled_maintenance}"  
   
         # ------------------ Testing reroute_waste  ---------------------------#  
   
         # There is no trips to facility 1 on that day  
         reroute_waste = ww.reroute_waste(1, dt.date(2023, 5, 10))  
-        assert reroute_waste == 0, \  
+        assert reroute_waste == 0, \
             f"[Reroute Waste] Expected 0. Got {reroute_waste}"  
   
         # You will need to check that data in the Trip relation has been  
         # changed accordingly  
         reroute_waste = ww.reroute_waste(1, dt.date(2023, 5, 3))  
-        assert reroute_waste == 1, \  
+        assert reroute_waste == 1, \
             f"[Reroute Waste] Expected 1. Got {reroute_waste}"  
           
     finally:  
@@ -1162,6 +2593,34 @@ def test_preliminary() -> None:
         ww.disconnect()  
   
   
+def test_pool(dbname: str, username: str, password: str,  
+              file_path: str = './waste_wrangler_data.sql') -> None:  
+    """Load the data file at <file_path> into the database <dbname>, and 
+    check that a pooled WasteWrangler answers many concurrent calls with the 
+    same few connections rather than opening new ones. 
+    """  
+    setup(dbname, username, password, file_path)  
+    ww = WasteWrangler(pool_size=4)  
+    pids = set()  
+    pids_lock = threading.Lock()  
+  
+    def call(eid: int) -> None:  
+        with ww._checkout() as conn:  
+            with pids_lock:  
+                pids.add(conn.info.backend_pid)  
+            ww.workmate_sphere(eid)  
+  
+    try:  
+        connected = ww.connect(dbname, username, password)  
+        assert connected, f"[Connected] Expected True | Got {connected}."  
+        with concurrent.futures.ThreadPoolExecutor(16) as executor:  
+            list(executor.map(call, [1, 2, 3, 4] * 20))  
+        assert len(pids) <= 4, \
+            f"[Pool] Expected at most 4 connections | Got {len(pids)}."  
+    finally:  
+        ww.disconnect()  
+  
+  
 if __name__ == '__main__':  
     # Un comment-out the next two lines if you would like to run the doctest  
     # examples (see ">>>" in the methods connect and disconnect)  
@@ -1171,6 +2630,10 @@ if __name__ == '__main__':
     # TODO: Put your testing code here, or call testing functions such as  
     #   this one:  
     test_preliminary()  
+    if len(sys.argv) > 2:  
+        # Usage: python a2.py DBNAME USERNAME [PASSWORD]  
+        test_pool(sys.argv[1], sys.argv[2],  
+                  sys.argv[3] if len(sys.argv) > 3 else '')  
   
   
       
@@ -0,0 +1,530 @@
+"""CSC343 Assignment 2 -- asyncio client 
+ 
+=== Module Description === 
+ 
+This file contains the AsyncWasteWrangler class, which offers the methods of 
+WasteWrangler as coroutines. It uses psycopg2's asynchronous connections and 
+waits for the server through the event loop instead of blocking a thread, so 
+that many requests can be in flight at once from a single thread. 
+ 
+>>> async def main(): 
+...     ww = AsyncWasteWrangler(pool_size=20) 
+...     await ww.connect("csc343h-marinat", "marinat", "") 
+...     scheduled = await asyncio.gather( 
+...         *(ww.schedule_trip(rid, time) for rid, time in requests)) 
+...     await ww.disconnect() 
+"""  
+import asyncio  
+import contextlib  
+import datetime as dt  
+import functools  
+from time import perf_counter  
+from typing import AsyncIterator, Optional, TextIO  
+  
+import psycopg2 as pg  
+import psycopg2.extensions as pg_ext  
+  
+from a2 import (MAINTENANCE_HORIZON, SCHEDULE_ATTEMPTS, AvailabilityIndex,  
+                WasteWrangler, _RETRYABLE, _Connection, _DayPlan,  
+                _QUALIFICATION_LOAD, _ReferenceCache, _backoff,  
+                _execute_command, _prepare_command)  
+  
+  
+async def _wait(conn: pg_ext.connection) -> None:  
+    """Wait until the asynchronous connection <conn> has finished connecting 
+    or running its last command, without blocking the event loop. 
+    """  
+    loop = asyncio.get_running_loop()  
+    while True:  
+        state = conn.poll()  
+        if state == pg_ext.POLL_OK:  
+            return  
+  
+        ready = loop.create_future()  
+  
+        def wake() -> None:  
+            if not ready.done():  
+                ready.set_result(None)  
+  
+        fd = conn.fileno()  
+        if state == pg_ext.POLL_READ:  
+            loop.add_reader(fd, wake)  
+            try:  
+                await ready  
+            finally:  
+                loop.remove_reader(fd)  
+        elif state == pg_ext.POLL_WRITE:  
+            loop.add_writer(fd, wake)  
+            try:  
+                await ready  
+            finally:  
+                loop.remove_writer(fd)  
+        else:  
+            raise pg.OperationalError("unexpected poll state %s" % state)  
+  
+  
+async def _run(cur: pg_ext.cursor, sql: str, args: Optional[tuple] = None  
+               ) -> None:  
+    """Run <sql> with the parameters <args> using the cursor <cur> of an 
+    asynchronous connection. 
+    """  
+    cur.execute(sql, args)  
+    await _wait(cur.connection)  
+  
+  
+async def _execute(cur: pg_ext.cursor, name: str, args: tuple = ()) -> None:  
+    """Execute the statement <name> from _STATEMENTS with the parameters 
+    <args> using the cursor <cur> of an asynchronous connection, preparing it 
+    first if it has not been prepared on that connection yet. 
+    """  
+    conn = cur.connection  
+    if name not in conn.prepared:  
+        await _run(cur, _prepare_command(name))  
+        conn.prepared.add(name)  
+    await _run(cur, _execute_command(name, args), args or None)  
+  
+  
+async def _insert_values(cur: pg_ext.cursor, insert: str, template: str,  
+                         rows: list[tuple], page_size: int = 1000) -> None:  
+    """Insert <rows> with the statement <insert> (which ends in VALUES) 
+    using the cursor <cur>, <page_size> rows at a time. <template> is the 
+    placeholder for a single row, e.g. "(%s, %s)". 
+ 
+    Asynchronous connections can not COPY, so this is how bulk data is sent. 
+    """  
+    for i in range(0, len(rows), page_size):  
+        values = ', '.join(cur.mogrify(template, row).decode()  
+                           for row in rows[i:i + page_size])  
+        await _run(cur, insert + ' ' + values + ';')  
+  
+  
+class _AsyncConnectionPool:  
+    """A pool of asynchronous connections shared by the tasks of one event 
+    loop. Connections are opened as they are needed, and a task that needs 
+    one while all of them are in use waits until one is returned. 
+ 
+    === Instance Attributes === 
+    maxconn: the maximum number of connections open at once. 
+    """  
+    maxconn: int  
+    _kwargs: dict  
+    _idle: asyncio.Queue  
+    _slots: asyncio.Semaphore  
+    _open: set[pg_ext.connection]  
+    _in_use: int  
+    _peak_in_use: int  
+    _checkouts: int  
+    _waits: int  
+    _total_wait: float  
+    _max_wait: float  
+  
+    def __init__(self, maxconn: int, **kwargs) -> None:  
+        """Initialize an empty pool of at most <maxconn> connections. 
+        <kwargs> are passed on to pg.connect. 
+        """  
+        self.maxconn = maxconn  
+        self._kwargs = kwargs  
+        self._idle = asyncio.Queue()  
+        self._slots = asyncio.Semaphore(maxconn)  
+        self._open = set()  
+        self._in_use = 0  
+        self._peak_in_use = 0  
+        self._checkouts = 0  
+        self._waits = 0  
+        self._total_wait = 0.0  
+        self._max_wait = 0.0  
+  
+    async def getconn(self) -> pg_ext.connection:  
+        """Check out a connection, opening a new one if none is idle and 
+        waiting for one to be returned if they are all in use. 
+        """  
+        start = perf_counter()  
+        waited = self._slots.locked()  
+        await self._slots.acquire()  
+        wait = perf_counter() - start  
+        try:  
+            if self._idle.empty():  
+                conn = pg.connect(async_=True, connection_factory=_Connection,  
+                                  **self._kwargs)  
+                await _wait(conn)  
+                self._open.add(conn)  
+            else:  
+                conn = self._idle.get_nowait()  
+        except BaseException:  
+            self._slots.release()  
+            raise  
+  
+        self._in_use += 1  
+        self._peak_in_use = max(self._peak_in_use, self._in_use)  
+        self._checkouts += 1  
+        self._waits += waited  
+        self._total_wait += wait  
+        self._max_wait = max(self._max_wait, wait)  
+        return conn  
+  
+    async def putconn(self, conn: pg_ext.connection) -> None:  
+        """Return the connection <conn> to the pool. Any transaction left open 
+        on it is rolled back, and it is closed instead if it is broken or was 
+        interrupted in the middle of a command. 
+        """  
+        try:  
+            if not conn.closed and not conn.isexecuting():  
+                status = conn.info.transaction_status  
+                if status != pg_ext.TRANSACTION_STATUS_IDLE:  
+                    await _run(conn.cursor(), "ROLLBACK;")  
+                self._idle.put_nowait(conn)  
+            else:  
+                self._close(conn)  
+        except (pg.Error, asyncio.CancelledError):  
+            self._close(conn)  
+            raise  
+        finally:  
+            self._in_use -= 1  
+            self._slots.release()  
+  
+    def closeall(self) -> None:  
+        """Close every connection in the pool."""  
+        for conn in list(self._open):  
+            self._close(conn)  
+        self._idle = asyncio.Queue()  
+  
+    def stats(self) -> dict[str, float]:  
+        """Return a snapshot of this pool's sizing and wait-time statistics, 
+        as described in _ConnectionPool.stats, where <open> is the number of 
+        connections currently open. 
+        """  
+        return {  
+            'maxconn': self.maxconn,  
+            'open': len(self._open),  
+            'in_use': self._in_use,  
+            'peak_in_use': self._peak_in_use,  
+            'checkouts': self._checkouts,  
+            'waits': self._waits,  
+            'total_wait': self._total_wait,  
+            'max_wait': self._max_wait,  
+        }  
+  
+    def _close(self, conn: pg_ext.connection) -> None:  
+        """Close the connection <conn> and forget about it."""  
+        self._open.discard(conn)  
+        if not conn.closed:  
+            conn.close()  
+  
+  
+class AsyncWasteWrangler:  
+    """The methods of WasteWrangler, as coroutines that share a pool of 
+    asynchronous connections. 
+ 
+    Each method behaves exactly like the WasteWrangler method of the same 
+    name, and checks out a connection only for the duration of its work. 
+    Methods that make several changes run them in an explicit transaction. 
+    The reference data is cached as in WasteWrangler. 
+ 
+    === Instance Attributes === 
+    pool_size: the maximum number of connections to open at once. 
+ 
+    Representation invariants: 
+    - The database to which connections are made conforms to the schema 
+      in waste_wrangler_schema.ddl. 
+    - The functions in waste_wrangler_functions.sql are installed in that 
+      database. 
+    """  
+    pool_size: int  
+    _pool: Optional[_AsyncConnectionPool]  
+    _cache: Optional[_ReferenceCache]  
+  
+    def __init__(self, pool_size: int = 10) -> None:  
+        """Initialize this class, with no database connection yet. 
+        """  
+        self.pool_size = pool_size  
+        self._pool = None  
+        self._cache = None  
+  
+    async def connect(self, dbname: str, username: str, password: str) -> bool:  
+        """Create the pool of connections to the database <dbname> using the 
+        username <username> and password <password>, each with the search 
+        path set to waste_wrangler, and open the first of them. 
+ 
+        Return True if the connection was made successfully, False otherwise. 
+        I.e., do NOT throw an error if making the connection fails. 
+        """  
+        try:  
+            params = dict(  
+                dbname=dbname, user=username, password=password,  
+                options="-c search_path=waste_wrangler"  
+            )  
+            self._pool = _AsyncConnectionPool(self.pool_size, **params)  
+            async with self._checkout():  
+                pass  
+            # The cache listens with a blocking connection of its own, which  
+            # is only made here.  
+            loop = asyncio.get_running_loop()  
+            self._cache = await loop.run_in_executor(  
+                None, functools.partial(_ReferenceCache, **params))  
+        except pg.Error:  
+            return False  
+        return True  
+  
+    async def disconnect(self) -> bool:  
+        """Close every connection in the pool of this AsyncWasteWrangler. 
+ 
+        Return True if closing the connections was successful, False 
+        otherwise. I.e., do NOT throw an error if closing them failed. 
+        """  
+        try:  
+            if self._pool is not None:  
+                self._pool.closeall()  
+                self._pool = None  
+            if self._cache is not None:  
+                self._cache.close()  
+                self._cache = None  
+            return True  
+        except pg.Error:  
+            return False  
+  
+    def pool_stats(self) -> dict[str, float]:  
+        """Return statistics about the connection pool, as described in 
+        _AsyncConnectionPool.stats, or an empty dictionary if not connected. 
+        """  
+        if self._pool is None:  
+            return {}  
+        return self._pool.stats()  
+  
+    def cache_stats(self) -> dict[str, int]:  
+        """Return the counters of the reference data cache, as described in 
+        _ReferenceCache.stats, or an empty dictionary if not connected. 
+        """  
+        if self._cache is None:  
+            return {}  
+        return self._cache.stats()  
+  
+    async def schedule_trip(self, rid: int, time: dt.datetime) -> bool:  
+        """See WasteWrangler.schedule_trip."""  
+        try:  
+            async with self._checkout() as conn:  
+                cur = conn.cursor()  
+                await _execute(cur, 'schedule_trip', (rid, time))  
+                return cur.fetchone() is not None  
+  
+        except pg.Error as ex:  
+            # You may find it helpful to uncomment this line while debugging,  
+            # as it will show you all the details of the error that occurred:  
+            # raise ex  
+            return False  
+  
+    async def schedule_trip_many(self, requests: list[tuple[int, dt.datetime]]  
+                                 ) -> list[bool]:  
+        """See WasteWrangler.schedule_trip_many."""  
+        try:  
+            async with self._checkout() as conn:  
+                cur = conn.cursor()  
+                for attempts in range(1, SCHEDULE_ATTEMPTS + 1):  
+                    await _run(cur, "BEGIN;")  
+  
+                    tables = await self._reference(cur, _DayPlan.TABLES)  
+                    days = sorted({time.date() for _, time in requests})  
+                    await _execute(cur, 'days_trucks', (days,))  
+                    trucks = {day: [] for day in days}  
+                    for row in cur.fetchall():  
+                        trucks[row[0]].append(row[1:])  
+                    await _execute(cur, 'days_drivers', (days,))  
+                    drivers = {day: [] for day in days}  
+                    for row in cur.fetchall():  
+                        drivers[row[0]].append(row[1:])  
+                    plans = {day: _DayPlan.build(  
+                        day, None, tables, AvailabilityIndex.from_occupancy(  
+                            day, trucks[day], drivers[day]))  
+                        for day in days}  
+  
+                    scheduled = [plans[time.date()].schedule_trip(rid, time)  
+                                 for rid, time in requests]  
+                    trips = [trip for day in days for trip in plans[day].trips]  
+  
+                    try:  
+                        for day in days:  
+                            if len(plans[day].trips) > 0:  
+                                await _execute(cur, 'lock_occupancy',  
+                                               plans[day].locks())  
+                        await _insert_values(  
+                            cur,  
+                            "INSERT INTO Trip "  
+                            "(rID, tID, tTime, eID1, eID2, fID) VALUES",  
+                            "(%s, %s, %s, %s, %s, %s)", trips)  
+                    except _RETRYABLE:  
+                        # Plan the requests again, with the clashing trips  
+                        await _run(cur, "ROLLBACK;")  
+                        if attempts < SCHEDULE_ATTEMPTS:  
+                            await asyncio.sleep(_backoff(attempts))  
+                        continue  
+                    await _run(cur, "COMMIT;")  
+                    return scheduled  
+                return [False] * len(requests)  
+  
+        except pg.Error as ex:  
+            # You may find it helpful to uncomment this line while debugging,  
+            # as it will show you all the details of the error that occurred:  
+            # raise ex  
+            return [False] * len(requests)  
+  
+    async def schedule_trips(self, tid: int, date: dt.date) -> int:  
+        """See WasteWrangler.schedule_trips."""  
+        # A single truck is just a fleet of one.  
+        return (await self.schedule_fleet(date, [tid])).get(tid, 0)  
+  
+    async def schedule_fleet(self, date: dt.date,  
+                             tids: Optional[list[int]] = None  
+                             ) -> dict[int, int]:  
+        """See WasteWrangler.schedule_fleet."""  
+        try:  
+            if isinstance(date, dt.datetime):  
+                date = date.date()  
+            async with self._checkout() as conn:  
+                cur = conn.cursor()  
+                for attempts in range(1, SCHEDULE_ATTEMPTS + 1):  
+                    await _run(cur, "BEGIN;")  
+  
+                    tables = await self._reference(cur, _DayPlan.TABLES)  
+                    await _execute(cur, 'day_trucks', (date,))  
+                    trucks = cur.fetchall()  
+                    await _execute(cur, 'day_drivers', (date,))  
+                    drivers = cur.fetchall()  
+                    availability = AvailabilityIndex.from_occupancy(  
+                        date, trucks, drivers)  
+  
+                    plan = _DayPlan.build(date, tids, tables, availability)  
+                    counts = {}  
+                    for tid in sorted(plan.trucks):  
+                        counts[tid] = plan.schedule_truck(tid)  
+  
+                    try:  
+                        if len(plan.trips) > 0:  
+                            await _execute(cur, 'lock_occupancy',  
+                                           plan.locks())  
+                        await _insert_values(  
+                            cur,  
+                            "INSERT INTO Trip "  
+                            "(rID, tID, tTime, eID1, eID2, fID) VALUES",  
+                            "(%s, %s, %s, %s, %s, %s)", plan.trips)  
+                    except _RETRYABLE:  
+                        # Plan the day again, with the clashing trips  
+                        await _run(cur, "ROLLBACK;")  
+                        if attempts < SCHEDULE_ATTEMPTS:  
+                            await asyncio.sleep(_backoff(attempts))  
+                        continue  
+                    await _run(cur, "COMMIT;")  
+                    return counts  
+                return {}  
+  
+        except pg.Error as ex:  
+            # You may find it helpful to uncomment this line while debugging,  
+            # as it will show you all the details of the error that occurred:  
+            # raise ex  
+            return {}  
+  
+    async def update_technicians(self, qualifications_file: TextIO) -> int:  
+        """See WasteWrangler.update_technicians."""  
+        try:  
+            technician_data = WasteWrangler._read_qualifications_file(qualifications_file)  
+            rows = [(firstname + " " + surname, truck_type)  
+                    for firstname, surname, truck_type in technician_data]  
+  
+            async with self._checkout() as conn:  
+                cur = conn.cursor()  
+                await _run(cur, "BEGIN;")  
+                await _run(cur, _QUALIFICATION_LOAD)  
+                await _insert_values(cur, "INSERT INTO qualification_load VALUES",  
+                                     "(%s, %s)", rows)  
+                await _execute(cur, 'add_technicians')  
+                num_successful_changes = cur.rowcount  
+                await _run(cur, "COMMIT;")  
+  
+            # Don't wait for the notification to reach the cache  
+            self._cache.invalidate('technician')  
+            return num_successful_changes  
+  
+        except pg.Error as ex:  
+            # You may find it helpful to uncomment this line while debugging,  
+            # as it will show you all the details of the error that occurred:  
+            # raise ex  
+            return 0  
+  
+    async def workmate_sphere(self, eid: int) -> list[int]:  
+        """See WasteWrangler.workmate_sphere."""  
+        try:  
+            async with self._checkout() as conn:  
+                cur = conn.cursor()  
+                await _execute(cur, 'workmate_sphere', (eid,))  
+                return [row[0] for row in cur.fetchall()]  
+  
+        except pg.Error as ex:  
+            # You may find it helpful to uncomment this line while debugging,  
+            # as it will show you all the details of the error that occurred:  
+            # raise ex  
+            return []  
+  
+    async def schedule_maintenance(self, date: dt.date,  
+                                   horizon: int = MAINTENANCE_HORIZON) -> int:  
+        """See WasteWrangler.schedule_maintenance."""  
+        try:  
+            async with self._checkout() as conn:  
+                cur = conn.cursor()  
+                await _execute(cur, 'schedule_maintenance', (date, horizon))  
+                return len(cur.fetchall())  
+  
+        except pg.Error as ex:  
+            # You may find it helpful to uncomment this line while debugging,  
+            # as it will show you all the details of the error that occurred:  
+            # raise ex  
+            return 0  
+  
+    async def reroute_waste(self, fid: int, date: dt.date) -> int:  
+        """See WasteWrangler.reroute_waste."""  
+        return (await self.reroute_waste_bulk([fid], date, date)).get(fid, 0)  
+  
+    async def reroute_waste_bulk(self, fids: list[int], start_date: dt.date,  
+                                 end_date: dt.date) -> dict[int, int]:  
+        """See WasteWrangler.reroute_waste_bulk."""  
+        try:  
+            async with self._checkout() as conn:  
+                cur = conn.cursor()  
+                await _execute(cur, 'reroute_counts',  
+                               (list(fids), start_date, end_date))  
+                counts = {fid: 0 for fid in fids}  
+                counts.update(cur.fetchall())  
+                return counts  
+  
+        except pg.Error as ex:  
+            # You may find it helpful to uncomment this line while debugging,  
+            # as it will show you all the details of the error that occurred:  
+            # raise ex  
+            return {}  
+  
+    # =========================== Helper methods ============================= #  
+  
+    @contextlib.asynccontextmanager  
+    async def _checkout(self) -> AsyncIterator[pg_ext.connection]:  
+        """Check out a connection from the pool for the duration of the 
+        async with block, rolling back anything left uncommitted. 
+        """  
+        if self._pool is None:  
+            raise pg.InterfaceError("AsyncWasteWrangler is not connected")  
+        conn = await self._pool.getconn()  
+        try:  
+            yield conn  
+        finally:  
+            await self._pool.putconn(conn)  
+  
+    async def _reference(self, cur: pg_ext.cursor,  
+                         tables: tuple[str, ...]) -> dict[str, list[tuple]]:  
+        """Return the rows of each of the cached reference <tables>, loading 
+        the ones that are not cached using the cursor <cur>. 
+        """  
+        result = {}  
+        for table in tables:  
+            rows = self._cache.cached(table)  
+            if rows is None:  
+                await _execute(cur, _ReferenceCache.TABLES[table])  
+                rows = cur.fetchall()  
+                self._cache.store(table, rows)  
+            result[table] = rows  
+        return result  
@@ -0,0 +1,207 @@
+"""CSC343 Assignment 2 -- benchmarks 
+ 
+=== Module Description === 
+ 
+This file times the WasteWrangler methods on the synthetic datasets of 
+generate_data.py. For each scale, the dataset is loaded into a fresh 
+waste_wrangler schema, and each method is called several times with 
+different arguments. The report gives the latency percentiles of every 
+method, and the number of commands it sends to the server per call, which 
+is the number of round trips it makes apart from commits, as counted by 
+WasteWrangler's query tracing. 
+ 
+    python benchmark.py DBNAME USERNAME [PASSWORD] --scales tiny,small 
+ 
+Loading replaces the waste_wrangler schema, so do not run this against a 
+database whose data you want to keep. 
+"""  
+import argparse  
+import datetime as dt  
+import io  
+import json  
+import os  
+import random  
+import sys  
+import tempfile  
+from time import perf_counter  
+from typing import Callable, TextIO  
+  
+from a2 import WasteWrangler, setup  
+from generate_data import SCALES, Dataset, write_sql  
+  
+  
+def load(dbname: str, username: str, password: str, dataset: Dataset,  
+         partitioned: bool = False) -> None:  
+    """Replace the waste_wrangler schema of the database <dbname> with a 
+    fresh one holding <dataset>, using the username <username> and password 
+    <password>. The dataset is written to a temporary data file, which is 
+    loaded with setup, with Trip partitioned by month if <partitioned> is 
+    True. 
+    """  
+    with tempfile.NamedTemporaryFile('w', suffix='.sql', delete=False) as data_file:  
+        write_sql(dataset, data_file)  
+    try:  
+        setup(dbname, username, password, data_file.name, partitioned)  
+    finally:  
+        os.remove(data_file.name)  
+  
+  
+def benchmark(ww: WasteWrangler, dataset: Dataset, calls: int  
+              ) -> dict[str, list[tuple[float, int]]]:  
+    """Call each method of <ww>, which traces its queries and is connected to 
+    a database holding <dataset>, about <calls> times (fewer for the methods 
+    that work on every truck or every trip) and return, for each method, the 
+    (seconds, commands) taken by each call. 
+    """  
+    rand = random.Random(dataset.seed)  
+    rids = list(dataset.routes)  
+    tids = list(dataset.trucks)  
+    drivers = list(dataset.drivers)  
+    fids = sorted(fid for fids in dataset.facilities.values() for fid in fids)  
+    days = dataset.days()  
+    # Scheduling happens on days after the generated trips, each call on its  
+    # own day, so that earlier calls do not fill up the day.  
+    future = dataset.start + dt.timedelta(days=days + 1)  
+  
+    def past_day() -> dt.date:  
+        return dataset.start + dt.timedelta(days=rand.randrange(days))  
+  
+    def qualifications(i: int) -> TextIO:  
+        out = io.StringIO()  
+        dataset.qualifications(out, 1000 + i)  
+        out.seek(0)  
+        return out  
+  
+    def rebuild_components() -> dict[int, int]:  
+        ww.refresh_workmate_components()  
+        return ww.workmate_components()  
+  
+    cases: list[tuple[str, int, Callable[[int], Callable[[], object]]]] = [  
+        ('schedule_trip', calls, lambda i: lambda: ww.schedule_trip(  
+            rand.choice(rids),  
+            dt.datetime.combine(future + dt.timedelta(days=i),  
+                                dt.time(rand.randint(8, 14))))),  
+        ('schedule_trip_many', max(1, calls // 5),  
+         lambda i: lambda: ww.schedule_trip_many([  
+             (rand.choice(rids),  
+              dt.datetime.combine(future + dt.timedelta(days=3 * calls + i),  
+                                  dt.time(rand.randint(8, 14))))  
+             for _ in range(50)])),  
+        ('schedule_trips', calls, lambda i: lambda: ww.schedule_trips(  
+            rand.choice(tids), future + dt.timedelta(days=calls + i))),  
+        ('schedule_fleet', max(1, calls // 5), lambda i: lambda: ww.schedule_fleet(  
+            future + dt.timedelta(days=2 * calls + i))),  
+        ('update_technicians', calls, lambda i: (  
+            lambda f=qualifications(i): ww.update_technicians(f))),  
+        ('workmate_sphere', calls, lambda i: lambda: ww.workmate_sphere(  
+            rand.choice(drivers))),  
+        ('workmate_components', max(1, calls // 5),  
+         lambda i: rebuild_components),  
+        ('schedule_maintenance', max(1, calls // 5),  
+         lambda i: lambda: ww.schedule_maintenance(past_day())),  
+        ('reroute_waste', calls, lambda i: lambda: ww.reroute_waste(  
+            rand.choice(fids), past_day())),  
+        ('reroute_waste_bulk', calls, lambda i: lambda: ww.reroute_waste_bulk(  
+            rand.sample(fids, min(3, len(fids))), past_day(),  
+            past_day() + dt.timedelta(days=6))),  
+    ]  
+  
+    results = {}  
+    for name, n, make_call in cases:  
+        results[name] = []  
+        for i in range(n):  
+            call = make_call(i)  
+            commands = _queries(ww)  
+            start = perf_counter()  
+            call()  
+            elapsed = perf_counter() - start  
+            results[name].append((elapsed, _queries(ww) - commands))  
+    return results  
+  
+  
+def _queries(ww: WasteWrangler) -> int:  
+    """Return the number of queries <ww> has sent so far."""  
+    return sum(stats['queries'] for stats in ww.trace_stats().values())  
+  
+  
+def summarize(timings: list[tuple[float, int]]) -> dict[str, float]:  
+    """Return the number of calls, the 50th, 90th and 99th percentile and 
+    maximum latency in milliseconds, and the mean number of commands per 
+    call of <timings>. 
+    """  
+    latencies = sorted(seconds * 1000 for seconds, _ in timings)  
+    return {  
+        'calls': len(timings),  
+        'p50': _percentile(latencies, 50),  
+        'p90': _percentile(latencies, 90),  
+        'p99': _percentile(latencies, 99),  
+        'max': latencies[-1],  
+        'commands': sum(commands for _, commands in timings) / len(timings),  
+    }  
+  
+  
+def report(results: dict[str, list[tuple[float, int]]], out: TextIO) -> None:  
+    """Write a table summarizing <results> to <out>."""  
+    out.write('%-22s %6s %10s %10s %10s %10s %10s\n'  
+              % ('method', 'calls', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms',  
+                 'cmds/call'))  
+    for name, timings in results.items():  
+        s = summarize(timings)  
+        out.write('%-22s %6d %10.2f %10.2f %10.2f %10.2f %10.1f\n'  
+                  % (name, s['calls'], s['p50'], s['p90'], s['p99'], s['max'],  
+                     s['commands']))  
+  
+  
+def _percentile(values: list[float], p: float) -> float:  
+    """Return the <p>th percentile of the sorted, non-empty <values>, using 
+    the nearest rank. 
+    """  
+    rank = -(-len(values) * p // 100)  
+    return values[max(int(rank), 1) - 1]  
+  
+  
+def main(argv: list[str]) -> None:  
+    """Benchmark WasteWrangler as described by the command line <argv>."""  
+    parser = argparse.ArgumentParser(  
+        description='Time the WasteWrangler methods on synthetic data.')  
+    parser.add_argument('dbname')  
+    parser.add_argument('username')  
+    parser.add_argument('password', nargs='?', default='')  
+    parser.add_argument('--scales', default='tiny,small',  
+                        help='comma-separated scales from: %s' % ', '.join(SCALES))  
+    parser.add_argument('--calls', type=int, default=20,  
+                        help='calls per method (default: %(default)s)')  
+    parser.add_argument('--json', help='also write the summaries to this file')  
+    parser.add_argument('--partitioned', action='store_true',  
+                        help='partition Trip by month')  
+    args = parser.parse_args(argv)  
+  
+    summaries = {}  
+    for scale_name in args.scales.split(','):  
+        scale = SCALES[scale_name]  
+        dataset = Dataset(scale)  
+        start = perf_counter()  
+        load(args.dbname, args.username, args.password, dataset,  
+             args.partitioned)  
+        print('== %s: %d trucks, %d employees, %d trips (loaded in %.1f s) =='  
+              % (scale_name, scale.trucks, scale.employees, scale.trips,  
+                 perf_counter() - start))  
+  
+        ww = WasteWrangler(trace=True)  
+        if not ww.connect(args.dbname, args.username, args.password):  
+            sys.exit("Couldn't connect to %s" % args.dbname)  
+        try:  
+            results = benchmark(ww, dataset, args.calls)  
+        finally:  
+            ww.disconnect()  
+        report(results, sys.stdout)  
+        summaries[scale_name] = {name: summarize(timings)  
+                                 for name, timings in results.items()}  
+  
+    if args.json:  
+        with open(args.json, 'w') as json_file:  
+            json.dump(summaries, json_file, indent=2)  
+  
+  
+if __name__ == '__main__':  
+    main(sys.argv[1:])  
@@ -0,0 +1,419 @@
+"""CSC343 Assignment 2 -- synthetic data 
+ 
+=== Module Description === 
+ 
+This file generates data for the waste_wrangler schema at a configurable 
+scale, so that the WasteWrangler methods can be benchmarked on more than the 
+sample data. The data follows the assumptions documented in 
+waste_wrangler_schema.sql: trips respect the working day, the 30 minute gap 
+between trips of the same truck or driver, maintenance days and waste types, 
+and every route is served at most once a day. 
+ 
+The same scale and seed always give the same data. Rows are generated lazily, 
+one table at a time, so even the largest scales need little memory. 
+ 
+To write a data file in the COPY format understood by psql and setup: 
+    python generate_data.py small small_data.sql 
+"""  
+import datetime as dt  
+import random  
+import sys  
+from typing import Iterator, Optional, TextIO  
+  
+from a2 import BUFFER, DAY_END, DAY_START, SPEED  
+  
+  
+# The waste types each truck type can collect, as in the sample data.  
+TRUCK_TYPES = {  
+    'A': ('plastic recycling', 'paper recycling'),  
+    'B': ('plastic recycling',),  
+    'C': ('compost', 'landfill'),  
+    'D': ('large items', 'electronic waste'),  
+    'E': ('aluminum containers', 'electronic waste'),  
+}  
+WASTE_TYPES = sorted({waste_type for waste_types in TRUCK_TYPES.values()  
+                      for waste_type in waste_types})  
+  
+_FIRST_NAMES = (  
+    'Ada', 'Alan', 'Angela', 'Barbara', 'Bertholt', 'Chico', 'Clara',  
+    'Donald', 'Edgar', 'Frances', 'Frank', 'Grace', 'Jim', 'John', 'Leslie',  
+    'Margaret', 'Mercedes', 'Pablo', 'Radia', 'Rigoberta', 'Shafi', 'Sophie',  
+    'Tony', 'Vandana',  
+)  
+_SYLLABLES = (  
+    'ba', 'ch', 'da', 'el', 'fo', 'gu', 'ha', 'in', 'ka', 'lo', 'ma', 'ne',  
+    'or', 'pa', 'ri', 'sa', 'ta', 'ul', 'va', 'wi', 'ya', 'zo',  
+)  
+_STREETS = (  
+    'Bathurst St', 'Bloor St', 'College St', 'Danforth Ave', 'Dundas St',  
+    'Eglinton Ave', 'King St', 'Queen St', 'Spadina Ave', 'Yonge St',  
+)  
+  
+  
+class Scale:  
+    """The size of a generated dataset. 
+ 
+    === Instance Attributes === 
+    trucks: the number of trucks. 
+    employees: the number of employees. About 60% of them are drivers and 
+        the rest are technicians. 
+    routes: the number of routes. 
+    facilities: the number of facilities. 
+    trips: the number of trips. 
+    stops: the average number of stops on a route. 
+    """  
+    trucks: int  
+    employees: int  
+    routes: int  
+    facilities: int  
+    trips: int  
+    stops: int  
+  
+    def __init__(self, trucks: int, employees: int, routes: int,  
+                 facilities: int, trips: int, stops: int = 10) -> None:  
+        """Initialize a scale with the given number of rows."""  
+        self.trucks = trucks  
+        self.employees = employees  
+        self.routes = routes  
+        self.facilities = facilities  
+        self.trips = trips  
+        self.stops = stops  
+  
+  
+SCALES = {  
+    'tiny': Scale(trucks=20, employees=200, routes=60, facilities=10,  
+                  trips=2_000),  
+    'small': Scale(trucks=200, employees=2_000, routes=600, facilities=40,  
+                   trips=100_000),  
+    'medium': Scale(trucks=1_000, employees=10_000, routes=3_000,  
+                    facilities=100, trips=1_000_000),  
+    'large': Scale(trucks=10_000, employees=100_000, routes=30_000,  
+                   facilities=500, trips=10_000_000),  
+}  
+  
+  
+class Dataset:  
+    """A synthetic dataset for the waste_wrangler schema. 
+ 
+    Trips start on <start> and fill as many days as they need, each truck 
+    doing back to back trips with the same pair of drivers for the day. 
+    Maintenance is spread every 60 to 120 days per truck, from a year 
+    before <start> to shortly after the last trip. 
+ 
+    === Instance Attributes === 
+    scale: the size of this dataset. 
+    start: the day of the first trip. 
+    seed: the seed of the random numbers used for this dataset. 
+    trucks: maps each tID to its truck type and capacity. 
+    hire_dates: maps each eID to its hire date. 
+    drivers: maps the eID of each driver to the truck types they can drive. 
+    technicians: maps the eID of each technician to the truck types they can 
+        maintain. 
+    routes: maps each rID to its waste type and length. 
+    facilities: maps each waste type to the fIDs that take it. 
+    maintenance: maps each tID to the days it has maintenance. 
+    """  
+    scale: Scale  
+    start: dt.date  
+    seed: int  
+    trucks: dict[int, tuple[str, float]]  
+    hire_dates: dict[int, dt.date]  
+    drivers: dict[int, list[str]]  
+    technicians: dict[int, list[str]]  
+    routes: dict[int, tuple[str, float]]  
+    facilities: dict[str, list[int]]  
+    maintenance: dict[int, set[dt.date]]  
+    _technician_days: dict[tuple[int, dt.date], int]  
+  
+    def __init__(self, scale: Scale, start: dt.date = dt.date(2023, 1, 2),  
+                 seed: int = 343) -> None:  
+        """Initialize the dataset of size <scale> whose trips start on 
+        <start>, using <seed> for its random numbers. 
+        """  
+        self.scale = scale  
+        self.start = start  
+        self.seed = seed  
+        rand = random.Random(seed)  
+        types = sorted(TRUCK_TYPES)  
+  
+        self.trucks = {tid: (rand.choice(types), float(rand.randint(10, 25)))  
+                       for tid in range(1, scale.trucks + 1)}  
+  
+        self.hire_dates = {}  
+        self.drivers = {}  
+        self.technicians = {}  
+        # Everyone is hired before the first maintenance  
+        first_hire = dt.date(1970, 1, 1)  
+        hire_days = (start - dt.timedelta(days=400) - first_hire).days  
+        for eid in range(1, scale.employees + 1):  
+            self.hire_dates[eid] = first_hire + dt.timedelta(  
+                days=rand.randrange(hire_days))  
+            # Make sure every truck type has a driver and a technician  
+            if eid <= len(types):  
+                self.drivers[eid] = [types[eid - 1]]  
+            elif eid <= 2 * len(types):  
+                self.technicians[eid] = [types[eid - 1 - len(types)]]  
+            elif eid % 5 < 3:  
+                self.drivers[eid] = sorted(rand.sample(types, rand.randint(1, 3)))  
+            else:  
+                self.technicians[eid] = sorted(rand.sample(types, rand.randint(1, 3)))  
+  
+        self.routes = {rid: (rand.choice(WASTE_TYPES),  
+                             float(rand.randint(5, 30)))  
+                       for rid in range(1, scale.routes + 1)}  
+  
+        self.facilities = {}  
+        for fid in range(1, max(scale.facilities, len(WASTE_TYPES)) + 1):  
+            if fid <= len(WASTE_TYPES):  
+                waste_type = WASTE_TYPES[fid - 1]  
+            else:  
+                waste_type = rand.choice(WASTE_TYPES)  
+            self.facilities.setdefault(waste_type, []).append(fid)  
+  
+        self.maintenance = {}  
+        self._technician_days = {}  
+        by_type = {}  
+        for eid, qualified in self.technicians.items():  
+            for truck_type in qualified:  
+                by_type.setdefault(truck_type, []).append(eid)  
+        busy = set()  
+        end = start + dt.timedelta(days=self.days() + 30)  
+        for tid, (truck_type, _) in self.trucks.items():  
+            days = set()  
+            day = start - dt.timedelta(days=365 - rand.randrange(120))  
+            while day <= end:  
+                for eid in rand.sample(by_type[truck_type],  
+                                       min(3, len(by_type[truck_type]))):  
+                    if (eid, day) not in busy:  
+                        busy.add((eid, day))  
+                        days.add(day)  
+                        self._technician_days[tid, day] = eid  
+                        break  
+                day += dt.timedelta(days=rand.randint(60, 120))  
+            self.maintenance[tid] = days  
+  
+    def days(self) -> int:  
+        """Return an upper bound on the number of days the trips of this 
+        dataset cover, given that trucks rarely fit more than one average 
+        route and a half in a day. 
+        """  
+        per_day = min(self.scale.trucks, self.scale.routes)  
+        return -(-self.scale.trips // per_day)  
+  
+    def tables(self) -> Iterator[tuple[str, tuple[str, ...], Iterator[tuple]]]:  
+        """Yield (table, columns, rows) for every table of the schema, in an 
+        order that respects the foreign keys. The rows of each table are 
+        generated as they are consumed. 
+        """  
+        yield 'WasteType', ('wasteType',), ((w,) for w in WASTE_TYPES)  
+        yield ('TruckType', ('truckType', 'wasteType'),  
+               ((truck_type, waste_type)  
+                for truck_type, waste_types in sorted(TRUCK_TYPES.items())  
+                for waste_type in waste_types))  
+        yield ('Truck', ('tID', 'truckType', 'capacity'),  
+               ((tid, truck_type, capacity)  
+                for tid, (truck_type, capacity) in self.trucks.items()))  
+        yield 'Facility', ('fID', 'address', 'wasteType'), self._facilities()  
+        yield 'Employee', ('eID', 'name', 'hireDate'), self._employees()  
+        yield ('Driver', ('eID', 'truckType'),  
+               ((eid, truck_type) for eid, qualified in self.drivers.items()  
+                for truck_type in qualified))  
+        yield ('Technician', ('eID', 'truckType'),  
+               ((eid, truck_type) for eid, qualified in self.technicians.items()  
+                for truck_type in qualified))  
+        yield ('Maintenance', ('tID', 'eID', 'mDate'),  
+               ((tid, eid, day)  
+                for (tid, day), eid in sorted(self._technician_days.items())))  
+        yield ('Route', ('rID', 'wasteType', 'length'),  
+               ((rid, waste_type, length)  
+                for rid, (waste_type, length) in self.routes.items()))  
+        yield 'Stop', ('address', 'rID', 'assistance'), self._stops()  
+        yield ('Trip', ('rID', 'tID', 'tTime', 'volume', 'eID1', 'eID2', 'fID'),  
+               self._trips())  
+  
+    def name(self, eid: int) -> str:  
+        """Return the name of the employee <eid>. Names are unique, and made 
+        of a first name and a one word last name. 
+        """  
+        first = _FIRST_NAMES[eid % len(_FIRST_NAMES)]  
+        n = eid // len(_FIRST_NAMES)  
+        last = ''  
+        while True:  
+            last += _SYLLABLES[n % len(_SYLLABLES)]  
+            n //= len(_SYLLABLES)  
+            if n == 0:  
+                break  
+        return first + ' ' + last.capitalize() + 'son'  
+  
+    def qualifications(self, out: TextIO, entries: int) -> None:  
+        """Write a qualifications file for update_technicians with <entries> 
+        entries to <out>. About half of the entries are valid; the others 
+        name a driver, an unknown employee or truck type, or a qualification 
+        the technician already has. 
+        """  
+        rand = random.Random(self.seed + entries)  
+        technicians = list(self.technicians)  
+        drivers = list(self.drivers)  
+        for _ in range(entries):  
+            kind = rand.randrange(8)  
+            truck_type = rand.choice(sorted(TRUCK_TYPES))  
+            if kind < 4:  
+                eid = rand.choice(technicians)  
+                name = self.name(eid)  
+            elif kind == 4:  
+                name = self.name(rand.choice(drivers))  
+            elif kind == 5:  
+                name = 'Nobody Atall'  
+            elif kind == 6:  
+                name = self.name(rand.choice(technicians))  
+                truck_type = 'Z'  
+            else:  
+                eid = rand.choice(technicians)  
+                name = self.name(eid)  
+                truck_type = self.technicians[eid][0]  
+            title = rand.choice(('', 'Mr. ', 'Ms. ', 'Dr. ', 'Prof. '))  
+            out.write(title + name + '\n' + truck_type + '\n')  
+  
+    def _facilities(self) -> Iterator[tuple]:  
+        """Yield the rows of Facility."""  
+        rand = random.Random(self.seed + 1)  
+        rows = sorted((fid, waste_type)  
+                      for waste_type, fids in self.facilities.items()  
+                      for fid in fids)  
+        for fid, waste_type in rows:  
+            yield fid, _address(rand), waste_type  
+  
+    def _employees(self) -> Iterator[tuple]:  
+        """Yield the rows of Employee."""  
+        for eid, hire_date in self.hire_dates.items():  
+            yield eid, self.name(eid), hire_date  
+  
+    def _stops(self) -> Iterator[tuple]:  
+        """Yield the rows of Stop."""  
+        rand = random.Random(self.seed + 2)  
+        for rid in self.routes:  
+            addresses = set()  
+            for _ in range(rand.randint(1, 2 * self.scale.stops - 1)):  
+                addresses.add(_address(rand))  
+            for address in sorted(addresses):  
+                yield address, rid, rand.random() < 0.05  
+  
+    def _trips(self) -> Iterator[tuple]:  
+        """Yield the rows of Trip, one day at a time."""  
+        rand = random.Random(self.seed + 3)  
+        remaining = self.scale.trips  
+        drivers = sorted(self.drivers)  
+        by_type = {}  
+        for eid in drivers:  
+            for truck_type in self.drivers[eid]:  
+                by_type.setdefault(truck_type, []).append(eid)  
+        trucks = list(self.trucks)  
+        day = self.start  
+        while remaining > 0:  
+            routes = {}  
+            for rid, (waste_type, _) in self.routes.items():  
+                routes.setdefault(waste_type, []).append(rid)  
+            for rids in routes.values():  
+                rand.shuffle(rids)  
+            rand.shuffle(trucks)  
+            rand.shuffle(drivers)  
+            for eids in by_type.values():  
+                rand.shuffle(eids)  
+            used = set()  
+            partners = iter(drivers)  
+            qualified = {truck_type: iter(eids)  
+                         for truck_type, eids in by_type.items()}  
+  
+            day_start = dt.datetime.combine(day, DAY_START)  
+            day_end = dt.datetime.combine(day, DAY_END)  
+            for tid in trucks:  
+                if remaining == 0:  
+                    break  
+                truck_type, capacity = self.trucks[tid]  
+                if day in self.maintenance[tid]:  
+                    continue  
+                eid1 = _next_unused(qualified[truck_type], used)  
+                eid2 = _next_unused(partners, used)  
+                if eid1 is None or eid2 is None:  
+                    break  
+  
+                time = day_start + dt.timedelta(minutes=rand.randrange(0, 60, 5))  
+                waste_types = [waste_type for waste_type in TRUCK_TYPES[truck_type]  
+                               if waste_type in self.facilities]  
+                while remaining > 0:  
+                    candidates = [waste_type for waste_type in waste_types  
+                                  if routes.get(waste_type)]  
+                    if not candidates:  
+                        break  
+                    waste_type = rand.choice(candidates)  
+                    rid = routes[waste_type][-1]  
+                    length = self.routes[rid][1]  
+                    end = time + dt.timedelta(hours=length / SPEED)  
+                    if end > day_end:  
+                        break  
+                    routes[waste_type].pop()  
+                    yield (rid, tid, time, round(rand.uniform(1, capacity), 1),  
+                           max(eid1, eid2), min(eid1, eid2),  
+                           rand.choice(self.facilities[waste_type]))  
+                    remaining -= 1  
+                    time = end + BUFFER + dt.timedelta(  
+                        minutes=rand.randrange(0, 30, 5))  
+                    time = time.replace(second=0, microsecond=0)  
+            day += dt.timedelta(days=1)  
+  
+  
+def write_sql(dataset: Dataset, out: TextIO) -> None:  
+    """Write <dataset> to <out> as a data file of COPY ... FROM stdin 
+    sections, in the format produced by pg_dump. 
+    """  
+    out.write('-- Generated by generate_data.py with seed %d\n'  
+              % dataset.seed)  
+    for table, columns, rows in dataset.tables():  
+        out.write('\ncopy %s (%s) from stdin;\n'  
+                  % (table.lower(), ', '.join(c.lower() for c in columns)))  
+        out.writelines(copy_rows(rows))  
+        out.write('\\.\n')  
+  
+  
+def copy_rows(rows: Iterator[tuple]) -> Iterator[str]:  
+    """Yield each of <rows> as a line in the text format of COPY."""  
+    for row in rows:  
+        yield '\t'.join(_copy_value(value) for value in row) + '\n'  
+  
+  
+def _copy_value(value: object) -> str:  
+    """Return <value> in the text format of COPY."""  
+    if value is None:  
+        return '\\N'  
+    if isinstance(value, bool):  
+        return 't' if value else 'f'  
+    if isinstance(value, dt.datetime):  
+        return value.isoformat(' ')  
+    if isinstance(value, dt.date):  
+        return value.isoformat()  
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')  
+            .replace('\n', '\\n').replace('\r', '\\r'))  
+  
+  
+def _address(rand: random.Random) -> str:  
+    """Return a random street address."""  
+    return '%d %s' % (rand.randint(1, 4999), rand.choice(_STREETS))  
+  
+  
+def _next_unused(eids: Iterator[int], used: set[int]) -> Optional[int]:  
+    """Return the next eID from <eids> that is not in <used> and add it to 
+    <used>, or return None if there is none left. 
+    """  
+    for eid in eids:  
+        if eid not in used:  
+            used.add(eid)  
+            return eid  
+    return None  
+  
+  
+if __name__ == '__main__':  
+    if len(sys.argv) != 3 or sys.argv[1] not in SCALES:  
+        sys.exit('usage: python generate_data.py {%s} FILE'  
+                 % ','.join(SCALES))  
+    with open(sys.argv[2], 'w') as data_file:  
+        write_sql(Dataset(SCALES[sys.argv[1]]), data_file)  
@@ -0,0 +1,687 @@
+"""CSC343 Assignment 2 -- in-memory backend 
+ 
+=== Module Description === 
+ 
+This file contains the MemoryWasteWrangler class, which applies the 
+scheduling rules of WasteWrangler to an in-memory copy of the waste_wrangler 
+tables, so that what-if planning and simulations can run them many times 
+without a round trip to PostgreSQL. WasteWrangler(backend='memory') returns 
+one. 
+ 
+The tables are copied from the database when connecting, or given to load 
+directly, e.g. from generate_data.py. Nothing is written back: the changes 
+made by the methods only exist in memory. 
+ 
+test_conformance makes the same calls on both backends and checks that they 
+agree, on the sample data and on a dataset from generate_data.py. 
+ 
+>>> ww = WasteWrangler(backend='memory') 
+>>> ww.connect("csc343h-marinat", "marinat", "") 
+True 
+>>> ww.schedule_trips(1, dt.date(2023, 5, 3)) 
+0 
+"""  
+import bisect  
+import datetime as dt  
+import math  
+import random  
+import sys  
+from array import array  
+from typing import Iterable, Iterator, Optional  
+  
+import psycopg2 as pg  
+  
+from a2 import (DAY_END, DAY_START, ITERSIZE, MAINTENANCE_HORIZON, SPEED,  
+                AvailabilityIndex, WasteWrangler, _DayPlan, _pick_drivers,  
+                _stream, setup)  
+from benchmark import load  
+from generate_data import SCALES, Dataset  
+  
+  
+# The columns of each table that MemoryWasteWrangler keeps, in the order its  
+# rows use. The other tables of the schema are not needed by the rules.  
+_COLUMNS = {  
+    'TruckType': ('truckType', 'wasteType'),  
+    'Truck': ('tID', 'truckType', 'capacity'),  
+    'Facility': ('fID', 'wasteType'),  
+    'Employee': ('eID', 'hireDate'),  
+    'Driver': ('eID', 'truckType'),  
+    'Technician': ('eID', 'truckType'),  
+    'Maintenance': ('tID', 'eID', 'mDate'),  
+    'Route': ('rID', 'wasteType', 'length'),  
+    'Trip': ('rID', 'tID', 'tTime', 'volume', 'eID1', 'eID2', 'fID'),  
+}  
+  
+# Trip start times are stored as microseconds since _EPOCH.  
+_EPOCH = dt.datetime(1970, 1, 1)  
+_TICK = dt.timedelta(microseconds=1)  
+  
+  
+class _TripTable:  
+    """The rows of Trip, stored column by column in typed arrays, with an 
+    index on the day of each trip and the pairs of drivers who have been on 
+    a trip together. 
+ 
+    === Instance Attributes === 
+    rid, tid, eid1, eid2, fid: the integer columns of each trip. 
+    start: the start time of each trip, as microseconds since _EPOCH. 
+    volume: the volume of each trip, or NaN if it is null. 
+    by_day: maps the ordinal of each day to the row numbers of its trips. 
+    workmates: maps each driver to the drivers they have been on a trip 
+        with. 
+    """  
+    rid: array  
+    tid: array  
+    eid1: array  
+    eid2: array  
+    fid: array  
+    start: array  
+    volume: array  
+    by_day: dict[int, array]  
+    workmates: dict[int, set[int]]  
+  
+    def __init__(self) -> None:  
+        """Initialize an empty table."""  
+        self.rid = array('i')  
+        self.tid = array('i')  
+        self.eid1 = array('i')  
+        self.eid2 = array('i')  
+        self.fid = array('i')  
+        self.start = array('q')  
+        self.volume = array('d')  
+        self.by_day = {}  
+        self.workmates = {}  
+  
+    def __len__(self) -> int:  
+        """Return the number of trips."""  
+        return len(self.rid)  
+  
+    def append(self, rid: int, tid: int, time: dt.datetime,  
+               volume: Optional[float], eid1: int, eid2: int,  
+               fid: int) -> None:  
+        """Add the trip with the given Trip columns."""  
+        row = len(self.rid)  
+        self.rid.append(rid)  
+        self.tid.append(tid)  
+        self.start.append((time - _EPOCH) // _TICK)  
+        self.volume.append(math.nan if volume is None else volume)  
+        self.eid1.append(eid1)  
+        self.eid2.append(eid2)  
+        self.fid.append(fid)  
+        self.by_day.setdefault(time.toordinal(), array('i')).append(row)  
+        self.workmates.setdefault(eid1, set()).add(eid2)  
+        self.workmates.setdefault(eid2, set()).add(eid1)  
+  
+    def time(self, row: int) -> dt.datetime:  
+        """Return the start time of the trip in <row>."""  
+        return _EPOCH + self.start[row] * _TICK  
+  
+    def day(self, date: dt.date) -> array:  
+        """Return the row numbers of the trips on <date>."""  
+        return self.by_day.get(date.toordinal(), array('i'))  
+  
+    def rows(self) -> Iterator[tuple]:  
+        """Yield every trip as a row of the Trip columns in _COLUMNS."""  
+        for row in range(len(self.rid)):  
+            volume = self.volume[row]  
+            yield (self.rid[row], self.tid[row], self.time(row),  
+                   None if math.isnan(volume) else volume,  
+                   self.eid1[row], self.eid2[row], self.fid[row])  
+  
+  
+class _MaintenanceTable:  
+    """The rows of Maintenance, stored column by column in typed arrays, with 
+    indexes on the days each truck and each technician is busy. 
+ 
+    === Instance Attributes === 
+    tid, eid: the integer columns of each maintenance. 
+    day: the day of each maintenance, as an ordinal. 
+    by_truck: maps each tID to the ordinals of its maintenance days, in 
+        ascending order. 
+    by_day: maps the ordinal of each day to the tIDs maintained that day. 
+    busy: the (eID, ordinal) pairs of technicians that maintain a truck on 
+        that day. 
+    """  
+    tid: array  
+    eid: array  
+    day: array  
+    by_truck: dict[int, array]  
+    by_day: dict[int, array]  
+    busy: set[tuple[int, int]]  
+  
+    def __init__(self) -> None:  
+        """Initialize an empty table."""  
+        self.tid = array('i')  
+        self.eid = array('i')  
+        self.day = array('i')  
+        self.by_truck = {}  
+        self.by_day = {}  
+        self.busy = set()  
+  
+    def append(self, tid: int, eid: int, date: dt.date) -> None:  
+        """Add maintenance of the truck <tid> by the technician <eid> on 
+        <date>. 
+        """  
+        day = date.toordinal()  
+        self.tid.append(tid)  
+        self.eid.append(eid)  
+        self.day.append(day)  
+        days = self.by_truck.setdefault(tid, array('i'))  
+        days.insert(bisect.bisect_right(days, day), day)  
+        self.by_day.setdefault(day, array('i')).append(tid)  
+        self.busy.add((eid, day))  
+  
+    def has(self, tid: int, date: dt.date) -> bool:  
+        """Return True iff the truck <tid> has maintenance on <date>."""  
+        days = self.by_truck.get(tid, ())  
+        i = bisect.bisect_left(days, date.toordinal())  
+        return i < len(days) and days[i] == date.toordinal()  
+  
+    def trucks_on(self, date: dt.date) -> list[tuple[int]]:  
+        """Return the trucks with maintenance on <date>, as (tID,) rows."""  
+        return [(tid,) for tid in self.by_day.get(date.toordinal(), ())]  
+  
+    def rows(self) -> Iterator[tuple]:  
+        """Yield every maintenance as a row of the Maintenance columns in 
+        _COLUMNS. 
+        """  
+        for row in range(len(self.tid)):  
+            yield (self.tid[row], self.eid[row],  
+                   dt.date.fromordinal(self.day[row]))  
+  
+  
+class MemoryWasteWrangler:  
+    """A class that applies the rules of WasteWrangler to an in-memory copy 
+    of data conforming to the schema in waste_wrangler_schema.ddl. 
+ 
+    schedule_trip, schedule_trip_many, schedule_trips, schedule_fleet, 
+    schedule_maintenance, reroute_waste, reroute_waste_bulk and 
+    workmate_sphere behave exactly as the WasteWrangler methods of the same 
+    name, but only change the copy. 
+ 
+    === Instance Attributes === 
+    loaded: True iff the tables have been loaded. 
+    itersize: the number of rows fetched at a time when copying a table from 
+        the database. 
+    """  
+    loaded: bool  
+    itersize: int  
+    _truck_types: dict[str, set[str]]  
+    _trucks: dict[int, tuple[str, float]]  
+    _facilities: dict[int, str]  
+    _hire_dates: dict[int, dt.date]  
+    _drivers: dict[int, set[str]]  
+    _technicians: dict[int, set[str]]  
+    _routes: dict[int, tuple[str, float]]  
+    _trips: _TripTable  
+    _maintenance: _MaintenanceTable  
+    _reference: Optional[dict[str, list[tuple]]]  
+  
+    def __init__(self, itersize: int = ITERSIZE) -> None:  
+        """Initialize this MemoryWasteWrangler instance, with no data yet, 
+        which copies tables <itersize> rows at a time. 
+        """  
+        self.loaded = False  
+        self.itersize = itersize  
+        self._clear()  
+  
+    def connect(self, dbname: str, username: str, password: str) -> bool:  
+        """Copy the tables of the waste_wrangler schema of the database 
+        <dbname> into memory, using the username <username> and password 
+        <password>. The connection is only used while copying. 
+ 
+        Return True if the tables were copied successfully, False otherwise. 
+        I.e., do NOT throw an error if making the connection fails. 
+        """  
+        conn = None  
+        try:  
+            conn = pg.connect(dbname=dbname, user=username, password=password,  
+                              options="-c search_path=waste_wrangler")  
+            conn.set_session(readonly=True)  
+            self.load(self._read_tables(conn))  
+            return True  
+        except pg.Error:  
+            self._clear()  
+            return False  
+        finally:  
+            if conn is not None:  
+                conn.close()  
+  
+    def disconnect(self) -> bool:  
+        """Forget the copy of the tables. Always return True."""  
+        self._clear()  
+        return True  
+  
+    def load(self, tables: Iterable[tuple[str, tuple[str, ...],  
+                                          Iterable[tuple]]]) -> None:  
+        """Replace the copy with <tables>, given as (table, columns, rows), 
+        as Dataset.tables in generate_data.py yields them. Tables and columns 
+        that are not in _COLUMNS are ignored. 
+        """  
+        self._clear()  
+        for table, columns, rows in tables:  
+            if table not in _COLUMNS:  
+                continue  
+            names = [column.lower() for column in columns]  
+            picks = [names.index(column.lower()) for column in _COLUMNS[table]]  
+            for row in rows:  
+                self._add(table, tuple(row[i] for i in picks))  
+        self.loaded = True  
+  
+    def rows(self, table: str) -> list[tuple]:  
+        """Return the rows of <table>, which is 'Trip' or 'Maintenance', with 
+        the columns given for it in _COLUMNS. 
+        """  
+        if table == 'Trip':  
+            return list(self._trips.rows())  
+        return list(self._maintenance.rows())  
+  
+    def schedule_trip(self, rid: int, time: dt.datetime) -> bool:  
+        """Schedule a truck and two employees to the route identified with 
+        <rid> at the given time stamp <time>, as WasteWrangler.schedule_trip 
+        does. 
+ 
+        Return True iff a trip has been scheduled successfully for the given 
+        route. 
+        """  
+        if rid not in self._routes:  
+            return False  
+        waste_type, length = self._routes[rid]  
+        date = time.date()  
+        end = time + dt.timedelta(hours=length / SPEED)  
+        if (time.time() < DAY_START  
+                or end > dt.datetime.combine(date, DAY_END)):  
+            return False  
+  
+        availability = self._availability(date)  
+        if rid in availability.routes:  
+            return False  
+  
+        trucks = [(-capacity, tid)  
+                  for tid, (truck_type, capacity) in self._trucks.items()  
+                  if waste_type in self._truck_types.get(truck_type, ())  
+                  and availability.truck_free(tid, time, end)]  
+        if len(trucks) == 0:  
+            return False  
+        tid = min(trucks)[1]  
+  
+        drivers = [(eid, set(truck_types))  
+                   for eid, hire_date, truck_types in self._tables()['driver']  
+                   if hire_date <= date  
+                   and availability.driver_free(eid, time, end)]  
+        pair = _pick_drivers(drivers, self._trucks[tid][0])  
+        if pair is None:  
+            return False  
+  
+        fids = [fid for fid, facility_waste in self._facilities.items()  
+                if facility_waste == waste_type]  
+        if len(fids) == 0:  
+            return False  
+  
+        self._trips.append(rid, tid, time, None, pair[0], pair[1], min(fids))  
+        return True  
+  
+    def schedule_trip_many(self, requests: list[tuple[int, dt.datetime]]  
+                           ) -> list[bool]:  
+        """Schedule a trip for each (rid, time) in <requests>, in the given 
+        order, as WasteWrangler.schedule_trip_many does. 
+ 
+        Return a list holding, for each request, True iff its trip has been 
+        scheduled successfully. 
+        """  
+        return [self.schedule_trip(rid, time) for rid, time in requests]  
+  
+    def schedule_trips(self, tid: int, date: dt.date) -> int:  
+        """Schedule the truck identified with <tid> for trips on <date>, as 
+        WasteWrangler.schedule_trips does. 
+ 
+        Return the number of trips that were scheduled successfully. 
+        """  
+        # A single truck is just a fleet of one.  
+        return self.schedule_fleet(date, [tid]).get(tid, 0)  
+  
+    def schedule_fleet(self, date: dt.date,  
+                       tids: Optional[list[int]] = None) -> dict[int, int]:  
+        """Schedule every truck in <tids> (or every truck, if <tids> is None) 
+        for trips on <date>, as WasteWrangler.schedule_fleet does. 
+ 
+        Return a dictionary mapping each scheduled tID to the number of trips 
+        that were scheduled for it. 
+        """  
+        if isinstance(date, dt.datetime):  
+            date = date.date()  
+        plan = _DayPlan.build(date, tids, self._tables(),  
+                              self._availability(date))  
+        counts = {}  
+        for tid in sorted(plan.trucks):  
+            counts[tid] = plan.schedule_truck(tid)  
+  
+        for rid, tid, time, eid1, eid2, fid in plan.trips:  
+            self._trips.append(rid, tid, time, None, eid1, eid2, fid)  
+        return counts  
+  
+    def workmate_sphere(self, eid: int) -> list[int]:  
+        """Return the workmate sphere of the driver identified by <eid>, as 
+        WasteWrangler.workmate_sphere does. 
+        """  
+        workmates = self._trips.workmates  
+        sphere = {eid}  
+        frontier = [eid]  
+        while frontier:  
+            for other in workmates.get(frontier.pop(), ()):  
+                if other not in sphere:  
+                    sphere.add(other)  
+                    frontier.append(other)  
+        sphere.discard(eid)  
+        return list(sphere)  
+  
+    def schedule_maintenance(self, date: dt.date,  
+                             horizon: int = MAINTENANCE_HORIZON) -> int:  
+        """Schedule maintenance for the trucks that are due for it, as 
+        WasteWrangler.schedule_maintenance does. 
+ 
+        Return the number of trucks that were successfully scheduled for 
+        maintenance. 
+        """  
+        first = date.toordinal()  
+        count = 0  
+        for tid in sorted(self._trucks):  
+            days = self._maintenance.by_truck.get(tid, ())  
+            i = bisect.bisect_left(days, first)  
+            if (i == 0 or days[i - 1] >= first - 90  
+                    or bisect.bisect_right(days, first + 10) > i):  
+                continue  
+  
+            technicians = sorted(  
+                eid for eid, truck_types in self._technicians.items()  
+                if self._trucks[tid][0] in truck_types)  
+            for day in range(first + 1, first + horizon + 1):  
+                eid = self._free_technician(tid, technicians, day)  
+                if eid is not None:  
+                    self._maintenance.append(tid, eid,  
+                                             dt.date.fromordinal(day))  
+                    count += 1  
+                    break  
+        return count  
+  
+    def reroute_waste(self, fid: int, date: dt.date) -> int:  
+        """Reroute the trips to <fid> on day <date> to another facility that 
+        takes the same type of waste, as WasteWrangler.reroute_waste does. 
+ 
+        Return the number of re-routed trips. 
+        """  
+        # A single facility on a single day is the simplest bulk reroute.  
+        return self.reroute_waste_bulk([fid], date, date).get(fid, 0)  
+  
+    def reroute_waste_bulk(self, fids: list[int], start_date: dt.date,  
+                           end_date: dt.date) -> dict[int, int]:  
+        """Reroute the trips to any of the facilities <fids> from <start_date> 
+        to <end_date> inclusive, as WasteWrangler.reroute_waste_bulk does. 
+ 
+        Return a dictionary that maps each fID in <fids> to the number of 
+        trips rerouted away from it. 
+        """  
+        closed = set(fids)  
+        replacements = {}  
+        for fid in closed:  
+            if fid not in self._facilities:  
+                continue  
+            others = [other for other, waste_type in self._facilities.items()  
+                      if waste_type == self._facilities[fid]  
+                      and other not in closed]  
+            if len(others) > 0:  
+                replacements[fid] = min(others)  
+  
+        counts = {fid: 0 for fid in fids}  
+        trips = self._trips  
+        for day in range(start_date.toordinal(), end_date.toordinal() + 1):  
+            for row in trips.by_day.get(day, ()):  
+                fid = trips.fid[row]  
+                if fid in replacements:  
+                    trips.fid[row] = replacements[fid]  
+                    counts[fid] += 1  
+        return counts  
+  
+    # =========================== Helper methods ============================= #  
+  
+    def _clear(self) -> None:  
+        """Forget all data."""  
+        self.loaded = False  
+        self._truck_types = {}  
+        self._trucks = {}  
+        self._facilities = {}  
+        self._hire_dates = {}  
+        self._drivers = {}  
+        self._technicians = {}  
+        self._routes = {}  
+        self._trips = _TripTable()  
+        self._maintenance = _MaintenanceTable()  
+        self._reference = None  
+  
+    def _add(self, table: str, row: tuple) -> None:  
+        """Add the <row> of <table>, with the columns given for it in 
+        _COLUMNS. 
+        """  
+        self._reference = None  
+        if table == 'TruckType':  
+            self._truck_types.setdefault(row[0], set()).add(row[1])  
+        elif table == 'Truck':  
+            self._trucks[row[0]] = (row[1], row[2])  
+        elif table == 'Facility':  
+            self._facilities[row[0]] = row[1]  
+        elif table == 'Employee':  
+            self._hire_dates[row[0]] = row[1]  
+        elif table == 'Driver':  
+            self._drivers.setdefault(row[0], set()).add(row[1])  
+        elif table == 'Technician':  
+            self._technicians.setdefault(row[0], set()).add(row[1])  
+        elif table == 'Route':  
+            self._routes[row[0]] = (row[1], row[2])  
+        elif table == 'Maintenance':  
+            self._maintenance.append(*row)  
+        else:  
+            self._trips.append(*row)  
+  
+    def _tables(self) -> dict[str, list[tuple]]:  
+        """Return the rows of the reference tables in _DayPlan.TABLES, as 
+        the ref_ statements of a2.py return them. 
+        """  
+        if self._reference is None:  
+            trucks = sorted(self._trucks.items())  
+            routes = sorted(self._routes.items())  
+            self._reference = {  
+                'truck': [(tid, truck_type, capacity)  
+                          for tid, (truck_type, capacity) in trucks],  
+                'trucktype': [(truck_type, waste_type) for truck_type,  
+                              waste_types in self._truck_types.items()  
+                              for waste_type in waste_types],  
+                'facility': sorted(self._facilities.items()),  
+                'route': [(rid, waste_type, length)  
+                          for rid, (waste_type, length) in routes],  
+                'driver': sorted(  
+                    ((eid, self._hire_dates[eid], sorted(truck_types))  
+                     for eid, truck_types in self._drivers.items()),  
+                    key=lambda driver: (driver[1], driver[0])),  
+            }  
+        return self._reference  
+  
+    def _availability(self, date: dt.date) -> AvailabilityIndex:  
+        """Return the busy times of trucks and drivers on <date>."""  
+        trips = self._trips  
+        rows = [(trips.rid[row], trips.tid[row], trips.eid1[row],  
+                 trips.eid2[row], trips.time(row),  
+                 self._routes[trips.rid[row]][1])  
+                for row in trips.day(date)]  
+        return AvailabilityIndex.from_rows(date, rows,  
+                                           self._maintenance.trucks_on(date))  
+  
+    def _free_technician(self, tid: int, technicians: list[int],  
+                         day: int) -> Optional[int]:  
+        """Return the lowest eID among <technicians> who has been hired and 
+        is not busy on the ordinal <day>, or None if the truck <tid> has a 
+        trip or maintenance on that day or no technician is free. 
+        """  
+        date = dt.date.fromordinal(day)  
+        trips = self._trips  
+        if (self._maintenance.has(tid, date)  
+                or any(trips.tid[row] == tid for row in trips.day(date))):  
+            return None  
+        for eid in technicians:  
+            if (self._hire_dates[eid] <= date  
+                    and (eid, day) not in self._maintenance.busy):  
+                return eid  
+        return None  
+  
+    def _read_tables(self, conn: pg.extensions.connection  
+                     ) -> Iterator[tuple[str, tuple[str, ...], Iterable]]:  
+        """Yield (table, columns, rows) for every table in _COLUMNS, reading 
+        the rows with the connection <conn> through a server-side cursor. 
+        """  
+        for table, columns in _COLUMNS.items():  
+            yield table, columns, _stream(  
+                conn, 'memory_' + table.lower(),  
+                "SELECT %s FROM %s;" % (', '.join(columns), table),  
+                itersize=self.itersize)  
+  
+  
+# The calls made on both backends by test_conformance, in order.  
+_CONFORMANCE_CALLS = [  
+    ('schedule_trip', (1, dt.datetime(2023, 5, 4, 8, 0))),  
+    ('schedule_trip', (1, dt.datetime(2023, 5, 4, 13, 0))),  
+    ('schedule_trip', (2, dt.datetime(2023, 5, 4, 9, 30))),  
+    ('schedule_trip', (3, dt.datetime(2023, 5, 4, 7, 0))),  
+    ('schedule_trip', (4, dt.datetime(2023, 5, 4, 15, 30))),  
+    ('schedule_trip', (99, dt.datetime(2023, 5, 4, 10, 0))),  
+    ('schedule_trip_many', ([(5, dt.datetime(2023, 5, 4, 10, 0)),  
+                             (5, dt.datetime(2023, 5, 4, 12, 0)),  
+                             (6, dt.datetime(2023, 5, 4, 10, 0)),  
+                             (1, dt.datetime(2023, 5, 6, 8, 30)),  
+                             (2, dt.datetime(2023, 5, 6, 8, 30)),  
+                             (3, dt.datetime(2023, 5, 6, 15, 45)),  
+                             (99, dt.datetime(2023, 5, 6, 9, 0))],)),  
+    ('schedule_trips', (1, dt.datetime(2023, 5, 3))),  
+    ('schedule_trips', (2, dt.date(2023, 5, 8))),  
+    ('schedule_trips', (3, dt.date(2023, 5, 8))),  
+    ('schedule_fleet', (dt.date(2023, 5, 9),)),  
+    ('workmate_sphere', (2023,)),  
+    ('workmate_sphere', (1,)),  
+    ('workmate_sphere', (3,)),  
+    ('schedule_maintenance', (dt.date(2023, 5, 5),)),  
+    ('schedule_maintenance', (dt.date(2023, 9, 1),)),  
+    ('reroute_waste', (1, dt.date(2023, 5, 10))),  
+    ('reroute_waste', (1, dt.date(2023, 5, 3))),  
+    ('reroute_waste_bulk', ([2, 3], dt.date(2023, 5, 1),  
+                            dt.date(2023, 5, 9))),  
+]  
+  
+  
+def _dataset_calls(dataset: Dataset) -> list[tuple[str, tuple]]:  
+    """Return calls like those in _CONFORMANCE_CALLS, made with the routes, 
+    trucks, drivers and facilities of <dataset>, on the days of its trips 
+    and on the days after them. 
+    """  
+    rand = random.Random(dataset.seed)  
+    rids = sorted(dataset.routes)  
+    tids = sorted(dataset.trucks)  
+    drivers = sorted(dataset.drivers)  
+    fids = sorted(fid for fids in dataset.facilities.values() for fid in fids)  
+    days = dataset.days()  
+    future = dataset.start + dt.timedelta(days=days + 1)  
+  
+    def past_day() -> dt.date:  
+        return dataset.start + dt.timedelta(days=rand.randrange(days))  
+  
+    def future_time(day: int) -> dt.datetime:  
+        # Some of these start before 8:00 or end after 16:00  
+        return dt.datetime.combine(future + dt.timedelta(days=day),  
+                                   dt.time(rand.randint(7, 15),  
+                                           rand.choice([0, 30])))  
+  
+    calls = []  
+    for i in range(10):  
+        calls.append(('schedule_trip', (rand.choice(rids),  
+                                        future_time(i // 3))))  
+    calls.append(('schedule_trip', (rand.choice(rids), dt.datetime.combine(  
+        past_day(), dt.time(10)))))  
+    calls.append(('schedule_trip', (max(rids) + 1, future_time(0))))  
+    calls.append(('schedule_trip_many', ([(rand.choice(rids),  
+                                           future_time(4 + i % 2))  
+                                          for i in range(20)],)))  
+    for i in range(5):  
+        calls.append(('schedule_trips', (rand.choice(tids),  
+                                         future + dt.timedelta(days=6 + i))))  
+    calls.append(('schedule_trips', (rand.choice(tids), past_day())))  
+    for i in range(2):  
+        calls.append(('schedule_fleet', (future + dt.timedelta(days=11 + i),)))  
+    for eid in rand.sample(drivers, 5) + [max(dataset.hire_dates) + 1]:  
+        calls.append(('workmate_sphere', (eid,)))  
+    calls.append(('schedule_maintenance', (past_day(),)))  
+    calls.append(('schedule_maintenance', (past_day(),)))  
+    calls.append(('schedule_maintenance', (future,)))  
+    for _ in range(5):  
+        calls.append(('reroute_waste', (rand.choice(fids), past_day())))  
+    for _ in range(3):  
+        start = past_day()  
+        calls.append(('reroute_waste_bulk', (rand.sample(fids, 3), start,  
+                                             start + dt.timedelta(days=6))))  
+    return calls  
+  
+  
+def test_conformance(dbname: str, username: str, password: str,  
+                     file_path: str = './waste_wrangler_data.sql') -> None:  
+    """Check that a WasteWrangler and a MemoryWasteWrangler agree on the 
+    database <dbname>: first with the calls in _CONFORMANCE_CALLS on the data 
+    file at <file_path>, then with the calls of _dataset_calls on the tiny 
+    dataset of generate_data.py, with Trip both plain and partitioned by 
+    month. 
+    """  
+    setup(dbname, username, password, file_path)  
+    _compare(dbname, username, password, _CONFORMANCE_CALLS)  
+  
+    dataset = Dataset(SCALES['tiny'])  
+    for partitioned in (False, True):  
+        load(dbname, username, password, dataset, partitioned)  
+        _compare(dbname, username, password, _dataset_calls(dataset))  
+  
+  
+def _compare(dbname: str, username: str, password: str,  
+             calls: list[tuple[str, tuple]]) -> None:  
+    """Make the <calls> on a WasteWrangler and on a MemoryWasteWrangler 
+    connected to the database <dbname>, and check that they return the same 
+    results and leave the same trips and maintenance behind. 
+    """  
+    ww = WasteWrangler()  
+    memory = WasteWrangler(backend='memory')  
+    try:  
+        connected = ww.connect(dbname, username, password)  
+        assert connected, f"[Connected] Expected True | Got {connected}."  
+        connected = memory.connect(dbname, username, password)  
+        assert connected, f"[Memory] Expected True | Got {connected}."  
+  
+        for name, args in calls:  
+            expected = getattr(ww, name)(*args)  
+            got = getattr(memory, name)(*args)  
+            if name == 'workmate_sphere':  
+                expected, got = sorted(expected), sorted(got)  
+            assert got == expected, \
+                f"[{name}{args}] Expected {expected}, Got {got}"  
+  
+        cur = ww.connection.cursor()  
+        for table in ('Trip', 'Maintenance'):  
+            cur.execute("SELECT %s FROM %s;"  
+                        % (', '.join(_COLUMNS[table]), table))  
+            expected = sorted(cur.fetchall())  
+            got = sorted(memory.rows(table))  
+            assert got == expected, \
+                f"[{table}] Expected {len(expected)} rows, Got {len(got)}"  
+        ww.connection.commit()  
+        cur.close()  
+    finally:  
+        memory.disconnect()  
+        ww.disconnect()  
+  
+  
+if __name__ == '__main__':  
+    # Usage: python memory_wrangler.py DBNAME USERNAME [PASSWORD]  
+    test_conformance(sys.argv[1], sys.argv[2],  
+                     sys.argv[3] if len(sys.argv) > 3 else '')  
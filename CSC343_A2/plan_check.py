@@ -0,0 +1,185 @@
+"""CSC343 Assignment 2 -- query plan checks 
+ 
+=== Module Description === 
+ 
+This file checks that the queries issued by the WasteWrangler methods find 
+the trips and maintenance they need through the indexes of 
+waste_wrangler_indexes.sql and waste_wrangler_occupancy.sql, rather than by 
+reading whole tables. These tables grow every day the data covers, so a 
+sequential scan on one of them makes a method slower every day. The 
+reference data (trucks, routes, facilities and employees) grows slowly, and 
+is often small enough that reading it whole is the fastest plan. 
+ 
+A synthetic dataset from generate_data.py is loaded, and two kinds of plans 
+are checked: 
+    * the plans of the queries sent by every method, which WasteWrangler's 
+      query tracing captures with EXPLAIN ANALYZE, and 
+    * the plans of the queries run inside the routines of 
+      waste_wrangler_functions.sql, which tracing can not see into. These 
+      are listed in _ROUTINE_QUERIES, and must be kept in step with the 
+      routines. 
+ 
+    python plan_check.py DBNAME USERNAME [PASSWORD] --scale medium 
+ 
+Loading replaces the waste_wrangler schema, so do not run this against a 
+database whose data you want to keep. 
+"""  
+import argparse  
+import datetime as dt  
+import re  
+import sys  
+  
+import psycopg2 as pg  
+  
+from a2 import WasteWrangler  
+from benchmark import benchmark, load  
+from generate_data import SCALES, Dataset  
+  
+  
+# The tables that must not be read with a sequential scan, including any of  
+# their partitions.  
+CHECKED_TABLES = ('trip', 'maintenance', 'truckbusy', 'driverbusy',  
+                  'technicianbusy')  
+  
+# The methods that read every trip by design.  
+_FULL_READS = ('workmate_components', 'refresh_workmate_components')  
+  
+# The selective queries run inside the routines of  
+# waste_wrangler_functions.sql, with the routine they belong to. They use the  
+# parameters built by _parameters.  
+_ROUTINE_QUERIES = [  
+    ('schedule_trip',  
+     "SELECT 1 FROM Trip "  
+     "WHERE rID = %(rid)s AND tTime >= %(day)s AND tTime < %(day)s + 1"),  
+    ('schedule_trip',  
+     "SELECT 1 FROM TruckBusy WHERE day = %(day)s AND tID = %(tid)s"  
+     "  AND busyFrom < %(end)s AND busyUntil > %(start)s"),  
+    ('schedule_trip',  
+     "SELECT 1 FROM DriverBusy WHERE day = %(day)s AND eID = %(eid)s"  
+     "  AND busyFrom < %(end)s AND busyUntil > %(start)s"),  
+    ('schedule_maintenance',  
+     "SELECT 1 FROM TruckBusy WHERE day = %(day)s AND tID = %(tid)s"),  
+    ('schedule_maintenance',  
+     "SELECT 1 FROM TechnicianBusy WHERE day = %(day)s AND eID = %(tech)s"),  
+]  
+  
+_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')  
+  
+  
+def check_plans(dbname: str, username: str, password: str,  
+                dataset: Dataset) -> list[str]:  
+    """Return a description of every checked query that reads one of 
+    CHECKED_TABLES with a sequential scan, in the database <dbname> holding 
+    <dataset>, using the username <username> and password <password>. 
+ 
+    Calling the methods changes the data, as a benchmark run does. Scans of 
+    tables that were empty or fit in a single page when the data was loaded, 
+    such as the partitions of future months or TechnicianBusy on the tiny 
+    scale, read next to nothing and are not reported. 
+    """  
+    failures = []  
+  
+    conn = pg.connect(dbname=dbname, user=username, password=password,  
+                      options="-c search_path=waste_wrangler")  
+    try:  
+        cur = conn.cursor()  
+        cur.execute("SELECT relname FROM pg_class "  
+                    "WHERE relnamespace = 'waste_wrangler'::regnamespace "  
+                    "  AND relkind = 'r' AND relpages <= 1;")  
+        small = {row[0] for row in cur.fetchall()}  
+        conn.commit()  
+  
+        ww = WasteWrangler(trace=True, explain_threshold=0)  
+        if not ww.connect(dbname, username, password):  
+            return ["couldn't connect to %s" % dbname]  
+        try:  
+            benchmark(ww, dataset, 1)  
+            stats = ww.trace_stats()  
+        finally:  
+            ww.disconnect()  
+        for path, path_stats in sorted(stats.items()):  
+            if not path or path.split('/')[-1] in _FULL_READS:  
+                continue  
+            for plan in path_stats['plans']:  
+                for table in _seq_scans(plan['plan'], small):  
+                    failures.append('%s: sequential scan on %s in: %s'  
+                                    % (path, table, plan['query']))  
+  
+        args = _parameters(cur, dataset)  
+        for routine, query in _ROUTINE_QUERIES:  
+            cur.execute("EXPLAIN " + query, args)  
+            plan = '\n'.join(row[0] for row in cur.fetchall())  
+            for table in _seq_scans(plan, small):  
+                failures.append('%s (routine): sequential scan on %s in: %s'  
+                                % (routine, table, cur.query.decode()))  
+    finally:  
+        conn.close()  
+    return sorted(set(failures))  
+  
+  
+def _seq_scans(plan: str, small: set[str]) -> list[str]:  
+    """Return the CHECKED_TABLES, or partitions of them, that the text <plan> 
+    reads with a sequential scan, except for the tables in <small>. 
+    """  
+    return [table for table in _SEQ_SCAN.findall(plan)  
+            if table.lower().split('_')[0] in CHECKED_TABLES  
+            and table.lower() not in small]  
+  
+  
+def _parameters(cur: pg.extensions.cursor, dataset: Dataset) -> dict:  
+    """Return the parameters of _ROUTINE_QUERIES: a route, truck, driver 
+    and technician of <dataset>, and a day in the middle of its trips, using 
+    <cur> to look up a technician. 
+    """  
+    day = dataset.start + dt.timedelta(days=dataset.days() // 2)  
+    start = dt.datetime.combine(day, dt.time(10))  
+    cur.execute("SELECT min(eID) FROM Technician;")  
+    return {  
+        'day': day,  
+        'start': start,  
+        'end': start + dt.timedelta(hours=2),  
+        'rid': min(dataset.routes),  
+        'tid': min(dataset.trucks),  
+        'eid': min(dataset.drivers),  
+        'tech': cur.fetchone()[0],  
+    }  
+  
+  
+def test_plans(dbname: str, username: str, password: str,  
+               scale: str = 'small', partitioned: bool = False) -> None:  
+    """Load the dataset of the given <scale> into the database <dbname>, with 
+    Trip partitioned by month if <partitioned> is True, and check that no 
+    query reads one of CHECKED_TABLES with a sequential scan. 
+    """  
+    dataset = Dataset(SCALES[scale])  
+    load(dbname, username, password, dataset, partitioned)  
+    failures = check_plans(dbname, username, password, dataset)  
+    assert not failures, '\n'.join(failures)  
+  
+  
+def main(argv: list[str]) -> None:  
+    """Check the query plans as described by the command line <argv>."""  
+    parser = argparse.ArgumentParser(  
+        description='Check that WasteWrangler queries use indexes.')  
+    parser.add_argument('dbname')  
+    parser.add_argument('username')  
+    parser.add_argument('password', nargs='?', default='')  
+    parser.add_argument('--scale', default='medium', choices=list(SCALES),  
+                        help='dataset scale (default: %(default)s)')  
+    parser.add_argument('--partitioned', action='store_true',  
+                        help='partition Trip by month')  
+    args = parser.parse_args(argv)  
+  
+    dataset = Dataset(SCALES[args.scale])  
+    load(args.dbname, args.username, args.password, dataset,  
+         args.partitioned)  
+    failures = check_plans(args.dbname, args.username, args.password, dataset)  
+    for failure in failures:  
+        print(failure)  
+    if failures:  
+        sys.exit('%d queries read whole tables' % len(failures))  
+    print('All plans use indexes')  
+  
+  
+if __name__ == '__main__':  
+    main(sys.argv[1:])  
@@ -0,0 +1,243 @@
+-- Server-side routines used by the WasteWrangler class in a2.py.
+-- Install this file after waste_wrangler_schema.sql, the data,
+-- waste_wrangler_indexes.sql and waste_wrangler_occupancy.sql (setup() in
+-- a2.py does this for you). Each routine keeps the whole decision on the
+-- server so that a WasteWrangler method needs a single round trip.
+
+set search_path to waste_wrangler;
+
+-- Schedule a truck, two drivers and a facility for the route p_rid at
+-- p_time, following the rules documented on WasteWrangler.schedule_trip:
+--      * The route must exist, must not already have a trip on the same day,
+--        and the trip must start at or after 8:00 and end by 16:00, assuming
+--        an average speed of 5 kph.
+--      * The truck must carry the waste type of the route, must not have
+--        maintenance that day and must not be on another trip from 30 minutes
+--        before the start until 30 minutes after the end of this trip.
+--        Larger capacity first, then lower tID.
+--      * The drivers must be available over the same window. The most
+--        experienced available driver is picked first, then the most
+--        experienced one left such that at least one of the pair can drive
+--        the truck type of the chosen truck. Ties are broken by lower eID.
+--      * The facility is the one with the lowest fID for the waste type.
+-- Returns the inserted trip, or no rows if the trip can not be scheduled.
+create or replace function schedule_trip(p_rid integer, p_time timestamp)
+returns setof Trip as $$
+declare
+        v_route Route%rowtype;
+        v_day timestamp := date_trunc('day', p_time);
+        v_end timestamp;
+        v_truck Truck%rowtype;
+        v_first integer;
+        v_second integer;
+        v_fid integer;
+begin
+        select * into v_route from Route where rID = p_rid;
+        if not found then
+                return;
+        end if;
+
+        v_end := p_time + v_route.length / 5 * interval '1 hour';
+        if p_time::time < '8:00' or v_end > date(p_time) + time '16:00' then
+                return;
+        end if;
+
+        select fID into v_fid from Facility
+        where wasteType = v_route.wasteType
+        order by fID
+        limit 1;
+        if not found then
+                return;
+        end if;
+
+        -- The checks below see the trips committed so far. Inserting a trip
+        -- that clashes with one committed since then fails on an exclusion
+        -- constraint of waste_wrangler_occupancy.sql or on a unique
+        -- constraint of Trip, and the checks are run again to take it into
+        -- account. Above READ COMMITTED, the checks would not see it, and
+        -- the whole transaction has to be run again instead.
+        loop
+                -- Trips of the same day are looked up with a range on tTime,
+                -- so that indexes and partition pruning can be used
+                if exists (select 1 from Trip
+                           where rID = p_rid
+                             and tTime >= v_day
+                             and tTime < v_day + interval '1 day') then
+                        return;
+                end if;
+
+                -- Trips end by 16:00, so only trips on the same day can
+                -- conflict. The busy times of TruckBusy and DriverBusy include
+                -- the 30 minutes after each trip, and maintenance keeps a
+                -- truck busy all day.
+                select t.* into v_truck
+                from Truck t
+                where exists (select 1 from TruckType tt
+                              where tt.truckType = t.truckType
+                                and tt.wasteType = v_route.wasteType)
+                  and not exists (select 1 from TruckBusy b
+                                  where b.day = date(p_time) and b.tID = t.tID
+                                    and b.busyFrom
+                                        < v_end + interval '30 minutes'
+                                    and b.busyUntil > p_time)
+                order by t.capacity desc, t.tID
+                limit 1;
+                if not found then
+                        return;
+                end if;
+
+                with available as (
+                        select e.eID, e.hireDate,
+                               bool_or(d.truckType = v_truck.truckType)
+                                       as qualified
+                        from Employee e join Driver d on d.eID = e.eID
+                        where e.hireDate <= date(p_time)
+                          and not exists (
+                                select 1 from DriverBusy b
+                                where b.day = date(p_time) and b.eID = e.eID
+                                  and b.busyFrom
+                                      < v_end + interval '30 minutes'
+                                  and b.busyUntil > p_time)
+                        group by e.eID, e.hireDate
+                ), first as (
+                        select * from available order by hireDate, eID limit 1
+                )
+                select f.eID, s.eID into v_first, v_second
+                from first f
+                join lateral (select a.eID from available a
+                              where (a.hireDate, a.eID) > (f.hireDate, f.eID)
+                                and (f.qualified or a.qualified)
+                              order by a.hireDate, a.eID
+                              limit 1) s on true;
+                if not found then
+                        return;
+                end if;
+
+                -- Wait for any other scheduler inserting for this truck or
+                -- these drivers. The locks are let go of if the insert fails.
+                begin
+                        perform lock_occupancy(date(p_time), array[v_truck.tID],
+                                               array[v_first, v_second]);
+                        return query
+                        insert into Trip (rID, tID, tTime, eID1, eID2, fID)
+                        values (p_rid, v_truck.tID, p_time,
+                                greatest(v_first, v_second),
+                                least(v_first, v_second), v_fid)
+                        returning *;
+                        return;
+                exception when exclusion_violation or unique_violation then
+                        -- Another trip got there first
+                        if current_setting('transaction_isolation')
+                           <> 'read committed' then
+                                raise;
+                        end if;
+                end;
+        end loop;
+end;
+$$ language plpgsql;
+
+-- Schedule maintenance for every truck whose most recent maintenance before
+-- p_date happened over 90 days before p_date, and which has no maintenance
+-- scheduled from p_date to 10 days after it, following the rules documented
+-- on WasteWrangler.schedule_maintenance. Trucks are handled in ascending
+-- order of tID, and each one gets the first day of the p_horizon days after
+-- p_date when:
+--      * the truck has no trip and no maintenance, and
+--      * a technician who can maintain its truck type, was hired by then and
+--        is not maintaining another truck is available (lowest eID first).
+-- Each truck is given its day with one query over every candidate day and
+-- technician, which sees the maintenance scheduled for the trucks before it.
+-- If a trip or maintenance committed concurrently takes the day, the truck is
+-- given its day again, or the error is raised above READ COMMITTED.
+-- Returns the inserted maintenance, one row per truck scheduled.
+drop function if exists schedule_maintenance(date, integer);
+create function schedule_maintenance(p_date date, p_horizon integer)
+returns setof Maintenance as $$
+declare
+        v_truck record;
+        v_day date;
+        v_eid integer;
+begin
+        for v_truck in
+                select t.tID, t.truckType
+                from Truck t join Maintenance m on m.tID = t.tID
+                where m.mDate < p_date
+                group by t.tID, t.truckType
+                having max(m.mDate) < p_date - 90
+                   and not exists (select 1 from Maintenance u
+                                   where u.tID = t.tID
+                                     and u.mDate between p_date and p_date + 10)
+                order by t.tID
+        loop
+                loop
+                        select c.day, tc.eID into v_day, v_eid
+                        from (select p_date + i as day
+                              from generate_series(1, p_horizon) i) c
+                        join Technician tc on tc.truckType = v_truck.truckType
+                        join Employee e on e.eID = tc.eID
+                                       and e.hireDate <= c.day
+                        where not exists (select 1 from TruckBusy b
+                                          where b.day = c.day
+                                            and b.tID = v_truck.tID)
+                          and not exists (select 1 from TechnicianBusy b
+                                          where b.day = c.day
+                                            and b.eID = tc.eID)
+                        order by c.day, tc.eID
+                        limit 1;
+                        exit when not found;
+
+                        begin
+                                perform lock_occupancy(v_day,
+                                                       array[v_truck.tID],
+                                                       array[v_eid]);
+                                return query
+                                insert into Maintenance
+                                values (v_truck.tID, v_eid, v_day)
+                                returning *;
+                                exit;
+                        exception when exclusion_violation or unique_violation
+                        then
+                                -- Another trip or maintenance got there first
+                                if current_setting('transaction_isolation')
+                                   <> 'read committed' then
+                                        raise;
+                                end if;
+                        end;
+                end loop;
+        end loop;
+end;
+$$ language plpgsql;
+
+-- Reference data (trucks, truck types, facilities, routes, drivers and
+-- technicians) is cached by WasteWrangler. Any change to one of these tables
+-- sends the name of the table on the waste_wrangler_reference channel once
+-- the change commits, so that the caches can drop their copy of it.
+create or replace function notify_reference_change()
+returns trigger as $$
+begin
+        perform pg_notify('waste_wrangler_reference', lower(tg_table_name));
+        return null;
+end;
+$$ language plpgsql;
+
+create or replace trigger trucktype_notify
+        after insert or update or delete or truncate on TruckType
+        for each statement execute function notify_reference_change();
+create or replace trigger truck_notify
+        after insert or update or delete or truncate on Truck
+        for each statement execute function notify_reference_change();
+create or replace trigger facility_notify
+        after insert or update or delete or truncate on Facility
+        for each statement execute function notify_reference_change();
+create or replace trigger employee_notify
+        after insert or update or delete or truncate on Employee
+        for each statement execute function notify_reference_change();
+create or replace trigger driver_notify
+        after insert or update or delete or truncate on Driver
+        for each statement execute function notify_reference_change();
+create or replace trigger technician_notify
+        after insert or update or delete or truncate on Technician
+        for each statement execute function notify_reference_change();
+create or replace trigger route_notify
+        after insert or update or delete or truncate on Route
+        for each statement execute function notify_reference_change();
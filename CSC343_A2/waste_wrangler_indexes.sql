@@ -0,0 +1,53 @@
+-- Secondary indexes and constraints on the tables of waste_wrangler_schema.sql.
+-- They are created after the data has been loaded (setup() in a2.py does this
+-- for you), which is much faster than maintaining them row by row while the
+-- data is loaded. Every statement can be run again, so running this file
+-- also brings the indexes of an existing database up to date.
+
+set search_path to waste_wrangler;
+
+-- The following ensures that a route can be scheduled at most once per day.
+-- A partitioned Trip has one on each partition instead (see
+-- waste_wrangler_partitions.sql).
+do $$
+begin
+        if (select relkind from pg_class where oid = 'trip'::regclass) = 'r' then
+                create unique index if not exists service_unique
+                        on Trip(rID, date(tTime));
+        end if;
+end;
+$$;
+
+-- Queries look up the trips of a day with a range on tTime, from midnight to
+-- the next midnight, which these indexes and partition pruning can both use.
+
+-- The following supports looking up the trips of a day, e.g. when planning
+-- the trips of a day in schedule_fleet
+create index if not exists trip_time on Trip(tTime);
+
+-- The following support looking up the trips of a driver or facility on a
+-- day, e.g. when checking that a driver is available in schedule_trip. The
+-- driver indexes also support following the workmates of a driver in
+-- workmate_sphere. The trips of a truck on a day use unique (tID, tTime).
+create index if not exists trip_eid1_time on Trip(eID1, tTime);
+create index if not exists trip_eid2_time on Trip(eID2, tTime);
+create index if not exists trip_fid_time on Trip(fID, tTime);
+
+-- The following support looking up the maintenance of a day, and the days a
+-- technician is busy in schedule_maintenance
+create index if not exists maintenance_day on Maintenance(mDate);
+create index if not exists maintenance_eid on Maintenance(eID, mDate);
+
+-- The following supports finding the facilities that take a waste type,
+-- lowest fID first
+create index if not exists facility_waste on Facility(wasteType, fID);
+
+-- Older databases looked up trips with these, which are covered by the
+-- indexes above
+drop index if exists trip_eid1;
+drop index if exists trip_eid2;
+drop index if exists trip_day;
+drop index if exists trip_tid_day;
+drop index if exists trip_eid1_day;
+drop index if exists trip_eid2_day;
+drop index if exists trip_fid_day;
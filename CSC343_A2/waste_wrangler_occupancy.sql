@@ -0,0 +1,209 @@
+-- Occupancy tables derived from Trip and Maintenance and kept current by
+-- triggers, so that the schedulers can tell whether a truck, driver or
+-- technician is free on a day with an indexed lookup, instead of joining
+-- Trip to Route and recomputing the end of every trip. Install this file
+-- after the data and waste_wrangler_indexes.sql (setup() in a2.py does this
+-- for you). Installing it again rebuilds the tables from Trip and
+-- Maintenance.
+--
+-- The busy times of a truck or driver may not overlap, which exclusion
+-- constraints enforce. A trip that would clash with another trip or with
+-- maintenance of its truck therefore fails to insert, even when it is
+-- inserted concurrently with the trip it clashes with, so schedulers can
+-- insert optimistically and try again when they lose the race.
+
+set search_path to waste_wrangler;
+
+-- The times each truck is busy on a day: from the start of each of its trips
+-- until 30 minutes after the trip ends, with rID the route of the trip, and
+-- the whole day when it has maintenance, with rID null.
+create table if not exists TruckBusy (
+        tID integer not null,
+        day date not null,
+        rID integer,
+        busyFrom timestamp not null,
+        busyUntil timestamp not null,
+        busy tsrange generated always as (tsrange(busyFrom, busyUntil)) stored
+);
+
+-- The times each driver is busy on a day: from the start of each of their
+-- trips, on route rID, until 30 minutes after the trip ends.
+create table if not exists DriverBusy (
+        eID integer not null,
+        day date not null,
+        rID integer not null,
+        busyFrom timestamp not null,
+        busyUntil timestamp not null,
+        busy tsrange generated always as (tsrange(busyFrom, busyUntil)) stored
+);
+
+-- The days each technician maintains the truck tID.
+create table if not exists TechnicianBusy (
+        eID integer not null,
+        day date not null,
+        tID integer not null
+);
+
+-- The end of a trip that starts at p_time on a route of p_length km, plus
+-- the 30 minutes a truck or driver needs before the next trip.
+create or replace function trip_busy_until(p_time timestamp, p_length float)
+returns timestamp as $$
+        select p_time + p_length / 5 * interval '1 hour'
+               + interval '30 minutes';
+$$ language sql immutable;
+
+-- Rebuild the occupancy tables from Trip and Maintenance.
+create or replace function refresh_occupancy()
+returns void as $$
+begin
+        truncate TruckBusy, DriverBusy, TechnicianBusy;
+
+        insert into TruckBusy (tID, day, rID, busyFrom, busyUntil)
+        select tr.tID, tr.tTime::date, tr.rID, tr.tTime,
+               trip_busy_until(tr.tTime, r.length)
+        from Trip tr join Route r on r.rID = tr.rID
+        union all
+        select tID, mDate, null, mDate, mDate + 1
+        from Maintenance;
+
+        insert into DriverBusy (eID, day, rID, busyFrom, busyUntil)
+        select e.eID, tr.tTime::date, tr.rID, tr.tTime,
+               trip_busy_until(tr.tTime, r.length)
+        from Trip tr join Route r on r.rID = tr.rID
+        cross join lateral (values (tr.eID1), (tr.eID2)) e(eID);
+
+        insert into TechnicianBusy
+        select eID, mDate, tID from Maintenance;
+end;
+$$ language plpgsql;
+
+-- Keep the occupancy of trips current. Every statement that changes Trip
+-- removes the rows of the trips it removed and adds those of the trips it
+-- added. Updated trips count as both, unless the update kept their route,
+-- truck, time and drivers, as rerouting them to another facility does.
+create or replace function trip_occupancy()
+returns trigger as $$
+declare
+        v_old text := 'select rID, tID, tTime, eID1, eID2 from old_trips';
+        v_new text := 'select rID, tID, tTime, eID1, eID2 from new_trips';
+begin
+        if tg_op = 'UPDATE' then
+                v_old := v_old || ' except ' || v_new;
+                v_new := 'select rID, tID, tTime, eID1, eID2 from new_trips'
+                         || ' except '
+                         || 'select rID, tID, tTime, eID1, eID2 from old_trips';
+        end if;
+
+        if tg_op in ('UPDATE', 'DELETE') then
+                execute 'delete from TruckBusy b using (' || v_old || ') o '
+                        'where b.day = o.tTime::date and b.tID = o.tID '
+                        '  and b.rID = o.rID and b.busyFrom = o.tTime';
+                execute 'delete from DriverBusy b using (' || v_old || ') o '
+                        'where b.day = o.tTime::date '
+                        '  and b.eID in (o.eID1, o.eID2) '
+                        '  and b.rID = o.rID and b.busyFrom = o.tTime';
+        end if;
+
+        if tg_op in ('UPDATE', 'INSERT') then
+                execute 'insert into TruckBusy '
+                        '       (tID, day, rID, busyFrom, busyUntil) '
+                        'select n.tID, n.tTime::date, n.rID, n.tTime, '
+                        '       trip_busy_until(n.tTime, r.length) '
+                        'from (' || v_new || ') n '
+                        'join Route r on r.rID = n.rID';
+                execute 'insert into DriverBusy '
+                        '       (eID, day, rID, busyFrom, busyUntil) '
+                        'select e.eID, n.tTime::date, n.rID, n.tTime, '
+                        '       trip_busy_until(n.tTime, r.length) '
+                        'from (' || v_new || ') n '
+                        'join Route r on r.rID = n.rID '
+                        'cross join lateral '
+                        '       (values (n.eID1), (n.eID2)) e(eID)';
+        end if;
+        return null;
+end;
+$$ language plpgsql;
+
+-- Keep the occupancy of maintenance current.
+create or replace function maintenance_occupancy()
+returns trigger as $$
+begin
+        if tg_op in ('UPDATE', 'DELETE') then
+                delete from TruckBusy
+                where day = old.mDate and tID = old.tID and rID is null;
+                delete from TechnicianBusy
+                where day = old.mDate and eID = old.eID and tID = old.tID;
+        end if;
+
+        if tg_op in ('UPDATE', 'INSERT') then
+                insert into TruckBusy (tID, day, rID, busyFrom, busyUntil)
+                values (new.tID, new.mDate, null, new.mDate, new.mDate + 1);
+                insert into TechnicianBusy values (new.eID, new.mDate, new.tID);
+        end if;
+        return null;
+end;
+$$ language plpgsql;
+
+-- Take the advisory locks of the trucks p_tids and the employees p_eids on
+-- p_day, until the end of the transaction. Schedulers lock the trucks and
+-- employees of the trips and maintenance they are about to insert, so that
+-- they wait for each other on these locks, always taken in the same order,
+-- rather than on each other's rows in the occupancy tables, which could
+-- deadlock. Trucks are locked by tID and employees by -eID.
+create or replace function lock_occupancy(p_day date, p_tids integer[],
+                                          p_eids integer[])
+returns void as $$
+        select count(pg_advisory_xact_lock(k.key, p_day - date '2000-01-01'))
+        from (select tID as key from unnest(p_tids) tID
+              union
+              select -eID from unnest(p_eids) eID
+              order by key) k;
+$$ language sql;
+
+-- Changes that affect many rows at once rebuild the occupancy tables.
+create or replace function occupancy_refresh()
+returns trigger as $$
+begin
+        perform refresh_occupancy();
+        return null;
+end;
+$$ language plpgsql;
+
+select refresh_occupancy();
+
+create index if not exists truckbusy_day on TruckBusy(day, tID);
+create index if not exists driverbusy_day on DriverBusy(day, eID);
+create index if not exists technicianbusy_day on TechnicianBusy(day, eID);
+
+-- int4range(tID, tID, '[]') && ... stands for tID = ..., since GiST can not
+-- compare integers for equality without the btree_gist extension.
+alter table TruckBusy drop constraint if exists truckbusy_no_overlap;
+alter table TruckBusy add constraint truckbusy_no_overlap
+        exclude using gist (int4range(tID, tID, '[]') with &&, busy with &&);
+alter table DriverBusy drop constraint if exists driverbusy_no_overlap;
+alter table DriverBusy add constraint driverbusy_no_overlap
+        exclude using gist (int4range(eID, eID, '[]') with &&, busy with &&);
+
+-- Transition tables need a trigger for each kind of change.
+create or replace trigger trip_occupancy_insert
+        after insert on Trip referencing new table as new_trips
+        for each statement execute function trip_occupancy();
+create or replace trigger trip_occupancy_update
+        after update on Trip
+        referencing old table as old_trips new table as new_trips
+        for each statement execute function trip_occupancy();
+create or replace trigger trip_occupancy_delete
+        after delete on Trip referencing old table as old_trips
+        for each statement execute function trip_occupancy();
+create or replace trigger maintenance_occupancy
+        after insert or update or delete on Maintenance
+        for each row execute function maintenance_occupancy();
+create or replace trigger trip_occupancy_truncate
+        after truncate on Trip
+        for each statement execute function occupancy_refresh();
+create or replace trigger maintenance_occupancy_truncate
+        after truncate on Maintenance
+        for each statement execute function occupancy_refresh();
+create or replace trigger route_occupancy
+        after update of length on Route
+        for each statement execute function occupancy_refresh();
@@ -0,0 +1,110 @@
+-- Monthly range partitioning of Trip on tTime, for databases where Trip grows
+-- without bound. Install this file after waste_wrangler_schema.sql and the
+-- data, run
+--      select partition_trip();
+-- and then install waste_wrangler_indexes.sql and
+-- waste_wrangler_functions.sql (setup() and partition_trip() in a2.py do this
+-- for you).
+--
+-- The partitioned Trip keeps every key and check of the plain one. The
+-- primary key and unique (tID, tTime) include tTime, so they are declared on
+-- Trip itself. A unique index on (rID, date(tTime)) can not be, but every
+-- partition starts and ends at midnight, so each one has its own
+-- service_unique index instead, which enforces the same rule.
+--
+-- Trips in a month with no partition go to the default partition,
+-- Trip_default. Create the partitions of the coming months ahead of time
+-- with create_trip_partition.
+
+set search_path to waste_wrangler;
+
+-- Create the partition of Trip for the month of p_month, named
+-- trip_yYYYYmMM, unless it exists. Any trips of that month are moved out of
+-- the default partition into it. Returns the name of the partition.
+create or replace function create_trip_partition(p_month date)
+returns text as $$
+declare
+        v_start date := date_trunc('month', p_month);
+        v_end date := date_trunc('month', p_month) + interval '1 month';
+        v_name text := 'trip_' || to_char(p_month, '"y"YYYY"m"MM');
+begin
+        if to_regclass(v_name) is null then
+                execute format('create table %I (like Trip including all)',
+                               v_name);
+                execute format('with moved as ('
+                               '    delete from Trip_default'
+                               '    where tTime >= %L and tTime < %L'
+                               '    returning *) '
+                               'insert into %I select * from moved',
+                               v_start, v_end, v_name);
+                execute format('alter table Trip attach partition %I '
+                               'for values from (%L) to (%L)',
+                               v_name, v_start, v_end);
+        end if;
+        execute format('create unique index if not exists %I '
+                       'on %I (rID, date(tTime))',
+                       v_name || '_service_unique', v_name);
+        return v_name;
+end;
+$$ language plpgsql;
+
+-- Replace a plain Trip table with a partitioned one holding the same trips,
+-- with a partition for every month from the first trip until 12 months after
+-- the last trip or the current month, whichever is later. Does nothing if
+-- Trip is already partitioned.
+create or replace function partition_trip()
+returns void as $$
+declare
+        v_constraint text;
+        v_first date;
+        v_last date;
+begin
+        if (select relkind from pg_class
+            where oid = 'trip'::regclass) = 'p' then
+                return;
+        end if;
+
+        -- The keys of the old table are dropped, which frees their names for
+        -- the new table.
+        alter table Trip rename to Trip_unpartitioned;
+        for v_constraint in
+                select conname from pg_constraint
+                where conrelid = 'trip_unpartitioned'::regclass
+                  and contype in ('p', 'u', 'f')
+        loop
+                execute format('alter table Trip_unpartitioned '
+                               'drop constraint %I', v_constraint);
+        end loop;
+
+        create table Trip (
+                like Trip_unpartitioned
+                        including defaults including constraints,
+                primary key (rID, tTime),
+                unique (tID, tTime),
+                foreign key (rID) references Route,
+                foreign key (tID) references Truck,
+                foreign key (eID1) references Employee,
+                foreign key (eID2) references Employee,
+                foreign key (fID) references Facility
+        ) partition by range (tTime);
+
+        create table Trip_default partition of Trip default;
+        create unique index trip_default_service_unique
+                on Trip_default (rID, date(tTime));
+
+        select least(min(tTime)::date, current_date),
+               greatest(max(tTime)::date, current_date)
+        into v_first, v_last
+        from Trip_unpartitioned;
+        perform create_trip_partition(month::date)
+        from generate_series(date_trunc('month', v_first),
+                             v_last + interval '12 months',
+                             interval '1 month') month;
+
+        insert into Trip select * from Trip_unpartitioned;
+        -- schedule_trip returns rows of the old table, and is installed again
+        -- with waste_wrangler_functions.sql
+        drop function if exists schedule_trip(integer, timestamp);
+        drop table Trip_unpartitioned;
+end;
+$$ language plpgsql;
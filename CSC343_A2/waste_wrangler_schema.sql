@@ -136,6 +136,3 @@ create table Trip (
         check (eID1 > eID2),
         check (tTime::time between '8:00' and '16:00')
 );
-
--- The following ensures that a route can be scheduled at most once per day
-create unique index service_unique on Trip(rID, date(tTime));
\ No newline at end of file